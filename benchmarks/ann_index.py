@@ -0,0 +1,98 @@
+"""Benchmark: recall@k, query latency and memory of the corpus index types (flat, HNSW, IVF-PQ).
+
+    python -m benchmarks.ann_index                      # vectors of the built corpus index
+    python -m benchmarks.ann_index --synthetic 200000   # clustered random MiniLM-sized vectors
+
+Every configuration is compared with the exact flat search on the same vectors: recall@k is
+the share of the true k nearest neighbours it returns. Queries are corpus vectors with a little
+noise added, so each has a close match like a real restaurant query does. Pick the operating
+point per corpus size and build it with `python cli.py build-index --index-type hnsw --ef-search 64`.
+"""
+import os
+import time
+import argparse
+import numpy as np
+import faiss
+from models.faiss_index import make_index, index_params, set_search_params, current_corpus_version, corpus_version_dir, \
+    CORPUS_INDEX_DIR, VECTORS_FILE
+
+# (index type, build parameters, search parameters swept on the same built index)
+CONFIGS = [
+    ("flat", {}, [{}]),
+    ("hnsw", {"M": 16}, [{"ef_search": ef} for ef in (16, 32, 64, 128)]),
+    ("hnsw", {"M": 32}, [{"ef_search": ef} for ef in (16, 32, 64, 128)]),
+    ("ivfpq", {"m": 48}, [{"nprobe": nprobe} for nprobe in (4, 16, 64)]),
+    ("ivfpq", {"m": 96}, [{"nprobe": nprobe} for nprobe in (4, 16, 64)]),
+]
+
+def corpus_vectors(index_dir=CORPUS_INDEX_DIR):
+    """Exact vectors of the live corpus index."""
+    manifest = current_corpus_version(index_dir)
+    if manifest is None:
+        raise SystemExit("No corpus index yet: run `python cli.py build-index` or pass --synthetic N.")
+    version_dir = corpus_version_dir(index_dir, manifest)
+    if os.path.exists(os.path.join(version_dir, VECTORS_FILE)):
+        return np.load(os.path.join(version_dir, VECTORS_FILE))
+    index = faiss.read_index(os.path.join(version_dir, "index.faiss"))
+    return index.reconstruct_n(0, index.ntotal)
+
+def synthetic_vectors(n, dim=384, clusters=None, seed=0):
+    """Unit-length vectors around random centres, roughly how sentence embeddings of one domain spread."""
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(1, n // 100)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(clusters, size=n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def recall_at_k(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def time_queries(index, queries, k):
+    """(per-query latency in ms for single queries (median), ids of every query's top k)."""
+    found, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        timings.append(time.perf_counter() - start)
+        found.append(ids[0])
+    return float(np.median(timings) * 1000), np.array(found)
+
+def run(vectors, k=10, queries=200, seed=0):
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(queries, len(vectors)), replace=False)
+    noise = 0.05 * rng.normal(size=(len(picks), vectors.shape[1])).astype(np.float32)
+    query_vectors = np.ascontiguousarray(vectors[picks] + noise, dtype=np.float32)
+    k = min(k, len(vectors))
+
+    print(f"{len(vectors)} vectors of {vectors.shape[1]} dims, {len(picks)} queries, k={k}")
+    print(f"{'index':<44} {'recall@k':>9} {'p50 ms':>8} {'memory MB':>10} {'build s':>8}")
+    results, truth = [], None
+    for index_type, build, sweeps in CONFIGS:
+        start = time.perf_counter()
+        index, params = make_index(vectors, index_params(index_type, **build))
+        build_s = time.perf_counter() - start
+        memory_mb = len(faiss.serialize_index(index)) / 1e6
+
+        for search in sweeps:
+            params = {**params, **search}
+            set_search_params(index, params)
+            latency_ms, found = time_queries(index, query_vectors, k)
+            if truth is None:
+                truth = found # flat runs first: the exact answer
+            label = index_type + "".join(f" {key}={value}" for key, value in params.items()
+                                         if key not in ("index_type", "ef_construction"))
+            result = {"params": params, "recall": recall_at_k(found, truth), "p50_ms": latency_ms,
+                      "memory_mb": memory_mb, "build_s": build_s}
+            results.append(result)
+            print(f"{label[:44]:<44} {result['recall']:>9.3f} {latency_ms:>8.3f} {memory_mb:>10.1f} {build_s:>8.1f}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetic", type=int, default=None, help="Benchmark this many synthetic vectors instead of the corpus.")
+    parser.add_argument("--index-dir", default=CORPUS_INDEX_DIR)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    vectors = synthetic_vectors(args.synthetic) if args.synthetic else corpus_vectors(args.index_dir)
+    run(vectors, args.k, args.queries)
@@ -0,0 +1,38 @@
+"""Benchmark: columnar vs row-wise residual-corrector features on the training CSV.
+
+    python -m benchmarks.features --csv data/valid_training_data.csv --rows 50000
+
+Checks that extract_features_from_df matches extract_features_from_df_rowwise exactly,
+then reports the time each takes. --rows tiles the CSV up to that many rows. Create
+valid_training_data.csv first with `python cli.py export-training-data`.
+"""
+import time
+import argparse
+import pandas as pd
+from utils.paths import data_path
+from models.preprocessing import extract_features_from_df, extract_features_from_df_rowwise
+
+def run(csv_path=None, rows=None):
+    df = pd.read_csv(csv_path or data_path("valid_training_data.csv"))
+    if rows and rows > len(df):
+        df = pd.concat([df] * (rows // len(df) + 1), ignore_index=True).iloc[:rows]
+
+    start = time.perf_counter()
+    rowwise = extract_features_from_df_rowwise(df)
+    rowwise_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columnar = extract_features_from_df(df)
+    columnar_s = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(rowwise, columnar)
+    print(f"{len(df)} rows, identical features ({columnar.shape[1]} columns)")
+    print(f"row-wise {rowwise_s:.3f}s  columnar {columnar_s:.3f}s  speed-up {rowwise_s / columnar_s:.1f}x")
+    return rowwise_s, columnar_s
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default=None, help="Defaults to valid_training_data.csv in the data directory.")
+    parser.add_argument("--rows", type=int, default=None)
+    args = parser.parse_args()
+    run(args.csv, args.rows)
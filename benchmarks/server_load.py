@@ -0,0 +1,130 @@
+"""Load test for server.py: steady-state throughput and latency under concurrent clients.
+
+    python -m utils.mock_openai --latency 1.5 &
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 OPENAI_API_KEY=mock LLM_CACHE_DISABLE=1 python server.py &
+    python -m benchmarks.server_load --url http://127.0.0.1:8000 --endpoint swot --clients 16 --requests 200
+
+Sends `requests` POSTs from `clients` concurrent clients and reports requests/second,
+latency percentiles and the status codes seen (503 means the server's queue was full).
+/evaluate responses are also checked for candidate locations whose SWOT failed.
+
+    python -m benchmarks.server_load --local --endpoint evaluate --clients 8 --requests 40
+
+starts the server in process against a keep-alive (HTTP/1.1) mock of the OpenAI API, like
+the real one, and exits non-zero if any request or SWOT failed.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import urllib.request
+import urllib.error
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_INPUT = {
+    "location": "1.283, 103.851",
+    "cuisine": "Korean",
+    "price": "$20-30",
+    "payments": "cash, credit card, NFC",
+    "hours": "daily from 11 AM to 10 PM",
+    "offerings": "alcohol, vegetarian",
+    "recommended_dishes": "kimchi stew, fried chicken",
+    "accessibility": "wheelchair accessible",
+    "service_options": "dine-in, takeaway",
+    "highlights": "late-night food",
+    "amenities": "Wi-Fi, bar on site",
+    "atmosphere": "casual",
+    "crowd": "groups, tourist-friendly",
+    "dining_options": "lunch, dinner",
+    "planning": "accepts reservations",
+    "children": "good for kids",
+    "pets": "",
+}
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+def post(url, body, timeout):
+    data = json.dumps(body).encode("utf-8")
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    failed_swots = 0
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read() or b"{}")
+            status = response.status
+        failed_swots = sum(location.get("swot") is None for location in result.get("locations", []))
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = "connection error"
+    return status, time.perf_counter() - start, failed_swots
+
+def run_load(url, endpoint="swot", clients=16, requests=200, body=None, timeout=300):
+    target = url.rstrip("/") + "/" + endpoint
+    body = SAMPLE_INPUT if body is None else body
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda _: post(target, body, timeout), range(requests)))
+    wall = time.perf_counter() - start
+
+    statuses = Counter(status for status, _, _ in results)
+    latencies = [elapsed for status, elapsed, _ in results if status == 200]
+    summary = {
+        "requests": requests,
+        "clients": clients,
+        "wall_s": wall,
+        "throughput_rps": statuses.get(200, 0) / wall,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "statuses": dict(statuses),
+        "failed_swots": sum(failed for _, _, failed in results),
+    }
+    print(f"{target}: {summary['throughput_rps']:.2f} req/s over {wall:.1f}s with {clients} clients")
+    print(f"latency p50 {summary['p50_s']:.3f}s  p95 {summary['p95_s']:.3f}s  p99 {summary['p99_s']:.3f}s")
+    print(f"status codes: {summary['statuses']}, failed SWOTs: {summary['failed_swots']}")
+    return summary
+
+def run_local(endpoint="evaluate", clients=8, requests=40, latency=0.2, workers=8, embeddings="hash"):
+    """run_load against an in-process server whose LLM calls go to a keep-alive mock of the API."""
+    from utils.mock_openai import serve_in_thread
+    if embeddings == "hash":
+        from models import embeddings as embeddings_module
+        from benchmarks.suite import HashEmbeddings
+        embeddings_module._embeddings = HashEmbeddings()
+    mock, mock_state, base_url = serve_in_thread(latency=latency, keep_alive=True)
+    os.environ.update({"OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": "mock", "LLM_CACHE_DISABLE": "1"})
+
+    import threading
+    from server import serve
+    server = serve(port=0, workers=workers, warm=False) # resources load on the first requests
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        summary = run_load(f"http://127.0.0.1:{server.server_address[1]}", endpoint, clients, requests)
+    finally:
+        server.shutdown()
+        server.server_close()
+        mock.shutdown()
+    print(f"mock API: {mock_state.requests} completions")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="swot", choices=["swot", "coordinates", "evaluate"])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--local", action="store_true", help="Start the server and a keep-alive mock API in process.")
+    parser.add_argument("--embeddings", choices=["hash", "minilm"], default="hash", help="--local: query embeddings.")
+    args = parser.parse_args()
+    if args.local:
+        summary = run_local(args.endpoint, args.clients, args.requests, embeddings=args.embeddings)
+        sys.exit(0 if set(summary["statuses"]) == {200} and not summary["failed_swots"] else 1)
+    run_load(args.url, args.endpoint, args.clients, args.requests, timeout=args.timeout)
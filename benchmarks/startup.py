@@ -0,0 +1,53 @@
+"""Startup benchmark: how long `import main` takes before the first prompt.
+
+    python -m benchmarks.startup --module main --top 15
+
+Runs the import in a fresh interpreter under `python -X importtime` and reports the total
+wall time plus the slowest modules by cumulative import time. Heavy resources (models,
+indexes, datasets, network calls) should never show up here; they load on first use.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def measure_import(module="main", python=sys.executable):
+    """Import module in a subprocess; returns (wall_seconds, [(cumulative_us, self_us, depth, name), ...])."""
+    start = time.perf_counter()
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = m.groups()
+            imports.append((int(cumulative_us), int(self_us), (len(indent) - 1) // 2, name))
+    return wall, imports
+
+def report(module="main", top=15, repeat=3):
+    walls = []
+    for _ in range(repeat):
+        wall, imports = measure_import(module)
+        walls.append(wall)
+    print(f"import {module}: best {min(walls) * 1000:.0f} ms over {repeat} runs (interpreter start included)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, depth, name in sorted(imports, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {'  ' * depth}{name}")
+    return min(walls), imports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    report(args.module, args.top, args.repeat)
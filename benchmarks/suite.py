@@ -0,0 +1,265 @@
+"""Benchmark suite: loading, geo lookups, neighborhood context, retrieval, features and prompts on synthetic data.
+
+    python -m benchmarks.synthetic_data /tmp/bench-data --places 100000
+    python -m benchmarks.suite /tmp/bench-data                    # saves benchmarks/results/<commit>.json
+    python -m benchmarks.suite /tmp/bench-data --compare main     # ... and compares with main's results
+
+The data folder becomes RESTAURANT_DATA_DIR for the run, so nothing touches the real data. The LLM
+is the local mock (utils/mock_openai.py) and embeddings are a deterministic hashing stand-in for
+MiniLM unless --embeddings minilm, so retrieval numbers are index and search time, not model time.
+Each case reports the median and p95 per call in ms; results are saved per commit, and --compare
+flags every case that got slower than --threshold (20% by default) against another commit's results.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+EMBEDDING_DIM = 384
+
+class HashEmbeddings(Embeddings):
+    """MiniLM-shaped stand-in: hashed word counts projected to EMBEDDING_DIM unit vectors, no model to load."""
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def encode(self, texts, batch_size=None):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[i, h % self.dim] += 1.0 if h >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+def time_calls(func, args_list):
+    """Run func(*args) for each args; (per-call seconds, last result)."""
+    durations, result = [], None
+    for args in args_list:
+        start = time.perf_counter()
+        result = func(*args)
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+class Suite:
+    def __init__(self, queries=200, seed=0):
+        self.queries = queries
+        self.rng = np.random.default_rng(seed)
+        self.results = {}
+
+    def record(self, name, durations, **extra):
+        ms = np.asarray(durations) * 1000
+        self.results[name] = {"median_ms": float(np.median(ms)), "p95_ms": float(np.percentile(ms, 95)), "calls": len(ms), **extra}
+        print(f"{name:<34} {self.results[name]['median_ms']:>11.3f} {self.results[name]['p95_ms']:>11.3f} {len(ms):>6}")
+
+    def once(self, name, func, *args, **extra):
+        durations, result = time_calls(func, [args])
+        self.record(name, durations, **extra)
+        return result
+
+    def many(self, name, func, args_list, **extra):
+        durations, result = time_calls(func, args_list)
+        self.record(name, durations, **extra)
+        return result
+
+def run(data_dir, queries=200, embeddings="hash", seed=0):
+    """Run every case against the synthetic data in data_dir; {case: {median_ms, p95_ms, calls, ...}}."""
+    from utils.paths import data_path
+    from utils.data_loader import load_all_restaurants, build_restaurant_snapshot, load_restaurants, ABOUT_SIDECAR_PATH
+    from utils.singapore import get_planning_area, get_planning_areas, get_planning_area_index
+    from models import embeddings as embeddings_module
+    from models.locations import SpatialIndex, NeighborhoodTiles, get_nearby_restaurants, extract_neighborhood_context, \
+        get_neighborhood_tiles, get_spatial_index
+    from models.faiss_index import restaurant_documents, build_corpus_index, search_similar_documents, search_within_ids, \
+        CORPUS_INDEX_DIR
+    from models.preprocessing import parse_row_to_input, parse_rag, parse_inputs, extract_features, extract_features_from_df, \
+        format_dict_as_string
+    from models import rag_model
+
+    suite = Suite(queries, seed)
+    sources = (data_path("places.csv"), data_path("all_reviews.csv"), data_path("About"))
+    print(f"{'case':<34} {'median ms':>11} {'p95 ms':>11} {'calls':>6}")
+
+    # loading: the full merge from the raw files, then the Parquet snapshot path the pipelines use.
+    # With About/*.json files the merge compacts them every run (not only the first).
+    if os.listdir(data_path("About")):
+        for path in (ABOUT_SIDECAR_PATH, ABOUT_SIDECAR_PATH + ".json"):
+            if os.path.exists(path):
+                os.remove(path)
+    df = suite.once("load.all_restaurants", load_all_restaurants, *sources)
+    suite.results["load.all_restaurants"]["rows"] = len(df)
+    suite.once("load.build_snapshot", build_restaurant_snapshot, *sources)
+    suite.many("load.snapshot", load_restaurants, [sources] * 3)
+    df = load_restaurants(*sources)
+    rag_model.get_singapore_restaurants.reset()
+
+    # query points: near existing restaurants (as pipeline locations are), with some noise
+    coords = np.array(df["latitude, longitude"].tolist(), dtype=float)
+    picks = suite.rng.choice(len(df), size=min(queries, len(df)), replace=False)
+    points = coords[picks] + suite.rng.normal(0, 0.002, (len(picks), 2))
+
+    # geo lookups
+    get_planning_area_index()
+    suite.once("geo.planning_areas_bulk", get_planning_areas, coords[:, 0], coords[:, 1], rows=len(coords))
+    suite.many("geo.planning_area", get_planning_area, [tuple(p) for p in points])
+
+    # neighborhood context
+    suite.once("neighborhood.spatial_index_build", SpatialIndex, df)
+    suite.once("neighborhood.tiles_build", NeighborhoodTiles, df)
+    get_spatial_index(df) # built once per table, like in a running process
+    get_neighborhood_tiles(df)
+    nearby = [get_nearby_restaurants(tuple(p), df) for p in points]
+    suite.many("neighborhood.nearby", get_nearby_restaurants, [(tuple(p), df) for p in points],
+               mean_rows=float(np.mean([len(n) for n in nearby])))
+    suite.many("neighborhood.context_exact", extract_neighborhood_context, [(n,) for n in nearby])
+    suite.many("neighborhood.context_tiles", get_neighborhood_tiles(df).summary, [tuple(p) for p in points])
+
+    # retrieval
+    if embeddings == "hash":
+        embeddings_module._embeddings = HashEmbeddings()
+    # built where the pipelines look for it, in the synthetic folder
+    shutil.rmtree(CORPUS_INDEX_DIR, ignore_errors=True)
+    documents = suite.once("retrieval.documents", restaurant_documents, df)
+    db, _ = suite.once("retrieval.index_build", build_corpus_index, documents, CORPUS_INDEX_DIR, documents=len(documents))
+    rag_model.get_singapore_corpus_index.reset()
+    inputs = []
+    for pick, point in zip(picks, points):
+        structured_input = parse_rag(parse_row_to_input(df.iloc[pick]))
+        structured_input["location"] = f"{point[0]}, {point[1]}"
+        inputs.append(structured_input)
+    queries_str = [format_dict_as_string(s) for s in inputs]
+    suite.many("retrieval.embed_query", embeddings_module.get_embeddings().embed_query, [(q,) for q in queries_str])
+    suite.many("retrieval.search", search_similar_documents, [(q, db, 3) for q in queries_str])
+    suite.many("retrieval.search_filtered", rag_model.retrieve_similar, [(s, db) for s in inputs])
+    suite.many("retrieval.competitors", search_within_ids, [(q, db, n["place_id"]) for q, n in zip(queries_str, nearby)])
+
+    # features for the residual corrector
+    rows = df.dropna(subset=["average_price"])
+    suite.many("features.extract_features", extract_features, [(s,) for s in inputs])
+    suite.once("features.extract_features_from_df", extract_features_from_df, rows, rows=len(rows))
+
+    # prompt assembly (population/construction from the synthetic gov_cache snapshots)
+    rag_model.get_singapore_restaurants.reset()
+    rag_model.get_singapore_restaurants() # the snapshot, loaded once like a warm server
+    rag_model.get_singapore_corpus_index.reset()
+    rag_model.get_singapore_corpus_index() # the index just built
+    retrieved = [rag_model.retrieve_similar(s, db) for s in inputs]
+    suite.many("prompt.format_prompt", rag_model.format_prompt, list(zip(inputs, retrieved)))
+    suite.many("prompt.coordinates_prompt", rag_model.coordinates_prompt, list(zip(inputs, retrieved)))
+
+    # end to end with the mock LLM: everything but the model's latency
+    from utils.mock_openai import serve_in_thread
+    server, _, base_url = serve_in_thread()
+    os.environ.update({"OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": "mock", "LLM_CACHE_DISABLE": "1"})
+    rag_model.get_client.reset()
+    try:
+        suite.many("pipeline.run_rag_pipeline", rag_model.run_rag_pipeline, [(s, db) for s in inputs[:min(50, len(inputs))]])
+        suite.many("pipeline.coordinates_pipeline", rag_model.coordinates_pipeline,
+                   [(parse_inputs({"cuisine": s["cuisine"], "price": str(s["price"])}),) for s in inputs[:min(20, len(inputs))]])
+    finally:
+        server.shutdown()
+        rag_model.get_client.reset()
+    return suite.results
+
+def git_commit():
+    """(short commit id, whether tracked files differ from it)."""
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    commit = git("rev-parse", "--short=12", "HEAD") or "unknown"
+    return commit, bool(git("status", "--porcelain", "--untracked-files=no"))
+
+def save_results(results, data_manifest, results_dir=RESULTS_DIR, embeddings="hash"):
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpus)",
+        "embeddings": embeddings,
+        "data": data_manifest,
+        "results": results,
+    }
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{commit}{'-dirty' if dirty else ''}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path, report
+
+def load_results(ref, results_dir=RESULTS_DIR):
+    """A saved report by path, or by commit (anything `git rev-parse` understands: main, HEAD~1, a sha)."""
+    if os.path.exists(ref):
+        path = ref
+    else:
+        commit = subprocess.run(["git", "rev-parse", "--short=12", ref], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+        path = os.path.join(results_dir, f"{commit or ref}.json")
+    if not os.path.exists(path):
+        raise SystemExit(f"No saved results for {ref} ({path}); check it out and run the suite there first.")
+    with open(path) as f:
+        return json.load(f)
+
+def compare(baseline, current, threshold=0.2):
+    """Print per-case median changes; returns the cases more than threshold slower than baseline."""
+    if baseline.get("data") != current.get("data") or baseline.get("embeddings") != current.get("embeddings"):
+        print("Warning: the two runs used different data or embeddings, the numbers are not comparable.")
+    print(f"\n{'case':<34} {baseline['commit']:>12} {current['commit']:>12} {'change':>8}")
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<34} {'-':>12} {result['median_ms']:>12.3f}")
+            continue
+        change = result["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+        flag = "  SLOWER" if change > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<34} {before['median_ms']:>12.3f} {result['median_ms']:>12.3f} {change:>+8.0%}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("data_dir", help="A folder written by `python -m benchmarks.synthetic_data`.")
+    parser.add_argument("--queries", type=int, default=200, help="Query locations per per-call case.")
+    parser.add_argument("--embeddings", choices=["hash", "minilm"], default="hash")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", default=None, help="Commit (or results file) to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slow-down reported as a regression.")
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir)
+    try:
+        with open(os.path.join(data_dir, "synthetic.json")) as f:
+            data_manifest = json.load(f)
+    except FileNotFoundError:
+        raise SystemExit(f"{data_dir} has no synthetic.json; create it with `python -m benchmarks.synthetic_data {args.data_dir}`.")
+    # before anything imports utils.paths: every default path now points into the synthetic folder
+    os.environ["RESTAURANT_DATA_DIR"] = data_dir
+    os.environ["DATA_GOV_OFFLINE"] = "1"
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    baseline = load_results(args.compare, args.results_dir) if args.compare else None # before this run overwrites it
+    results = run(data_dir, args.queries, args.embeddings, args.seed)
+    path, report = save_results(results, data_manifest, args.results_dir, args.embeddings)
+    print(f"\nSaved {path}")
+    if baseline is not None:
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} cases more than {args.threshold:.0%} slower: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,237 @@
+"""Synthetic restaurant data at Singapore scale, in the same formats as the scraped data folder.
+
+    python -m benchmarks.synthetic_data /tmp/bench-data --places 100000
+    python -m benchmarks.synthetic_data /tmp/bench-1m --places 1000000 --about-sidecar
+
+Writes places.csv, all_reviews.csv, About/*.json, the planning area GeoJSON and data.gov.sg
+snapshots (gov_cache/) into the output folder, so RESTAURANT_DATA_DIR=<folder> runs the whole
+pipeline on it. Coordinates are drawn inside the planning area polygons, clustered around a few
+hubs per area like real food streets, so every place's planning area is known. The same seed
+always gives the same files. --about-sidecar writes the compacted about.parquet instead of one
+JSON file per place (what `cli.py compact-about` would produce), which saves ~1M small files.
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+
+CUISINES = [
+    ("Restaurant", 20), ("Chinese restaurant", 14), ("Cafe", 10), ("Japanese restaurant", 8), ("Hawker stall", 8),
+    ("Coffee shop", 6), ("Korean restaurant", 5), ("Indian restaurant", 5), ("Italian restaurant", 4),
+    ("Thai restaurant", 4), ("Fast food restaurant", 4), ("Bakery", 3), ("Bar", 3), ("Vegetarian restaurant", 2),
+    ("Seafood restaurant", 2), ("Malay restaurant", 2), ("Dessert shop", 2),
+    ("Supermarket", 1), ("Hotel", 1), # dropped by load_all_restaurants, as in the scraped data
+]
+DISHES = ["Chicken Rice", "Laksa", "Char Kway Teow", "Nasi Lemak", "Fish and Chips", "Ramen", "Fried Chicken",
+          "Kimchi Stew", "Carbonara", "Pad Thai", "Roti Prata", "Satay", "Dim Sum", "Sushi", "Bibimbap", "Curry"]
+ABOUT_OPTIONS = {
+    "Service options": ["Dine-in", "Takeaway", "Delivery", "Outdoor seating", "No-contact delivery"],
+    "Offerings": ["Alcohol", "Beer", "Coffee", "Halal food", "Vegetarian options", "Small plates"],
+    "Dining options": ["Breakfast", "Brunch", "Lunch", "Dinner", "Dessert", "Seating"],
+    "Atmosphere": ["Casual", "Cosy", "Trendy", "Upmarket"],
+    "Crowd": ["Family friendly", "Groups", "Tourists", "University students"],
+    "Children": ["Good for kids", "High chairs", "Kids' menu"],
+    "Accessibility": ["Wheelchair-accessible entrance", "Wheelchair-accessible seating", "Wheelchair-accessible toilet"],
+    "Amenities": ["Toilets", "Wi-Fi", "Bar on site"],
+    "Payments": ["Credit cards", "Debit cards", "NFC mobile payments", "Cash only"],
+    "Parking": ["Paid parking lot", "Free street parking", "Plenty of parking"],
+    "Planning": ["Accepts reservations", "Reservations required", "Quick visit"],
+    "Pets": ["Dogs allowed", "Dogs allowed outside"],
+    "Highlights": ["Great coffee", "Great cocktails", "Late-night food", "Live music"],
+}
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# (open hour, open minute, close hour, close minute); scraped data repeats a few schedules a lot
+SCHEDULES = [(11, 0, 22, 0), (10, 30, 21, 30), (7, 0, 15, 0), (17, 0, 23, 30), (12, 0, 0, 0), (8, 0, 20, 0), (0, 0, 0, 0)]
+HUB_SPREAD_DEGREES = 0.004 # ~450 m standard deviation of places around their hub
+REVIEWS_CHUNK_PLACES = 50_000 # places whose reviews are generated and written at once
+
+def contains(geometry, xs, ys):
+    """Boolean array: which of the points (xs, ys) lie inside geometry."""
+    import geopandas as gpd
+    return gpd.GeoSeries(gpd.points_from_xy(xs, ys)).within(geometry).to_numpy()
+
+def random_points_in(geometry, n, rng):
+    """n uniform points inside a polygon, by rejection sampling in its bounding box."""
+    min_x, min_y, max_x, max_y = geometry.bounds
+    xs, ys = np.empty(0), np.empty(0)
+    while len(xs) < n:
+        x = rng.uniform(min_x, max_x, 4 * (n - len(xs)) + 16)
+        y = rng.uniform(min_y, max_y, len(x))
+        inside = contains(geometry, x, y)
+        xs, ys = np.append(xs, x[inside]), np.append(ys, y[inside])
+    return ys[:n], xs[:n]
+
+def sample_locations(areas_gdf, n, rng, area_column="planning_area"):
+    """(lats, lons, planning areas) of n places: areas weighted by size times a random popularity,
+    places scattered around 1-6 hubs per area and kept inside their own area's polygon."""
+    weights = np.array([geometry.area for geometry in areas_gdf.geometry]) * rng.lognormal(0, 0.8, len(areas_gdf))
+    counts = rng.multinomial(n, weights / weights.sum())
+    lats, lons, names = np.empty(n), np.empty(n), np.empty(n, dtype=object)
+    start = 0
+    for (_, area), count in zip(areas_gdf.iterrows(), counts):
+        if count == 0:
+            continue
+        geometry = area.geometry
+        hub_lats, hub_lons = random_points_in(geometry, int(rng.integers(1, 7)), rng)
+        hub = rng.integers(len(hub_lats), size=count)
+        lat = hub_lats[hub] + rng.normal(0, HUB_SPREAD_DEGREES, count)
+        lon = hub_lons[hub] + rng.normal(0, HUB_SPREAD_DEGREES, count)
+        outside = ~contains(geometry, lon, lat)
+        if outside.any(): # drawn across the boundary: place uniformly inside the area instead
+            lat[outside], lon[outside] = random_points_in(geometry, int(outside.sum()), rng)
+        lats[start:start + count], lons[start:start + count] = lat, lon
+        names[start:start + count] = area[area_column]
+        start += count
+    order = rng.permutation(n) # don't leave the file sorted by area
+    return lats[order], lons[order], names[order]
+
+def open_hours_string(schedule, closed_day):
+    hours = {day: list(schedule) for day in DAYS if day != closed_day}
+    return str(hours)
+
+def places_frame(lats, lons, areas, rng):
+    n = len(lats)
+    names, weights = zip(*CUISINES)
+    category = rng.choice(np.array(names, dtype=object), size=n, p=np.array(weights) / sum(weights))
+    place_ids = np.array([f"SYN{i:010d}" for i in range(n)], dtype=object)
+    schedules = [open_hours_string(s, d) for s in SCHEDULES for d in (None, "Monday", "Sunday")]
+    lat_s, lon_s = np.char.mod("%.7f", lats), np.char.mod("%.7f", lons)
+    links = [f"https://www.google.com/maps/place/Synthetic+{i}/data=!4m7!3m6!1s0x0:0x{i:x}!8m2!3d{la}!4d{lo}!16s!19s{pid}"
+             for i, (la, lo, pid) in enumerate(zip(lat_s, lon_s, place_ids))]
+    return pd.DataFrame({
+        "place_id": place_ids,
+        "name": [f"Synthetic {c.split()[0]} {i}" for i, c in enumerate(category)],
+        "link": links,
+        "main_category": category,
+        "categories": [str([c, "Restaurant"]) for c in category],
+        "rating": np.round(np.clip(rng.normal(4.1, 0.45, n), 1, 5), 1),
+        "reviews": np.floor(rng.lognormal(4, 1.5, n)) + 1,
+        "address": [f"{i % 999 + 1} Synthetic Road, {area}, Singapore" for i, area in enumerate(areas)],
+        "website": "",
+        "open_hours": np.array(schedules, dtype=object)[rng.integers(len(schedules), size=n)],
+        "is_spending_on_ads": rng.random(n) < 0.05,
+        "last_updated": 1747890937,
+    })
+
+def write_reviews(path, place_ids, reviews_per_place, rng):
+    """all_reviews.csv with about reviews_per_place rows per place (at least one, so no place
+    loses its average review date), written a chunk of places at a time."""
+    dishes = np.array(DISHES, dtype=object)
+    prices = np.array(["$1–10", "$10–20", "$20–30", "$30–40", "$40–50", "$50–100", "$100+"], dtype=object)
+    days = (pd.Timestamp("2025-06-01") - pd.Timestamp("2018-01-01")).days
+    total = 0
+    for start in range(0, len(place_ids), REVIEWS_CHUNK_PLACES):
+        ids = place_ids[start:start + REVIEWS_CHUNK_PLACES]
+        counts = np.maximum(1, rng.poisson(reviews_per_place, len(ids)))
+        rows = int(counts.sum())
+        place_price = rng.integers(len(prices) - 1, size=len(ids)) # each place has a typical price band
+        owner = np.repeat(np.arange(len(ids)), counts)
+
+        def scores(missing):
+            values = rng.integers(1, 6, rows).astype(float)
+            values[rng.random(rows) < missing] = np.nan
+            return values
+
+        price = prices[np.clip(place_price[owner] + rng.integers(-1, 2, rows), 0, len(prices) - 1)].copy()
+        price[rng.random(rows) < 0.5] = None
+        recommended = np.full(rows, "", dtype=object)
+        with_dishes = rng.random(rows) < 0.2
+        recommended[with_dishes] = [", ".join(rng.choice(dishes, 2, replace=False)) for _ in range(int(with_dishes.sum()))]
+        pd.DataFrame({
+            "place_id": ids[owner],
+            "date": (pd.Timestamp("2018-01-01") + pd.to_timedelta(rng.integers(days, size=rows), unit="D")).strftime("%Y-%m-%d"),
+            "Food": scores(0.3),
+            "Service": scores(0.35),
+            "Atmosphere": scores(0.4),
+            "Price per person": price,
+            "Recommended dishes": recommended,
+        }).to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+        total += rows
+    return total
+
+def about_rows(place_ids, rng):
+    """{"place_id", "About": {section: [values]}} per place, each section present with probability 0.7."""
+    rows = []
+    for place_id in place_ids:
+        about = {}
+        for section, options in ABOUT_OPTIONS.items():
+            if rng.random() < 0.7:
+                picks = rng.choice(len(options), size=int(rng.integers(1, len(options) + 1)), replace=False)
+                about[section] = [options[i] for i in sorted(picks)]
+        rows.append({"place_id": place_id, "About": about})
+    return rows
+
+def write_about(about_dir, rows, sidecar_path=None):
+    """One JSON file per place, or (sidecar_path) the compacted Parquet sidecar of an empty About folder."""
+    from utils.data_loader import about_signature
+    os.makedirs(about_dir, exist_ok=True)
+    if sidecar_path is None:
+        for row in rows:
+            with open(os.path.join(about_dir, f"{row['place_id']}.json"), "w") as f:
+                json.dump({**row, "status": "success"}, f)
+        return
+    # same rows and signature file compact_about() writes, for the (empty) About folder
+    about_df = pd.DataFrame([{"place_id": row["place_id"], **{k: ", ".join(v) for k, v in row["About"].items()}} for row in rows])
+    about_df.sort_values("place_id", kind="stable").reset_index(drop=True).to_parquet(sidecar_path, index=False)
+    with open(sidecar_path + ".json", "w") as f:
+        json.dump({"about_path": about_dir, "signature": about_signature(about_dir)}, f)
+
+def write_gov_data(cache_dir, areas, rng):
+    """Population and construction snapshots shaped like the data.gov.sg datasets, one record per area."""
+    from utils.gov_data import write_snapshot
+    from utils.singapore import population_dataset_id, construction_dataset_id
+    years = [str(y) for y in range(2019, 2024)]
+    population = [{"_id": i + 1, "Number": f"{area} - Total", **{y: int(rng.integers(0, 250_000)) for y in years}}
+                  for i, area in enumerate(areas)]
+    construction = [{"_id": i + 1, "planning_area": area, "development": f"Synthetic development {i + 1}",
+                     "status": str(rng.choice(["Planned", "Under construction", "Completed"]))}
+                    for i, area in enumerate(areas)]
+    for resource_id, records in [(population_dataset_id, population), (construction_dataset_id, construction)]:
+        write_snapshot(resource_id, {"success": True, "result": {"records": records}}, cache_dir)
+
+def generate(out_dir, places=10_000, reviews_per_place=5, seed=0, about_sidecar=False, boundaries=None):
+    """Write the synthetic data folder; returns its manifest (also saved as synthetic.json)."""
+    import geopandas as gpd
+    from utils.paths import data_path
+    from utils.singapore import planning_areas_path
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.time()
+    boundaries = boundaries or planning_areas_path
+    areas_path = os.path.join(out_dir, "district_and_planning_area.geojson")
+    if os.path.abspath(boundaries) != os.path.abspath(areas_path):
+        shutil.copyfile(boundaries, areas_path)
+    areas_gdf = gpd.read_file(areas_path)
+
+    lats, lons, areas = sample_locations(areas_gdf, places, rng)
+    places_df = places_frame(lats, lons, areas, rng)
+    places_df.to_csv(os.path.join(out_dir, "places.csv"), index=False)
+    review_count = write_reviews(os.path.join(out_dir, "all_reviews.csv"), places_df["place_id"].to_numpy(), reviews_per_place, rng)
+    write_about(os.path.join(out_dir, "About"), about_rows(places_df["place_id"], rng),
+                os.path.join(out_dir, "about.parquet") if about_sidecar else None)
+    write_gov_data(os.path.join(out_dir, "gov_cache"), areas_gdf["planning_area"].tolist(), rng)
+    residual_model = data_path("residual_corrector.pkl") # the real corrector, so SWOT scores get their correction
+    if os.path.exists(residual_model) and os.path.dirname(os.path.abspath(residual_model)) != os.path.abspath(out_dir):
+        shutil.copyfile(residual_model, os.path.join(out_dir, "residual_corrector.pkl"))
+
+    manifest = {"places": places, "reviews": review_count, "reviews_per_place": reviews_per_place, "seed": seed,
+                "about_sidecar": about_sidecar, "planning_areas": len(areas_gdf), "generated_s": round(time.time() - start, 1)}
+    with open(os.path.join(out_dir, "synthetic.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--places", type=int, default=10_000)
+    parser.add_argument("--reviews-per-place", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--about-sidecar", action="store_true", help="Write about.parquet instead of About/*.json.")
+    parser.add_argument("--boundaries", default=None, help="Planning area GeoJSON (default: the one in the data folder).")
+    args = parser.parse_args()
+    manifest = generate(args.out_dir, args.places, args.reviews_per_place, args.seed, args.about_sidecar, args.boundaries)
+    print(f"Wrote {manifest['places']} places and {manifest['reviews']} reviews to {args.out_dir} in {manifest['generated_s']}s")
@@ -0,0 +1,292 @@
+import argparse
+import os
+import time
+
+os.environ["TOKENIZERS_PARALLELISM"] = "false" # avoid parallelism warning
+
+def build_index(args):
+    from utils.data_loader import load_restaurants
+    from models.faiss_index import restaurant_documents, current_corpus_version, build_corpus_index, \
+        update_corpus_index, index_params, load_index_params, corpus_version_dir, INDEX_DEFAULTS
+
+    params = None
+    if args.index_type:
+        overrides = {key: getattr(args, key) for key in INDEX_DEFAULTS[args.index_type]}
+        params = index_params(args.index_type, **overrides)
+
+    documents = restaurant_documents(load_restaurants())
+    current = current_corpus_version(args.index_dir)
+    if args.full:
+        if params is None and current is not None:
+            params = load_index_params(corpus_version_dir(args.index_dir, current)) # rebuild as the same kind of index
+        print(f"Embedding all {len(documents)} restaurants...")
+        db, fingerprint = build_corpus_index(documents, args.index_dir, params)
+    else:
+        db, fingerprint, changes = update_corpus_index(documents, args.index_dir, params)
+        if current and current_corpus_version(args.index_dir) == current: # nothing was saved
+            print(f"Corpus index is up to date ({fingerprint[:16]}, {db.index.ntotal} documents).")
+            return
+        print(f"Added {changes['added']}, re-embedded {changes['updated']}, deleted {changes['deleted']} restaurants.")
+    print(f"Saved corpus index {fingerprint[:16]} ({db.index.ntotal} vectors) to {args.index_dir}")
+
+def gc_index(args):
+    from models.faiss_index import prune_corpus_versions
+    deleted = prune_corpus_versions(args.index_dir, args.keep)
+    print(f"Deleted {len(deleted)} old corpus index versions" + (f": {', '.join(deleted)}" if deleted else "."))
+
+def build_city(args):
+    from utils.cities import get_city_router
+    from models.faiss_index import restaurant_documents, update_corpus_index
+
+    router = get_city_router()
+    names = router.cities() if args.city == "all" else [args.city]
+    if not names:
+        print(f"No cities in {router.root}.")
+    for name in names:
+        shard = router.describe(name)
+        start = time.time()
+        documents = restaurant_documents(shard.restaurants)
+        db, fingerprint, _ = update_corpus_index(documents, shard.path("corpus_index"))
+        print(f"{shard.display_name}: {len(documents)} restaurants, corpus index {fingerprint[:16]} in {time.time() - start:.1f}s")
+        shard.unload() # one city in memory at a time
+
+def build_snapshot(args):
+    from utils.data_loader import build_restaurant_snapshot, snapshot_is_fresh, SNAPSHOT_PATH
+    sources = (args.places, args.reviews, args.about)
+    if not args.force and snapshot_is_fresh(*sources):
+        print(f"Restaurant snapshot {SNAPSHOT_PATH} is up to date.")
+        return
+    start = time.time()
+    places_df = build_restaurant_snapshot(*sources)
+    print(f"Wrote {len(places_df)} restaurants to {SNAPSHOT_PATH} in {time.time() - start:.1f}s")
+
+def compact_about(args):
+    from utils.data_loader import compact_about, print_progress
+    start = time.time()
+    about_df = compact_about(args.about, args.sidecar, args.workers, print_progress)
+    print(f"Compacted {len(about_df)} About files into {args.sidecar} in {time.time() - start:.1f}s")
+
+def refresh_gov_data(args):
+    from utils.gov_data import read_snapshot, refresh_dataset
+    from utils.singapore import population_dataset_id, construction_dataset_id
+
+    for name, resource_id in [("population", population_dataset_id), ("construction", construction_dataset_id)]:
+        fetched_at, _ = read_snapshot(resource_id, args.cache_dir)
+        if fetched_at is not None and time.time() - fetched_at < args.max_age and not args.force:
+            print(f"{name}: snapshot is fresh ({time.ctime(fetched_at)})")
+            continue
+        response = refresh_dataset(resource_id, args.cache_dir)
+        print(f"{name}: saved {len(response['result']['records'])} records")
+
+def llm_cache(args):
+    from models.llm_cache import get_llm_cache
+    cache = get_llm_cache()
+    if args.action == "clear":
+        cache.clear()
+        print(f"Cleared {cache.path}")
+        return
+    stats = cache.stats()
+    print(f"{stats['entries']} cached responses, {stats['size_mb']:.1f} MB in {cache.path}")
+
+def export_training_data(args):
+    from utils.data_loader import load_all_restaurants
+    places_df = load_all_restaurants(args.places, args.reviews, args.about)
+    places_df.to_csv(args.output, index=False)
+    print(f"Wrote {len(places_df)} restaurants to {args.output}")
+
+def filter_training_data(args):
+    from utils.cleaner import filter_training_data
+    filtered_df = filter_training_data(args.input, args.output)
+    print(f"Kept {len(filtered_df)} complete rows in {args.output}")
+
+def batch_score(args):
+    import asyncio
+    from models.batch_scoring import score_batch, RETRIEVAL_CONCURRENCY
+    from models.rag_model import LLM_CONCURRENCY
+
+    def progress(scored, elapsed):
+        if scored % 10 == 0:
+            print(f"  {scored} specs scored in {elapsed:.0f}s")
+
+    start = time.time()
+    scored, skipped, failed = asyncio.run(score_batch(
+        args.input, args.output, args.concurrency or LLM_CONCURRENCY, args.retrieval_concurrency or RETRIEVAL_CONCURRENCY,
+        use_cache=not args.no_cache, progress=progress))
+    print(f"Scored {scored} specs in {time.time() - start:.1f}s ({skipped} already in {args.output}, {failed} failed)")
+    if failed:
+        print("Re-run the same command to retry the failed specs.")
+
+def train_corrector(args):
+    from models.training import train_corrector
+
+    params = {"n_estimators": args.n_estimators, "learning_rate": args.learning_rate,
+              "max_depth": args.max_depth, "subsample": args.subsample}
+    start = time.time()
+    _, report = train_corrector(params, args.csv, args.output, args.folds, args.jobs, args.refresh_swot)
+    cv, latency = report["cv"], report["latency"]
+    print(f"{args.folds}-fold CV: MAE {cv['mae']:.2f} ± {cv['mae_std']:.2f}, RMSE {cv['rmse']:.2f} "
+          f"(uncorrected LLM score MAE {cv['baseline_mae']:.2f})")
+    print(f"Inference: {latency['single_row_ms']:.3f} ms per single-row predict, {latency['batched_row_ms']:.4f} ms per row batched")
+    print(f"Saved {args.output} in {time.time() - start:.1f}s")
+
+def prompt_report(args):
+    import json
+    from models.preprocessing import parse_inputs, parse_rag
+    from models.prompt_budget import assemble_prompt, format_usage, PROMPT_TOKEN_BUDGET
+    from models.rag_model import coordinates_prompt_sections, format_prompt_sections, retrieve_similar, \
+        get_corpus_index, get_faiss_index, FILTERED_RETRIEVAL
+
+    with open(args.input) as f:
+        structured_input = parse_inputs(json.load(f))
+    budget = args.budget or PROMPT_TOKEN_BUDGET
+
+    _, usage = assemble_prompt(coordinates_prompt_sections(structured_input, retrieve_similar(structured_input, get_corpus_index())), budget)
+    print("Coordinates prompt:")
+    print(format_usage(usage, budget))
+
+    if structured_input["location"]:
+        rag_input = parse_rag(structured_input)
+        retrieved_docs = retrieve_similar(rag_input, get_corpus_index() if FILTERED_RETRIEVAL else get_faiss_index())
+        _, usage = assemble_prompt(format_prompt_sections(rag_input, retrieved_docs), budget)
+        print("\nSWOT prompt:")
+        print(format_usage(usage, budget))
+
+def trace_report(args):
+    from utils.tracing import summarize_log, format_summary
+    since = time.time() - args.last * 3600 if args.last else None
+    stats = summarize_log(args.log, since)
+    if not stats:
+        print(f"No spans in {args.log}.")
+        return
+    print(format_summary(stats))
+
+def suggest_locations(args):
+    import json
+    from models.preprocessing import parse_inputs
+    from models.location_optimizer import get_location_grid
+    from models.rag_model import get_all_restaurants
+
+    with open(args.input) as f:
+        structured_input = parse_inputs(json.load(f))
+    grid = get_location_grid(get_all_restaurants())
+    start = time.perf_counter()
+    ranked = grid.rank(structured_input, args.top)
+    print(f"Scored {len(grid.cells)} cells in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(ranked.round(3).to_string(index=False))
+
+def startup_bench(args):
+    from benchmarks.startup import report
+    report(args.module, args.top, args.repeat)
+
+def main():
+    from models.faiss_index import CORPUS_INDEX_DIR, CORPUS_INDEX_KEEP
+    from utils.paths import data_path
+    from utils.tracing import TRACE_LOG
+
+    parser = argparse.ArgumentParser(description="Offline maintenance commands for the restaurant RAG model.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("build-index", help="Embed the restaurant corpus and persist the FAISS index.")
+    p.add_argument("--index-dir", default=CORPUS_INDEX_DIR)
+    p.add_argument("--full", action="store_true", help="Re-embed every restaurant instead of only the changed ones.")
+    p.add_argument("--index-type", choices=["flat", "hnsw", "ivfpq"], default=None,
+                   help="Rebuild as this index type (default: keep the current one, or FAISS_INDEX_TYPE for a new index).")
+    p.add_argument("--M", type=int, default=None, help="hnsw: links per node.")
+    p.add_argument("--ef-construction", type=int, default=None, help="hnsw: candidate list size while building.")
+    p.add_argument("--ef-search", type=int, default=None, help="hnsw: candidate list size per query.")
+    p.add_argument("--nlist", type=int, default=None, help="ivfpq: number of clusters (0: 4 * sqrt(vectors)).")
+    p.add_argument("--m", type=int, default=None, help="ivfpq: sub-quantizers per vector.")
+    p.add_argument("--nbits", type=int, default=None, help="ivfpq: bits per sub-quantizer code.")
+    p.add_argument("--nprobe", type=int, default=None, help="ivfpq: clusters searched per query.")
+    p.set_defaults(func=build_index)
+
+    p = subparsers.add_parser("gc-index", help="Delete old corpus index versions (each refresh also does this).")
+    p.add_argument("--index-dir", default=CORPUS_INDEX_DIR)
+    p.add_argument("--keep", type=int, default=CORPUS_INDEX_KEEP, help="Versions kept besides the current one.")
+    p.set_defaults(func=gc_index)
+
+    p = subparsers.add_parser("build-city", help="Build the restaurant snapshot and corpus index of a city under data/cities.")
+    p.add_argument("city", help="Folder name under data/cities, or 'all'.")
+    p.set_defaults(func=build_city)
+
+    p = subparsers.add_parser("build-snapshot", help="Merge places, reviews and About data into the Parquet snapshot.")
+    p.add_argument("--places", default=data_path("places.csv"))
+    p.add_argument("--reviews", default=data_path("all_reviews.csv"))
+    p.add_argument("--about", default=data_path("About"))
+    p.add_argument("--force", action="store_true", help="Rebuild even if the sources did not change.")
+    p.set_defaults(func=build_snapshot)
+
+    p = subparsers.add_parser("compact-about", help="Read About/*.json in parallel into one Parquet sidecar.")
+    p.add_argument("--about", default=data_path("About"))
+    p.add_argument("--sidecar", default=data_path("about.parquet"))
+    p.add_argument("--workers", type=int, default=16)
+    p.set_defaults(func=compact_about)
+
+    p = subparsers.add_parser("refresh-gov-data", help="Download the data.gov.sg population/construction snapshots.")
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--max-age", type=float, default=0, help="Skip datasets whose snapshot is younger than this (seconds).")
+    p.add_argument("--force", action="store_true")
+    p.set_defaults(func=refresh_gov_data)
+
+    p = subparsers.add_parser("llm-cache", help="Inspect or clear the GPT-4o response cache.")
+    p.add_argument("action", choices=["stats", "clear"])
+    p.set_defaults(func=llm_cache)
+
+    p = subparsers.add_parser("export-training-data", help="Write the merged restaurant table to valid_training_data.csv.")
+    p.add_argument("--places", default=data_path("places.csv"))
+    p.add_argument("--reviews", default=data_path("all_reviews.csv"))
+    p.add_argument("--about", default=data_path("About"))
+    p.add_argument("--output", default=data_path("valid_training_data.csv"))
+    p.set_defaults(func=export_training_data)
+
+    p = subparsers.add_parser("filter-training-data", help="Drop training rows with missing required fields.")
+    p.add_argument("--input", default=data_path("valid_training_data.csv"))
+    p.add_argument("--output", default=data_path("filtered_training_data.csv"))
+    p.set_defaults(func=filter_training_data)
+
+    p = subparsers.add_parser("batch-score", help="Score a CSV/JSONL of restaurant specs, resuming from the output file.")
+    p.add_argument("input", help="CSV or JSONL with the fields main.py asks for; an empty location gets suggested ones.")
+    p.add_argument("output", help="JSONL results, one line per spec (also the resume checkpoint).")
+    p.add_argument("--concurrency", type=int, default=None, help="GPT-4o calls in flight (default LLM_CONCURRENCY).")
+    p.add_argument("--retrieval-concurrency", type=int, default=None, help="Prompts built at once (default RETRIEVAL_CONCURRENCY).")
+    p.add_argument("--no-cache", action="store_true", help="Always call the API instead of the response cache.")
+    p.set_defaults(func=batch_score)
+
+    p = subparsers.add_parser("train-corrector", help="Retrain residual_corrector.pkl from cached SWOT outputs and features.")
+    p.add_argument("--csv", default=data_path("filtered_training_data.csv"))
+    p.add_argument("--output", default=data_path("residual_corrector.pkl"))
+    p.add_argument("--n-estimators", type=int, default=100)
+    p.add_argument("--learning-rate", type=float, default=0.1)
+    p.add_argument("--max-depth", type=int, default=3)
+    p.add_argument("--subsample", type=float, default=1.0)
+    p.add_argument("--folds", type=int, default=5)
+    p.add_argument("--jobs", type=int, default=-1, help="Cross-validation folds fitted in parallel (-1 = all cores).")
+    p.add_argument("--refresh-swot", action="store_true", help="Discard the cached SWOT outputs and ask GPT-4o again.")
+    p.set_defaults(func=train_corrector)
+
+    p = subparsers.add_parser("prompt-report", help="Show per-section token usage of the prompts for one restaurant.")
+    p.add_argument("input", help="JSON file with the fields main.py asks for (add a location for the SWOT prompt).")
+    p.add_argument("--budget", type=int, default=None, help="Token budget (default PROMPT_TOKEN_BUDGET).")
+    p.set_defaults(func=prompt_report)
+
+    p = subparsers.add_parser("trace-report", help="p50/p95/p99 per pipeline stage from the TRACING=1 span log.")
+    p.add_argument("--log", default=TRACE_LOG)
+    p.add_argument("--last", type=float, default=None, help="Only spans from the last N hours.")
+    p.set_defaults(func=trace_report)
+
+    p = subparsers.add_parser("suggest-locations", help="Rank grid cells for a restaurant without GPT-4o (main.py --grid).")
+    p.add_argument("input", help="JSON file with the fields main.py asks for.")
+    p.add_argument("--top", type=int, default=10)
+    p.set_defaults(func=suggest_locations)
+
+    p = subparsers.add_parser("startup-bench", help="Measure how long importing a module takes (python -X importtime).")
+    p.add_argument("--module", default="main")
+    p.add_argument("--top", type=int, default=15)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=startup_bench)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,12 @@
 import os
-import re
-from copy import deepcopy
-from models.rag_model import run_rag_pipeline, coordinates_pipeline
-from models.preprocessing import parse_inputs, parse_rag
+import asyncio
+import argparse
+from models.rag_model import run_rag_pipeline, coordinates_pipeline, evaluate_locations
+from models.preprocessing import parse_inputs, parse_rag, extract_best_fit_coords
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false" # avoid parallelism warning
 
-if __name__ == "__main__":
-    print("Please enter the following restaurant attributes:")
-
+def prompt_user_input():
     user_input = {
         # "location": input("Location (latitude, longitude): "), # uncomment this line if you want to input your own location
         "cuisine": input("Cuisine (e.g., Korean, Thai): "),
@@ -28,6 +26,12 @@ if __name__ == "__main__":
         "children": input("Child-friendliness (e.g., good for kids, high chairs available): "), 
         "pets": input("Pets (dogs allowed inside/outside etc): ")
     }
+    return user_input
+
+def main(args):
+    print("Please enter the following restaurant attributes:")
+
+    user_input = prompt_user_input()
     structured_input = parse_inputs(user_input)
 
     # # uncomment this block if you want to input your own location
@@ -36,50 +40,29 @@ if __name__ == "__main__":
     # print(swot_output)
 
     # comment out the rest of the code below if you want to input your own location
-    coordinates_output = coordinates_pipeline(structured_input)
-    print("\n--- COORDINATES: ---\n")
-    print(coordinates_output)
+    if args.grid:
+        # score the whole grid locally instead of asking GPT-4o for coordinates
+        from models.location_optimizer import suggest_locations
+        coords = suggest_locations(structured_input, args.top)
+        print("\n--- COORDINATES (grid search): ---\n")
+        print("\n".join(f"{area}: ({coord})" for area, coord in coords))
+    else:
+        coordinates_output = coordinates_pipeline(structured_input)
+        print("\n--- COORDINATES: ---\n")
+        print(coordinates_output)
 
-def extract_best_fit_coords(text):
-    section = text
-    m = re.search(r"Best-Fit Coordinates:?(.*)", text, flags=re.S|re.I)
-    if m:
-        section = m.group(1)
+        coords = extract_best_fit_coords(coordinates_output)  
 
-    pattern = re.compile(
-        r"(?:\*\*(?P<area_bold>[^:*]+)\*\*:|\b(?P<area_plain>[A-Za-z][\w\s&'()-]+):)?"
-        r"\s*\(\s*(?P<lat>[+-]?\d+(?:\.\d+)?)\s*,\s*(?P<lon>[+-]?\d+(?:\.\d+)?)\s*\)",
-        flags=re.I
-    )
+    # evaluate every candidate location concurrently (see LLM_CONCURRENCY in rag_model.py)
+    outputs = asyncio.run(evaluate_locations(structured_input, coords))
 
-    results = []
-    for g in pattern.finditer(section):
-        area = (g.group("area_bold") or g.group("area_plain") or "").strip()
-        coord_str = f"{g.group('lat')}, {g.group('lon')}"
-        results.append((area, coord_str))
+    for area, coord, swot in outputs:
+        print(f"\n=== {area} — {coord} ===")
+        print("\n--- SWOT ANALYSIS: ---\n")
+        print(swot)
 
-    # Deduplicate while preserving order
-    seen = set()
-    deduped = []
-    for area, coord in results:
-        if coord not in seen:
-            seen.add(coord)
-            deduped.append((area, coord))
-    return deduped
-
-coords = extract_best_fit_coords(coordinates_output)  
-
-outputs = []
-for area, coord in coords:
-    this_inputs = deepcopy(structured_input)
-    this_inputs['location'] = coord
-    parsed = parse_rag(this_inputs)    
-    swot_output = run_rag_pipeline(parsed)
-    outputs.append((area, coord, swot_output))
-
-for area, coord, swot in outputs:
-    print(f"\n=== {area} — {coord} ===")
-    print("\n--- SWOT ANALYSIS: ---\n")
-    print(swot)
-
-   
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suggest locations for a restaurant and run a SWOT analysis of each.")
+    parser.add_argument("--grid", action="store_true", help="Pick the locations by local grid search instead of GPT-4o.")
+    parser.add_argument("--top", type=int, default=3, help="Locations to suggest with --grid.")
+    main(parser.parse_args())
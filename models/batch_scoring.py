@@ -0,0 +1,140 @@
+import os
+import csv
+import json
+import re
+import time
+import asyncio
+from models.preprocessing import parse_inputs, parse_rag, extract_best_fit_coords
+from models.rag_model import build_coordinates_prompt, build_rag_prompt, call_gpt4o_async, score_swot_output, \
+    forget_gpt4o_response, swot_response_options, LLM_CONCURRENCY, LLM_TIMEOUT, LLM_MAX_RETRIES
+
+RETRIEVAL_CONCURRENCY = int(os.getenv("RETRIEVAL_CONCURRENCY", 2)) # prompts built (FAISS + geo context) at once
+
+def spec_to_user_input(spec):
+    """One CSV/JSONL row -> the dict parse_inputs expects (lists are joined back into comma-separated strings)."""
+    user_input = {}
+    for key, value in spec.items():
+        if value is None or (isinstance(value, float) and value != value):
+            value = ""
+        elif isinstance(value, (list, tuple)):
+            value = ", ".join(str(v) for v in value)
+        user_input[key] = str(value)
+    return user_input
+
+def read_specs(path):
+    """Yield (spec_id, spec) from a .csv or .jsonl file; spec_id is the "id" column or the row number."""
+    if path.endswith(".jsonl"):
+        with open(path) as f:
+            rows = (json.loads(line) for line in f if line.strip())
+            for i, row in enumerate(rows):
+                yield str(row.pop("id", i)), row
+    else:
+        with open(path, newline="") as f:
+            for i, row in enumerate(csv.DictReader(f)):
+                yield str(row.pop("id", None) or i), row
+
+def completed_ids(output_path):
+    """Spec ids already written to output_path, so an interrupted run can pick up where it stopped."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                # a line cut short when the last run was killed
+                continue
+    return done
+
+def adjusted_score(swot_output):
+    m = re.search(r"Residual-adjusted Success Score: ([-\d.]+)", swot_output or "")
+    return float(m.group(1)) if m else None
+
+async def score_spec(spec, llm_semaphore, retrieval_semaphore, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, use_cache=True):
+    """Score one restaurant spec: at its own location if it has one, else at each suggested location."""
+    structured_input = parse_inputs(spec_to_user_input(spec))
+
+    # Retrieval/geo context (CPU, worker threads) and the LLM call (network) are limited
+    # separately, so prompts for the next specs are built while earlier calls are waiting
+    async def llm(build_prompt, stage_input, check=None, **options):
+        async with retrieval_semaphore:
+            prompt = await asyncio.to_thread(build_prompt, stage_input)
+        async with llm_semaphore:
+            reply = await call_gpt4o_async(prompt, timeout, max_retries, use_cache, **options)
+        if check is not None and not check(reply):
+            # not kept in the response cache either, or the retry would read the same reply back
+            forget_gpt4o_response(prompt, **options)
+            raise ValueError(f"unusable reply to the {build_prompt.__name__} prompt")
+        return reply
+
+    async def swot_at(area, coord):
+        rag_input = parse_rag(dict(structured_input, location=coord))
+        swot_output = score_swot_output(rag_input, await llm(build_rag_prompt, rag_input, **swot_response_options()))
+        return {"area": area, "location": coord, "score": adjusted_score(swot_output), "swot": swot_output}
+
+    coordinates_output = None
+    if structured_input["location"]:
+        coords = [("", structured_input["location"])]
+    else:
+        # no coordinates parsed: fail the spec, so it is left out of the output and retried next run
+        coordinates_output = await llm(build_coordinates_prompt, structured_input, check=extract_best_fit_coords)
+        coords = extract_best_fit_coords(coordinates_output)
+
+    results = await asyncio.gather(*(swot_at(area, coord) for area, coord in coords))
+    return {"coordinates_output": coordinates_output, "results": results}
+
+async def score_batch(input_path, output_path, concurrency=LLM_CONCURRENCY, retrieval_concurrency=RETRIEVAL_CONCURRENCY,
+                      timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, use_cache=True, progress=None):
+    """Score every spec in input_path and append one JSON line per finished spec to output_path.
+
+    Specs already present in output_path are skipped, so re-running the same command resumes an
+    interrupted batch. Specs that fail are reported and left out of the output, so the next run
+    retries them. Returns (scored, skipped, failed) counts.
+    """
+    done = completed_ids(output_path)
+    llm_semaphore = asyncio.Semaphore(concurrency)
+    retrieval_semaphore = asyncio.Semaphore(retrieval_concurrency)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"scored": 0, "skipped": 0, "failed": 0}
+    start = time.time()
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    with open(output_path, "a+") as out:
+        out.seek(0, os.SEEK_END)
+        if out.tell():
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n") # don't append onto a line cut short by an interrupted run
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                spec_id, spec = item
+                try:
+                    scored = await score_spec(spec, llm_semaphore, retrieval_semaphore, timeout, max_retries, use_cache)
+                except Exception as e:
+                    print(f"Spec {spec_id} failed:", e)
+                    counts["failed"] += 1
+                    continue
+                out.write(json.dumps({"id": spec_id, "input": spec, **scored}) + "\n")
+                out.flush()
+                counts["scored"] += 1
+                if progress:
+                    progress(counts["scored"], time.time() - start)
+
+        # enough workers to keep every LLM slot busy while the next prompts are being built
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency + retrieval_concurrency)]
+        for spec_id, spec in read_specs(input_path):
+            if spec_id in done:
+                counts["skipped"] += 1
+                continue
+            await queue.put((spec_id, spec))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    return counts["scored"], counts["skipped"], counts["failed"]
@@ -0,0 +1,72 @@
+import os
+import threading
+from functools import lru_cache
+import numpy as np
+from utils.tracing import span
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+EMBED_NUM_THREADS = int(os.getenv("EMBED_NUM_THREADS", 0)) # 0 keeps torch's default
+QUERY_CACHE_SIZE = int(os.getenv("EMBED_QUERY_CACHE_SIZE", 1024))
+
+class SharedEmbeddings(Embeddings):
+    """One lazily loaded MiniLM model for the whole process.
+
+    encode() embeds in batches of batch_size; embed_query() keeps an LRU cache of query vectors,
+    so the same format_dict_as_string query is only run through the model once. Texts are
+    flattened to one line first, exactly like HuggingFaceEmbeddings, so vectors match indexes
+    built with it.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, batch_size=EMBED_BATCH_SIZE,
+                 num_threads=EMBED_NUM_THREADS, query_cache_size=QUERY_CACHE_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self._model = None
+        self._lock = threading.Lock()
+        self._cached_query = lru_cache(maxsize=query_cache_size)(self._embed_query)
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                import torch
+                from sentence_transformers import SentenceTransformer
+                if self.num_threads:
+                    torch.set_num_threads(self.num_threads)
+                self._model = SentenceTransformer(self.model_name)
+            return self._model
+
+    def encode(self, texts, batch_size=None):
+        """Embed texts as a float32 (len(texts), dim) array."""
+        texts = [text.replace("\n", " ") for text in texts]
+        with span("embed", rows=len(texts)): # only on query cache misses for embed_query
+            return np.asarray(
+                self.model.encode(texts, batch_size=batch_size or self.batch_size, convert_to_numpy=True, show_progress_bar=False),
+                dtype=np.float32,
+            )
+
+    def _embed_query(self, text):
+        return tuple(self.encode([text])[0].tolist())
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return list(self._cached_query(text))
+
+    def query_cache_info(self):
+        return self._cached_query.cache_info()
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings():
+    """The process-wide embedding service; the model itself only loads on the first encode."""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            _embeddings = SharedEmbeddings()
+        return _embeddings
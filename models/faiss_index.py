@@ -1,11 +1,426 @@
+import os
+import json
+import shutil
+import pickle
+import hashlib
+from datetime import datetime
+from weakref import WeakKeyDictionary
+import numpy as np
+import pandas as pd
+import faiss
+from langchain.schema import Document
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from models.embeddings import get_embeddings, EMBEDDING_MODEL_NAME
+from utils.paths import data_path
+from models.preprocessing import format_dict_as_string
+from models.metadata_store import MetadataStore, METADATA_COLUMNS
 
-def build_faiss_index(documents):
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    db = FAISS.from_documents(documents, embeddings)
+# Versioned corpus index: one sub folder per corpus fingerprint, CURRENT points at the live one
+CORPUS_INDEX_DIR = data_path("corpus_index")
+# Older versions kept besides CURRENT: processes that loaded them before a refresh keep reading them
+CORPUS_INDEX_KEEP = int(os.getenv("CORPUS_INDEX_KEEP", 2))
+
+# Index types for the corpus index. flat is exact; hnsw answers faster on large corpora and
+# ivfpq needs ~1/30 of the memory, both at some recall (see benchmarks/ann_index.py).
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+INDEX_DEFAULTS = {
+    "flat": {},
+    "hnsw": {"M": 32, "ef_construction": 200, "ef_search": 64},
+    "ivfpq": {"nlist": 0, "m": 48, "nbits": 8, "nprobe": 16}, # nlist 0: 4 * sqrt(number of vectors)
+}
+INDEX_PARAMS_FILE = "index_params.json"
+VECTORS_FILE = "vectors.npy" # exact vectors kept next to approximate indexes
+METADATA_FILE = "metadata.parquet" # MetadataStore rows in index position order
+# Filtered searches score up to this many selected vectors directly; bigger selections on an
+# approximate index are searched through it with a bitmap of the selected positions
+FILTER_EXACT_MAX = int(os.getenv("FILTER_EXACT_MAX", 20000))
+
+def restaurant_document(row):
+    """Turn one restaurant row (Series or dict) into the Document stored in the corpus index."""
+    doc_dict = {
+        "name": row.get("name", []),
+        "cuisine": row.get("main_category", []),
+        "rating": row.get("rating", []),
+        "price": row.get("Price per person", row.get("average_price", [])),
+        "review count": row.get("reviews", []),
+        "address": row.get("address", []),
+        "open hours": row.get("open_hours", []),
+        "categories": row.get("categories", []),
+        "latitude,longitude":row.get("latitude, longitude", []),
+        "atmosphere rating": row.get("average_atmosphere_score",[]),
+        "service rating": row.get("average_service_score",[]),
+        "food rating": row.get("average_food_score",[]),
+        "service options": row.get("Service options", []),
+        "offerings": row.get("Offerings",[]),
+        "dining options": row.get("Dining options",[]),
+        "crowd": row.get("Crowd",[]),
+        "children": row.get("Children",[]),
+        "accessibility": row.get("Accessibility",[]),
+        "amenities": row.get("Amenities",[]),
+        "payments": row.get("Payments",[]),
+        "planning": row.get("Planning",[]),
+        "pets": row.get("Pets",[])
+    }
+    metadata = {column: row.get(column) for column in METADATA_COLUMNS}
+    # NaN -> None so missing values look the same in the docstore and the metadata store
+    metadata = {column: None if isinstance(value, float) and value != value else value for column, value in metadata.items()}
+    return Document(page_content=format_dict_as_string(doc_dict), metadata={"place_id": row.get("place_id", ""), **metadata})
+
+def restaurant_documents(all_restaurants_df):
+    """One Document per place_id (first occurrence wins, so docstore ids stay unique)."""
+    df = all_restaurants_df.drop_duplicates(subset="place_id", keep="first")
+    return [restaurant_document(row) for row in df.to_dict("records")]
+
+def corpus_fingerprint(documents):
+    """Hash of the embedding model plus every (place_id, text) pair, used as the index version."""
+    h = hashlib.sha256(EMBEDDING_MODEL_NAME.encode("utf-8"))
+    for doc in documents:
+        h.update(str(doc.metadata.get("place_id", "")).encode("utf-8"))
+        h.update(b"\0")
+        h.update(doc.page_content.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def content_hash(document):
+    return hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+
+def index_params(index_type=INDEX_TYPE, **overrides):
+    """Build parameters for an index_type: its INDEX_DEFAULTS with any non-None overrides."""
+    if index_type not in INDEX_DEFAULTS:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {', '.join(INDEX_DEFAULTS)}")
+    overrides = {key: value for key, value in overrides.items() if value is not None}
+    unknown = set(overrides) - set(INDEX_DEFAULTS[index_type])
+    if unknown:
+        raise ValueError(f"{index_type} index has no parameter {', '.join(sorted(unknown))}")
+    return {"index_type": index_type, **INDEX_DEFAULTS[index_type], **overrides}
+
+def make_index(vectors, params):
+    """A FAISS index of params' type holding vectors (row i at position i), ranked by squared L2 like IndexFlatL2.
+
+    Returns (index, params) with the parameters actually used, e.g. nlist and nbits reduced to
+    what the number of vectors can train.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    params = dict(params)
+    if params["index_type"] == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif params["index_type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["M"])
+        index.hnsw.efConstruction = params["ef_construction"]
+    elif params["index_type"] == "ivfpq":
+        params["nlist"] = min(params["nlist"] or max(1, int(4 * np.sqrt(n))), max(1, n))
+        params["nbits"] = min(params["nbits"], max(1, int(np.log2(max(n, 2)))))
+        while dim % params["m"]:
+            params["m"] -= 1 # sub-quantizers must split the dimensions evenly
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, params["nlist"], params["m"], params["nbits"])
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index type {params['index_type']!r}")
+    index.add(vectors)
+    set_search_params(index, params)
+    return index, params
+
+def set_search_params(index, params):
+    if params.get("index_type") == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = params["ef_search"]
+    elif params.get("index_type") == "ivfpq":
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+
+def pack_index(db, params):
+    """Swap db's flat index for one built with params; keeps the exact vectors as db.exact_vectors."""
+    if params["index_type"] == "flat":
+        db.exact_vectors = None
+        return params
+    vectors = db.index.reconstruct_n(0, db.index.ntotal)
+    db.index, params = make_index(vectors, params)
+    db.exact_vectors = vectors
+    return params
+
+def unpack_index(db):
+    """Swap an approximate index back to the exact flat index (positions unchanged), so vectors can be removed."""
+    vectors = getattr(db, "exact_vectors", None)
+    if vectors is not None:
+        db.index, _ = make_index(np.asarray(vectors), index_params("flat"))
+        db.exact_vectors = None
+
+def build_faiss_index(documents, ids=None):
+    db = FAISS.from_documents(documents, get_embeddings(), ids=ids)
     return db
 
-def search_similar_documents(query, faiss_index, k=3): # you can change k = for more or less similarity searches
-    return faiss_index.similarity_search(query, k=k)
+def search_similar_documents(query, faiss_index, k=3, filters=None): # you can change k = for more or less similarity searches
+    """The k documents closest to query, among those whose metadata matches filters (see MetadataStore)."""
+    if not filters:
+        return faiss_index.similarity_search(query, k=k)
+    metadata = getattr(faiss_index, "metadata", None)
+    if metadata is None:
+        raise ValueError("This index has no metadata store, rebuild it with `python cli.py build-index --full`")
+
+    positions = metadata.select(filters)
+    if len(positions) <= FILTER_EXACT_MAX or isinstance(faiss.downcast_index(faiss_index.index), faiss.IndexFlat):
+        return search_positions(query, faiss_index, positions, k)
+    return search_selected(query, faiss_index, positions, k)
+
+def documents_at(db, positions):
+    return [db.docstore.search(db.index_to_docstore_id[int(position)]) for position in positions]
+
+def search_positions(query, db, positions, k=3):
+    """The k documents closest to query among the given index positions, scoring their vectors directly.
+
+    Costs one distance per position, so the tighter the selection the cheaper the search. Uses
+    the same squared L2 distance as the flat index, so results match a search over a FAISS
+    index built from just those places.
+    """
+    if len(positions) == 0:
+        return []
+    query_vector = np.asarray(db.embedding_function.embed_query(query), dtype=np.float32)
+    # approximate indexes (ivfpq) can't give back their vectors exactly, the saved copy can
+    exact_vectors = getattr(db, "exact_vectors", None)
+    vectors = exact_vectors[positions] if exact_vectors is not None else db.index.reconstruct_batch(positions)
+    distances = ((vectors - query_vector) ** 2).sum(axis=1)
+    top = np.argsort(distances, kind="stable")[:k]
+    return documents_at(db, positions[top])
+
+def search_selected(query, db, positions, k=3):
+    """Search db's own (approximate) index, skipping every position not in positions (IDSelectorBitmap)."""
+    query_vector = np.asarray([db.embedding_function.embed_query(query)], dtype=np.float32)
+    bitmap = np.zeros(db.index.ntotal, dtype=bool)
+    bitmap[positions] = True
+    bitmap = np.packbits(bitmap, bitorder="little") # bit i of the bitmap is position i
+    selector = faiss.IDSelectorBitmap(db.index.ntotal, faiss.swig_ptr(bitmap))
+
+    index = faiss.downcast_index(db.index)
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    elif faiss.try_extract_index_ivf(index) is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    _, ids = db.index.search(query_vector, k, params=params)
+    return documents_at(db, ids[0][ids[0] >= 0])
+
+# FAISS store -> (number of vectors, {docstore id: position}), rebuilt if the store changes size
+_positions_by_id = WeakKeyDictionary()
+
+def docstore_positions(db):
+    cached = _positions_by_id.get(db)
+    if cached is None or cached[0] != len(db.index_to_docstore_id):
+        cached = (len(db.index_to_docstore_id), {doc_id: pos for pos, doc_id in db.index_to_docstore_id.items()})
+        _positions_by_id[db] = cached
+    return cached[1]
+
+def search_within_ids(query, db, place_ids, k=3):
+    """Similarity search over only the given place_ids (see search_positions).
+
+    Nothing is re-embedded except the (cached) query; ids missing from the index are skipped.
+    """
+    positions_by_id = docstore_positions(db)
+    positions = np.array(
+        [positions_by_id[place_id] for place_id in dict.fromkeys(map(str, place_ids)) if place_id in positions_by_id],
+        dtype=np.int64,
+    )
+    return search_positions(query, db, positions, k)
+
+def build_corpus_index(documents, index_dir=CORPUS_INDEX_DIR, params=None):
+    """Embed the whole corpus once and persist it (as a params index, flat by default) under index_dir."""
+    fingerprint = corpus_fingerprint(documents)
+    ids = [str(doc.metadata.get("place_id", "")) for doc in documents]
+    db = build_faiss_index(documents, ids=ids)
+    hashes = {place_id: content_hash(doc) for place_id, doc in zip(ids, documents)}
+    params = pack_index(db, params or index_params())
+    save_corpus_index(db, fingerprint, hashes, index_dir, params)
+    return db, fingerprint
+
+def update_corpus_index(documents, index_dir=CORPUS_INDEX_DIR, params=None):
+    """Bring the persisted index in line with documents, re-embedding only new or changed places.
 
+    Every version keeps a place_id -> content hash map next to the vectors, so a refresh diffs
+    the hashes, deletes vectors of removed/changed places and embeds just the changed/new ones.
+    Approximate indexes can't delete vectors, so they are rebuilt from the exact vectors saved
+    next to them (nothing is re-embedded). params defaults to the live index's own parameters.
+    Falls back to a full build when there is no index yet.
+    """
+    manifest = current_corpus_version(index_dir)
+    if manifest is None or manifest.get("embedding_model") != EMBEDDING_MODEL_NAME:
+        db, fingerprint = build_corpus_index(documents, index_dir, params)
+        return db, fingerprint, {"added": len(documents), "updated": 0, "deleted": 0}
+
+    current_params = load_index_params(corpus_version_dir(index_dir, manifest))
+    params = current_params if params is None or params_match(params, current_params) else params
+    db = load_corpus_index(get_embeddings(), index_dir, mmap=False)
+    old_hashes = load_content_hashes(index_dir)
+    new_docs = {str(doc.metadata.get("place_id", "")): doc for doc in documents}
+    new_hashes = {place_id: content_hash(doc) for place_id, doc in new_docs.items()}
+
+    deleted = [place_id for place_id in old_hashes if place_id not in new_hashes]
+    updated = [place_id for place_id, h in new_hashes.items() if place_id in old_hashes and old_hashes[place_id] != h]
+    added = [place_id for place_id in new_hashes if place_id not in old_hashes]
+
+    fingerprint = corpus_fingerprint(documents)
+    if fingerprint == manifest["fingerprint"] and params is current_params and \
+            manifest.get("metadata_columns") == METADATA_COLUMNS and not metadata_changed(db, new_docs):
+        return db, fingerprint, {"added": 0, "updated": 0, "deleted": 0}
+
+    stale = deleted + updated
+    fresh = updated + added
+    # a metadata only change keeps the index as it is, anything else rebuilds it from the exact vectors
+    rebuild = bool(stale or fresh) or params is not current_params
+    if rebuild:
+        unpack_index(db)
+    if stale:
+        db.delete(stale)
+    if fresh:
+        db.add_documents([new_docs[place_id] for place_id in fresh], ids=fresh)
+    # ratings, prices and scores can change without the text changing: take every place's metadata from documents
+    for place_id, doc in new_docs.items():
+        db.docstore.search(place_id).metadata = doc.metadata
+
+    if rebuild:
+        params = pack_index(db, params)
+    save_corpus_index(db, fingerprint, new_hashes, index_dir, params)
+    return db, fingerprint, {"added": len(added), "updated": len(updated), "deleted": len(deleted)}
+
+def metadata_changed(db, docs_by_id):
+    """True if any place's metadata moved (e.g. its success_score, which drifts with review recency)
+    since db was saved; such a corpus is saved as a new version without re-embedding anything."""
+    if db.metadata is None:
+        return True
+    ordered = [docs_by_id[db.index_to_docstore_id[position]] for position in range(db.index.ntotal)]
+    return not MetadataStore.from_documents(ordered).to_frame().equals(db.metadata.to_frame())
+
+def metadata_hash(metadata):
+    return hashlib.sha256(pd.util.hash_pandas_object(metadata.to_frame(), index=False).to_numpy().tobytes()).hexdigest()
+
+def params_match(requested, built):
+    """True if an index built with `built` is what `requested` asks for (nlist 0 means any)."""
+    return all(built.get(key) == value for key, value in requested.items() if not (key == "nlist" and value == 0))
+
+def corpus_version_dir(index_dir, manifest):
+    # <fingerprint[:16]>[-<type>-<params hash>]-m<metadata hash>, the type part for non flat indexes only
+    return os.path.join(index_dir, manifest.get("version", manifest["fingerprint"][:16]))
+
+def load_index_params(version_dir):
+    """The parameters a version was built with (indexes saved before they were recorded are flat)."""
+    try:
+        with open(os.path.join(version_dir, INDEX_PARAMS_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return index_params("flat")
+
+def load_content_hashes(index_dir=CORPUS_INDEX_DIR):
+    manifest = current_corpus_version(index_dir)
+    if manifest is None:
+        return {}
+    path = os.path.join(corpus_version_dir(index_dir, manifest), "content_hashes.json")
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_corpus_index(db, fingerprint, hashes, index_dir=CORPUS_INDEX_DIR, params=None):
+    """Write db as a new version under index_dir and point CURRENT at it.
+
+    The version name covers the texts, the index parameters and the metadata, so a version
+    directory is never rewritten once CURRENT has pointed at it: other processes may have it
+    memory-mapped. Saving a version that already exists only moves CURRENT back to it. Versions
+    beyond the CORPUS_INDEX_KEEP most recent ones before it are deleted afterwards.
+    """
+    params = params or index_params("flat")
+    db.metadata = MetadataStore.from_documents(documents_at(db, range(db.index.ntotal)))
+    version = fingerprint[:16]
+    if params["index_type"] != "flat":
+        params_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+        version += f"-{params['index_type']}-{params_hash[:8]}"
+    version += f"-m{metadata_hash(db.metadata)[:8]}"
+    version_dir = os.path.join(index_dir, version)
+    if not os.path.exists(os.path.join(version_dir, "manifest.json")): # the manifest is written last
+        write_corpus_version(db, fingerprint, hashes, version_dir, version, params)
+
+    # Swap the CURRENT pointer atomically so a running process never sees a half written version
+    tmp_path = os.path.join(index_dir, "CURRENT.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(index_dir, "CURRENT"))
+    prune_corpus_versions(index_dir)
+    return version_dir
+
+def prune_corpus_versions(index_dir=CORPUS_INDEX_DIR, keep=CORPUS_INDEX_KEEP):
+    """Delete every version but CURRENT and the `keep` most recently written others; returns their names.
+    Folders without a manifest are left alone, another process may still be writing them."""
+    manifest = current_corpus_version(index_dir)
+    if manifest is None:
+        return []
+    current = os.path.basename(corpus_version_dir(index_dir, manifest))
+    versions = []
+    for name in os.listdir(index_dir):
+        manifest_path = os.path.join(index_dir, name, "manifest.json")
+        if name != current and os.path.exists(manifest_path):
+            versions.append((os.path.getmtime(manifest_path), name))
+    stale = [name for _, name in sorted(versions, reverse=True)[max(keep, 0):]]
+    for name in stale:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+    return stale
+
+def write_corpus_version(db, fingerprint, hashes, version_dir, version, params):
+    db.save_local(version_dir)
+    with open(os.path.join(version_dir, "content_hashes.json"), "w") as f:
+        json.dump(hashes, f)
+    with open(os.path.join(version_dir, INDEX_PARAMS_FILE), "w") as f:
+        json.dump(params, f, indent=2)
+    if getattr(db, "exact_vectors", None) is not None:
+        np.save(os.path.join(version_dir, VECTORS_FILE), np.asarray(db.exact_vectors, dtype=np.float32))
+    db.metadata.save(os.path.join(version_dir, METADATA_FILE))
+
+    manifest = {
+        "fingerprint": fingerprint,
+        "version": version,
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "num_documents": db.index.ntotal,
+        "index": params,
+        "metadata_columns": METADATA_COLUMNS,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(version_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+def current_corpus_version(index_dir=CORPUS_INDEX_DIR):
+    """Return the manifest of the live corpus index, or None if it was never built."""
+    try:
+        with open(os.path.join(index_dir, "CURRENT")) as f:
+            version = f.read().strip()
+        with open(os.path.join(index_dir, version, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def load_corpus_index(embeddings, index_dir=CORPUS_INDEX_DIR, fingerprint=None, mmap=True, search_params=None):
+    """Load the persisted corpus index; the FAISS vectors are memory-mapped instead of read into RAM.
+
+    search_params (e.g. {"ef_search": 128} or {"nprobe": 32}) override the saved ones for this process.
+    """
+    manifest = current_corpus_version(index_dir)
+    if manifest is None:
+        return None
+    if fingerprint is not None and manifest["fingerprint"] != fingerprint:
+        return None # stale: built from different data
+
+    version_dir = corpus_version_dir(index_dir, manifest)
+    io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(os.path.join(version_dir, "index.faiss"), io_flags)
+    params = {**load_index_params(version_dir), **(search_params or {})}
+    set_search_params(index, params)
+    with open(os.path.join(version_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    db = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+    vectors_path = os.path.join(version_dir, VECTORS_FILE)
+    db.exact_vectors = np.load(vectors_path, mmap_mode="r" if mmap else None) if os.path.exists(vectors_path) else None
+    metadata_path = os.path.join(version_dir, METADATA_FILE)
+    db.metadata = MetadataStore.load(metadata_path) if os.path.exists(metadata_path) else None
+    return db
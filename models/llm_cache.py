@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from utils.paths import data_path
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", data_path("llm_cache.sqlite"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 30 * 24 * 3600)) # seconds
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", 200)) # least recently used responses are evicted beyond this
+RESYNC_EVERY = 1000 # writes between recounts of the cache size (other processes may share the file)
+
+def cache_disabled():
+    return os.getenv("LLM_CACHE_DISABLE", "").lower() in ("1", "true", "yes")
+
+def normalize_prompt(prompt):
+    """Ignore whitespace that doesn't change the prompt: surrounding blank lines and trailing spaces."""
+    return "\n".join(line.rstrip() for line in prompt.strip().splitlines())
+
+def cache_key(model, temperature, prompt, **params):
+    payload = {"model": model, "temperature": temperature, "prompt": normalize_prompt(prompt), **params}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """SQLite-backed LLM response cache with a TTL, size-based LRU eviction and hit/miss counters."""
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_mb=LLM_CACHE_MAX_MB):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                size INTEGER,
+                created_at REAL,
+                last_used REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self.conn.commit()
+        # running total of the response sizes, so a write doesn't sum the whole table
+        self.total_bytes = self.stored_bytes()
+        self.writes = 0
+
+    def stored_bytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, created_at, size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                self.total_bytes -= row[2]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, model, response):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self.lock:
+            replaced = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self.total_bytes += size - (replaced[0] if replaced else 0)
+            self.writes += 1
+            if self.writes % RESYNC_EVERY == 0:
+                self.total_bytes = self.stored_bytes()
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        # drop least recently used rows until we are back under the limit
+        excess = self.total_bytes - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.total_bytes -= freed
+
+    def delete(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                self.total_bytes -= row[0]
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.hits = self.misses = 0
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "size_mb": size / (1024 * 1024),
+            }
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache()
+        return _llm_cache
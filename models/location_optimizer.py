@@ -0,0 +1,191 @@
+import re
+import numpy as np
+import pandas as pd
+from models.locations import latlon_arrays, haversine_km, per_frame_cache, cached_per_frame, KM_PER_DEGREE, \
+    NEIGHBORHOOD_CELL_KM
+from models.metadata_store import MetadataStore
+
+# Candidate locations without asking GPT-4o: every ~250 m cell around the restaurants is scored at
+# once from the restaurant table, and the best cells (one per planning area) go to the SWOT pipeline.
+# Each component is z-scored over the cells before weighting, so weights are relative importances.
+OPTIMIZER_WEIGHTS = {
+    "density": 1.0,         # restaurants within DENSITY_RADIUS_KM: foot traffic
+    "competition": -1.0,    # similar restaurants (same cuisine and price band) within COMPETITION_RADIUS_KM
+    "similar_success": 1.0, # mean success_score of similar restaurants within SUCCESS_RADIUS_KM
+    "population": 0.5,      # residents of the cell's planning area (data.gov.sg, Singapore only)
+    "residual": 0.5,        # residual corrector's prediction for this restaurant at the cell
+}
+DENSITY_RADIUS_KM = 0.5
+COMPETITION_RADIUS_KM = 0.5
+SUCCESS_RADIUS_KM = 1.5
+SUCCESS_PRIOR_WEIGHT = 3 # similar restaurants' worth of the citywide mean blended into each cell's mean success
+MIN_NEARBY = 3 # cells with fewer restaurants around them are skipped (water, forest, industrial land)
+MIN_SEPARATION_KM = 1.0 # between two suggested locations
+
+class LocationGrid:
+    """Grid of cell_km cells over a restaurant table, with everything that doesn't depend on the
+    restaurant being placed: each cell's planning area, the restaurants around it and its population.
+
+    Sums "within radius_km" of a cell add up the cells whose centres are that close, so they are
+    exact to about half a cell; good enough to rank cells, not to describe one (see NeighborhoodTiles).
+    """
+
+    def __init__(self, all_restaurants_df, cell_km=NEIGHBORHOOD_CELL_KM):
+        from utils.cities import get_planning_areas, get_city_bbox
+        lats, lons = latlon_arrays(all_restaurants_df["latitude, longitude"])
+        # only rows inside the city's boundaries: one (0, 0) geocode would stretch the grid over half the globe
+        min_lon, min_lat, max_lon, max_lat = get_city_bbox()
+        with np.errstate(invalid="ignore"):
+            located = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        self.cell_km = cell_km
+        self.cell_lat = cell_km / KM_PER_DEGREE
+        self.cell_lon = self.cell_lat / max(np.cos(np.radians(np.mean(lats[located]))), 1e-6)
+        margin = int(np.ceil(max(DENSITY_RADIUS_KM, COMPETITION_RADIUS_KM, SUCCESS_RADIUS_KM) / cell_km))
+        self.lat0 = lats[located].min() - margin * self.cell_lat
+        self.lon0 = lons[located].min() - margin * self.cell_lon
+        self.shape = (int((lats[located].max() - self.lat0) / self.cell_lat) + margin + 1,
+                      int((lons[located].max() - self.lon0) / self.cell_lon) + margin + 1)
+
+        rows = np.floor((lats - self.lat0) / self.cell_lat)
+        cols = np.floor((lons - self.lon0) / self.cell_lon)
+        self.cell_of = np.where(located, np.nan_to_num(rows) * self.shape[1] + np.nan_to_num(cols), -1).astype(np.int64)
+        self.located = located
+
+        nearby = self.around(self.counts(located), DENSITY_RADIUS_KM).ravel()
+        # only cells with restaurants around are candidates, so only those need a planning area
+        self.cells = np.flatnonzero(nearby >= MIN_NEARBY)
+        self.lats = self.lat0 + (self.cells // self.shape[1] + 0.5) * self.cell_lat
+        self.lons = self.lon0 + (self.cells % self.shape[1] + 0.5) * self.cell_lon
+        self.areas = np.asarray(get_planning_areas(self.lats, self.lons), dtype=object)
+        in_area = np.array([area is not None for area in self.areas], dtype=bool)
+        self.cells, self.lats, self.lons, self.areas = self.cells[in_area], self.lats[in_area], self.lons[in_area], self.areas[in_area]
+        self.nearby = nearby[self.cells]
+        self.population = area_population(self.areas)
+
+        self.metadata = MetadataStore(all_restaurants_df) # for the retrieval filters of each query
+        self.success = pd.to_numeric(all_restaurants_df["success_score"], errors="coerce").to_numpy(dtype=float)
+
+    def counts(self, mask, weights=None):
+        """(rows, cols) grid of restaurants per cell among those in mask (or their summed weights)."""
+        mask = mask & self.located
+        return np.bincount(self.cell_of[mask], None if weights is None else weights[mask],
+                           minlength=self.shape[0] * self.shape[1]).reshape(self.shape).astype(float)
+
+    def around(self, grid, radius_km):
+        """Sum of grid over the cells whose centres lie within radius_km of each cell's centre."""
+        reach = int(radius_km / self.cell_km)
+        padded = np.pad(grid, reach)
+        total = np.zeros_like(grid)
+        for dy in range(-reach, reach + 1):
+            for dx in range(-reach, reach + 1):
+                if (dy * dy + dx * dx) * self.cell_km ** 2 <= radius_km ** 2:
+                    total += padded[reach + dy:reach + dy + self.shape[0], reach + dx:reach + dx + self.shape[1]]
+        return total
+
+    def components(self, structured_input, filters=None):
+        """Raw (unweighted) score components of every candidate cell as a DataFrame."""
+        from models.rag_model import retrieval_filters
+        similar = self.metadata.mask(retrieval_filters(structured_input) if filters is None else filters)
+        scored = similar & ~np.isnan(self.success)
+        success_sum = self.around(self.counts(scored, self.success), SUCCESS_RADIUS_KM).ravel()[self.cells]
+        success_count = self.around(self.counts(scored), SUCCESS_RADIUS_KM).ravel()[self.cells]
+        # shrunk towards the mean over all similar restaurants, so one lucky neighbour doesn't make a hotspot
+        prior = np.mean(self.success[scored]) if scored.any() else 0.0
+        mean_success = (success_sum + SUCCESS_PRIOR_WEIGHT * prior) / (success_count + SUCCESS_PRIOR_WEIGHT)
+        return pd.DataFrame({
+            "area": self.areas,
+            "latitude": self.lats,
+            "longitude": self.lons,
+            "density": np.log1p(self.nearby),
+            "competition": np.log1p(self.around(self.counts(similar), COMPETITION_RADIUS_KM).ravel()[self.cells]),
+            "similar_success": mean_success,
+            "population": np.log1p(self.population),
+            "residual": residual_prior(structured_input, self.lats, self.lons),
+        })
+
+    def rank(self, structured_input, n=3, weights=None, filters=None, distinct_areas=True, min_separation_km=MIN_SEPARATION_KM):
+        """The n best cells for structured_input, best first, with their score and components.
+        Picks are at least min_separation_km apart and (distinct_areas) in different planning areas."""
+        weights = OPTIMIZER_WEIGHTS if weights is None else weights
+        ranked = self.components(structured_input, filters)
+        ranked["score"] = sum(weight * zscore(ranked[name].to_numpy()) for name, weight in weights.items() if weight)
+        picked, areas = [], set()
+        for i in np.argsort(-ranked["score"].to_numpy(), kind="stable"):
+            if len(picked) == n:
+                break
+            if distinct_areas and ranked["area"].iat[i] in areas:
+                continue
+            if picked and haversine_km(ranked["latitude"].iat[i], ranked["longitude"].iat[i], ranked["latitude"].iloc[picked].to_numpy(),
+                                       ranked["longitude"].iloc[picked].to_numpy()).min() < min_separation_km:
+                continue
+            picked.append(i)
+            areas.add(ranked["area"].iat[i])
+        return ranked.iloc[picked].reset_index(drop=True)
+
+def zscore(values):
+    """(values - mean) / std over the finite values; missing values and constant columns score 0."""
+    finite = np.isfinite(values)
+    if finite.sum() < 2 or np.std(values[finite]) == 0:
+        return np.zeros(len(values))
+    return np.where(finite, (values - np.mean(values[finite])) / np.std(values[finite]), 0.0)
+
+def area_population(areas):
+    """Residents per cell from the data.gov.sg population records (0 where unknown or outside Singapore).
+    A planning area's figure is the largest latest-year number among the records naming it (its total row)."""
+    from utils.cities import active_shard
+    population = np.zeros(len(areas))
+    if active_shard() is not None:
+        return population
+    try:
+        from utils.singapore import get_population_response
+        records = get_population_response()["result"]["records"]
+    except Exception as e:
+        print("Population data unavailable, ranking locations without it:", e)
+        return population
+
+    by_area = {}
+    names = [a for a in dict.fromkeys(areas) if a]
+    for record in records:
+        years = sorted(key for key in record if re.fullmatch(r"\d{4}", str(key)))
+        if not years:
+            continue
+        try:
+            value = float(str(record[years[-1]]).replace(",", ""))
+        except ValueError:
+            continue
+        label = str(record.get("Number", "")).lower()
+        for name in names:
+            if name.lower() in label:
+                by_area[name] = max(by_area.get(name, 0.0), value)
+    return np.array([by_area.get(area, 0.0) for area in areas])
+
+def residual_prior(structured_input, lats, lons):
+    """The residual corrector's prediction for this restaurant at every (lat, lon), with the SWOT
+    features held at 0: only the location part of the correction differs between cells."""
+    from models.preprocessing import extract_features, parse_rag
+    from models.rag_model import get_residual_model
+    try:
+        rag_input = parse_rag({**structured_input, "location": "0, 0"})
+        if isinstance(structured_input.get("price"), (int, float)): # already parsed, parse_rag would zero it
+            rag_input["price"] = float(structured_input["price"])
+        base = extract_features(rag_input) + [0.0] * 16
+        features = np.tile(np.asarray(base, dtype=float), (len(lats), 1))
+        features[:, 0], features[:, 1] = lats, lons
+        return np.asarray(get_residual_model().predict(features), dtype=float)
+    except Exception as e:
+        print("Residual model unavailable, ranking locations without it:", e)
+        return np.zeros(len(lats))
+
+_location_grids = per_frame_cache()
+
+def get_location_grid(all_restaurants_df, max_cached=4):
+    return cached_per_frame(_location_grids, all_restaurants_df, LocationGrid, max_cached)
+
+def suggest_locations(structured_input, n=3, all_restaurants_df=None, **options):
+    """[(planning area, "lat, lon"), ...] of the n best cells, the same shape extract_best_fit_coords
+    returns for the GPT-4o suggestions, so evaluate_locations can take either."""
+    from models.rag_model import get_all_restaurants
+    if all_restaurants_df is None:
+        all_restaurants_df = get_all_restaurants()
+    ranked = get_location_grid(all_restaurants_df).rank(structured_input, n, **options)
+    return [(area, f"{lat:.6f}, {lon:.6f}") for area, lat, lon in zip(ranked["area"], ranked["latitude"], ranked["longitude"])]
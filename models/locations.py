@@ -1,65 +1,176 @@
 import pandas as pd
+import numpy as np
+from collections import OrderedDict
 from geopy.distance import geodesic
-import ast
+from sklearn.neighbors import BallTree
+from utils.data_loader import OPEN_HOURS_DAYS, OPEN_HOURS_COLUMNS, open_hours_columns
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Haversine (sphere) and geodesic (WGS84 ellipsoid) distances differ by at most ~0.56% anywhere
+# on Earth. Points whose haversine distance falls within this relative band of the radius are
+# re-checked with geopy's geodesic, so radius queries return exactly what the old loop returned.
+GEODESIC_TOLERANCE = 0.01
+
+def latlon_arrays(coords):
+    """Split a 'latitude, longitude' column of tuples or "(lat, lon)" strings into float arrays (NaN if missing)."""
+    lats = np.full(len(coords), np.nan)
+    lons = np.full(len(coords), np.nan)
+    for i, value in enumerate(coords):
+        if isinstance(value, str):
+            value = value.strip("()").split(",")
+        try:
+            lat, lon = value
+            lats[i], lons[i] = float(lat), float(lon)
+        except (TypeError, ValueError):
+            pass
+    return lats, lons
+
+def haversine_km(lat1, lon1, lats, lons):
+    lat1, lon1, lats, lons = map(np.radians, (lat1, lon1, lats, lons))
+    a = np.sin((lats - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lats) * np.sin((lons - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+WGS84_A_KM = 6378.137
+WGS84_E2 = 1 / 298.257223563 * (2 - 1 / 298.257223563)
+
+def local_ellipsoid_km(lat1, lon1, lats, lons):
+    """Geodesic distance for short lines, from the WGS84 radii of curvature at the mid latitude.
+
+    Off from geopy's geodesic by about (distance / earth radius)^2 / cos(latitude)^2 relative
+    (~1e-10 at 500 m in Singapore), and vectorized.
+    """
+    phi = np.radians((lat1 + lats) / 2)
+    w = np.sqrt(1 - WGS84_E2 * np.sin(phi) ** 2)
+    meridional = WGS84_A_KM * (1 - WGS84_E2) / w ** 3
+    prime_vertical = WGS84_A_KM / w
+    return np.hypot(meridional * np.radians(lats - lat1), prime_vertical * np.cos(phi) * np.radians(lons - lon1))
+
+class SpatialIndex:
+    """BallTree (haversine metric) over the restaurant coordinates, built once per DataFrame.
+
+    Radius queries match geopy geodesic semantics exactly: the tree returns every point within
+    radius * (1 + GEODESIC_TOLERANCE), points clearly inside are accepted on their haversine
+    distance and only the thin boundary band is re-measured with geodesic.
+    k-nearest distances are haversine distances (within ~0.56% of geodesic).
+    """
+
+    def __init__(self, all_restaurants_df):
+        self.lats, self.lons = latlon_arrays(all_restaurants_df["latitude, longitude"])
+        valid = ~(np.isnan(self.lats) | np.isnan(self.lons))
+        self.positions = np.flatnonzero(valid) # row positions in the DataFrame for each tree point
+        self.tree = BallTree(np.radians(np.column_stack([self.lats[valid], self.lons[valid]])), metric="haversine")
+
+    def query_radius(self, lat, lon, radius_km):
+        """Row positions (ascending) of restaurants within radius_km, plus their distances in km."""
+        if len(self.positions) == 0:
+            return np.array([], dtype=int), np.array([])
+        search_radius = radius_km * (1 + GEODESIC_TOLERANCE) / EARTH_RADIUS_KM
+        candidates = self.tree.query_radius(np.radians([[lat, lon]]), r=search_radius)[0]
+        positions = self.positions[candidates]
+        distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+
+        keep = distances <= radius_km * (1 - GEODESIC_TOLERANCE)
+        for i in np.flatnonzero(~keep):
+            distances[i] = geodesic((lat, lon), (self.lats[positions[i]], self.lons[positions[i]])).km
+            keep[i] = distances[i] <= radius_km
+
+        order = np.argsort(positions[keep])
+        return positions[keep][order], distances[keep][order]
+
+    def query_knn(self, lat, lon, k):
+        """Row positions of the k nearest restaurants (closest first), plus haversine distances in km."""
+        k = min(k, len(self.positions))
+        if k == 0:
+            return np.array([], dtype=int), np.array([])
+        distances, candidates = self.tree.query(np.radians([[lat, lon]]), k=k)
+        return self.positions[candidates[0]], distances[0] * EARTH_RADIUS_KM
+
+# A few recent DataFrames -> (DataFrame, index); the DataFrame is kept alive so its id() can't be reused
+_frame_caches = []
+
+def per_frame_cache():
+    """A new DataFrame -> index cache for cached_per_frame, also cleared by forget_frame."""
+    cache = OrderedDict()
+    _frame_caches.append(cache)
+    return cache
+
+_spatial_indexes = per_frame_cache()
+_neighborhood_tiles = per_frame_cache()
+
+def cached_per_frame(cache, all_restaurants_df, build, max_cached):
+    key = id(all_restaurants_df)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key][1]
+    index = build(all_restaurants_df)
+    cache[key] = (all_restaurants_df, index)
+    while len(cache) > max_cached:
+        cache.popitem(last=False)
+    return index
+
+def forget_frame(all_restaurants_df):
+    """Drop the indexes built for this DataFrame (so an unloaded city's table can be freed)."""
+    for cache in _frame_caches:
+        cache.pop(id(all_restaurants_df), None)
+
+def get_spatial_index(all_restaurants_df, max_cached=4):
+    return cached_per_frame(_spatial_indexes, all_restaurants_df, SpatialIndex, max_cached)
 
 def get_nearby_restaurants(target_location, all_restaurants_df, radius_km=0.5):
     """Return restaurants within a radius (km) of the target_location."""
     lat1, lon1 = target_location
-    nearby = []
+    positions, _ = get_spatial_index(all_restaurants_df).query_radius(lat1, lon1, radius_km)
+    return all_restaurants_df.iloc[positions]
+
+def get_k_nearest_restaurants(target_location, all_restaurants_df, k=10):
+    """Return the k restaurants closest to target_location with a distance_km column, closest first."""
+    lat1, lon1 = target_location
+    positions, distances = get_spatial_index(all_restaurants_df).query_knn(lat1, lon1, k)
+    nearest = all_restaurants_df.iloc[positions].copy()
+    nearest["distance_km"] = distances
+    return nearest
+
+UNDERSERVED_CONTEXT = "This restaurant is in a relatively underserved area."
+
+def hours_frame(df):
+    """The OPEN_HOURS_COLUMNS of df, parsed from open_hours if it was loaded without them."""
+    columns = [name for day in OPEN_HOURS_DAYS for name in OPEN_HOURS_COLUMNS[day]]
+    if all(c in df.columns for c in columns):
+        return df[columns]
+    return open_hours_columns(df["open_hours"])
 
-    for _, row in all_restaurants_df.iterrows():
-        distance = geodesic((lat1, lon1), row['latitude, longitude']).km
-        if distance <= radius_km:
-            nearby.append(row)
-    return pd.DataFrame(nearby)
+def minutes_to_hhmm(total, count):
+    """Average of count times adding up to total minutes as HH:MM."""
+    if not count:
+        return "N/A"
+    avg = total / count
+    h = int(avg) // 60
+    m = int(avg) % 60
+    return f"{h:02d}:{m:02d}"
+
+def ordered_counts(names, counts):
+    """{name: count} most common first, ties in the order the names are given (first seen), as value_counts() orders them."""
+    counts = np.asarray(counts)
+    # pandas' sort_values(ascending=False): reversed argsort of the reversed counts
+    order = np.arange(len(counts))[::-1][counts[::-1].argsort(kind="quicksort")][::-1]
+    return {names[i]: int(counts[i]) for i in order}
 
 def extract_neighborhood_context(nearby_df):
     """Summarize local cuisine density, average prices, etc."""
     if nearby_df.empty:
-        return "This restaurant is in a relatively underserved area."
-    
-    def compute_start_end_times(open_hours_str):
-        try:
-            hours_dict = ast.literal_eval(open_hours_str)
-            daily_times = {}
-            for day, time in hours_dict.items():
-                if len(time) == 4:
-                    start_hour, start_min, end_hour, end_min = time
-                    start_minutes = start_hour * 60 + start_min
-                    end_minutes = end_hour * 60 + end_min
-                    daily_times[day] = (start_minutes, end_minutes)
-            return daily_times
-        except:
-            return {}
-
-    # Parse daily open/close times for each restaurant
-    all_days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    start_times = {day: [] for day in all_days}
-    end_times = {day: [] for day in all_days}
-
-    times_list = nearby_df["open_hours"].apply(compute_start_end_times)
-
-    for times in times_list:
-        for day in all_days:
-            if day in times:
-                start, end = times[day]
-                start_times[day].append(start)
-                end_times[day].append(end)
-
-    def avg_minutes_to_hhmm(minutes):
-        if not minutes:
-            return "N/A"
-        avg = sum(minutes) / len(minutes)
-        h = int(avg) // 60
-        m = int(avg) % 60
-        return f"{h:02d}:{m:02d}"
+        return UNDERSERVED_CONTEXT
 
+    # whole minutes, so these float sums are exact whatever the order
+    hours = hours_frame(nearby_df).to_numpy(dtype=float)
+    present = ~np.isnan(hours)
+    totals, counts = np.where(present, hours, 0.0).sum(axis=0), present.sum(axis=0)
     avg_operational_hours = {
         day: {
-            "avg_start": avg_minutes_to_hhmm(start_times[day]),
-            "avg_end": avg_minutes_to_hhmm(end_times[day])
+            "avg_start": minutes_to_hhmm(totals[2 * d], counts[2 * d]),
+            "avg_end": minutes_to_hhmm(totals[2 * d + 1], counts[2 * d + 1]),
         }
-        for day in all_days
+        for d, day in enumerate(OPEN_HOURS_DAYS)
     }
 
     summary = {
@@ -70,3 +181,129 @@ def extract_neighborhood_context(nearby_df):
     }
     return summary
 
+NEIGHBORHOOD_CELL_KM = 0.25 # side of the grid cells neighborhood sums are kept for
+KM_PER_DEGREE = EARTH_RADIUS_KM * np.pi / 180
+
+class NeighborhoodTiles:
+    """extract_neighborhood_context for any radius, assembled from sums precomputed per grid cell.
+
+    Restaurants are bucketed into ~cell_km square cells. Each cell keeps additive sums (reviews,
+    price and per-day opening/closing minutes, each with its count) and its cuisine counts. A radius
+    query adds up the cells lying entirely inside the circle and only checks the restaurants of the
+    cells crossing its edge one by one (haversine, then geodesic near the edge, as SpatialIndex does),
+    so it summarizes exactly the restaurants get_nearby_restaurants returns.
+    """
+
+    def __init__(self, all_restaurants_df, cell_km=NEIGHBORHOOD_CELL_KM):
+        lats, lons = latlon_arrays(all_restaurants_df["latitude, longitude"])
+        positions = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+        self.cell_lat = cell_km / KM_PER_DEGREE
+        mean_lat = np.mean(lats[positions]) if len(positions) else 0.0
+        self.cell_lon = self.cell_lat / max(np.cos(np.radians(mean_lat)), 1e-6)
+
+        rows = np.floor(lats[positions] / self.cell_lat).astype(np.int64)
+        cols = np.floor(lons[positions] / self.cell_lon).astype(np.int64)
+        order = np.lexsort((positions, cols, rows)) # by cell, then row position
+        self.positions, rows, cols = positions[order], rows[order], cols[order]
+        self.lats, self.lons = lats[self.positions], lons[self.positions]
+
+        # one row of additive values per restaurant: [value, 1 if present] pairs
+        df = all_restaurants_df.iloc[self.positions]
+        values = [df["reviews"].to_numpy(dtype=float), df["average_price"].to_numpy(dtype=float)]
+        values += [column for column in hours_frame(df).to_numpy(dtype=float).T]
+        values = np.column_stack(values) if len(df) else np.empty((0, 2 + 2 * len(OPEN_HOURS_DAYS)))
+        present = ~np.isnan(values)
+        self.values = np.empty((len(values), 2 * values.shape[1]))
+        self.values[:, 0::2] = np.where(present, values, 0.0)
+        self.values[:, 1::2] = present
+
+        codes, cuisines = pd.factorize(df["main_category"])
+        self.cuisine_codes, self.cuisines = codes, list(cuisines)
+
+        # cells: slice of the sorted restaurants, sums, and (cuisine codes, counts, first row positions)
+        boundaries = np.flatnonzero((np.diff(rows) != 0) | (np.diff(cols) != 0)) + 1
+        starts = np.concatenate([[0], boundaries]).astype(int) if len(rows) else np.array([], dtype=int)
+        ends = np.append(starts[1:], len(rows)).astype(int)
+        self.sums = np.add.reduceat(self.values, starts, axis=0) if len(starts) else self.values[:0]
+        self.slices = list(zip(starts, ends))
+        self.cells = {(rows[start], cols[start]): i for i, start in enumerate(starts)}
+        self.cell_cuisines = []
+        for start, end in self.slices:
+            cell_codes = codes[start:end]
+            unique, first, counts = np.unique(cell_codes[cell_codes >= 0], return_index=True, return_counts=True)
+            first_positions = self.positions[start:end][cell_codes >= 0][first]
+            self.cell_cuisines.append((unique, counts, first_positions))
+
+    def query(self, lat, lon, radius_km):
+        """(cell indexes entirely within radius_km, positions into the sorted restaurants within it in the other cells)."""
+        outer = radius_km * (1 + GEODESIC_TOLERANCE)
+        inner = radius_km * (1 - GEODESIC_TOLERANCE)
+        d_lat = outer / KM_PER_DEGREE
+        d_lon = d_lat / max(np.cos(np.radians(min(abs(lat) + d_lat, 90.0))), 1e-6)
+        rows = range(int(np.floor((lat - d_lat) / self.cell_lat)), int(np.floor((lat + d_lat) / self.cell_lat)) + 1)
+        cols = range(int(np.floor((lon - d_lon) / self.cell_lon)), int(np.floor((lon + d_lon) / self.cell_lon)) + 1)
+        found = [(row, col, self.cells[(row, col)]) for row in rows for col in cols if (row, col) in self.cells]
+        if not found:
+            return [], np.array([], dtype=int)
+
+        # the farthest point of a cell from (lat, lon) is one of its corners
+        corners = np.array([(row + dr, col + dc) for row, col, _ in found for dr in (0, 1) for dc in (0, 1)], dtype=float)
+        farthest = haversine_km(lat, lon, corners[:, 0] * self.cell_lat, corners[:, 1] * self.cell_lon).reshape(-1, 4).max(axis=1)
+        inside = [cell for (_, _, cell), d in zip(found, farthest) if d <= inner]
+        edge = [range(*self.slices[cell]) for (_, _, cell), d in zip(found, farthest) if d > inner]
+        if not edge:
+            return inside, np.array([], dtype=int)
+
+        # the local ellipsoid distance is close enough that only points within a hair of the
+        # radius (if any) need geopy's geodesic, instead of the whole haversine tolerance band
+        edge = np.concatenate([np.arange(r.start, r.stop) for r in edge])
+        band = 1e-6 + 4 * (outer / EARTH_RADIUS_KM) ** 2 / max(np.cos(np.radians(abs(lat) + d_lat)), 1e-6) ** 2
+        band = min(band, GEODESIC_TOLERANCE)
+        distances = local_ellipsoid_km(lat, lon, self.lats[edge], self.lons[edge])
+        keep = distances <= radius_km * (1 - band)
+        for i in np.flatnonzero(np.abs(distances - radius_km) <= radius_km * band):
+            keep[i] = geodesic((lat, lon), (self.lats[edge[i]], self.lons[edge[i]])).km <= radius_km
+        return inside, edge[keep]
+
+    def summary(self, lat, lon, radius_km=0.5):
+        """Same result as extract_neighborhood_context(get_nearby_restaurants(...)) without touching the DataFrame."""
+        inside, points = self.query(lat, lon, radius_km)
+        if not inside and not len(points):
+            return UNDERSERVED_CONTEXT
+        totals = self.sums[inside].sum(axis=0) + self.values[points].sum(axis=0)
+
+        # cuisine counts of the inside cells plus one per edge restaurant, ordered by first row position
+        named = self.cuisine_codes[points] >= 0
+        codes = np.concatenate([self.cell_cuisines[c][0] for c in inside] + [self.cuisine_codes[points][named]])
+        counts = np.concatenate([self.cell_cuisines[c][1] for c in inside] + [np.ones(named.sum(), dtype=int)])
+        firsts = np.concatenate([self.cell_cuisines[c][2] for c in inside] + [self.positions[points][named]])
+        unique, inverse = np.unique(codes, return_inverse=True)
+        cuisine_counts = np.bincount(inverse, counts, minlength=len(unique)).astype(int)
+        first_seen = np.full(len(unique), np.iinfo(np.int64).max)
+        np.minimum.at(first_seen, inverse, firsts)
+        first_order = np.argsort(first_seen)
+
+        def mean(i):
+            return totals[2 * i] / totals[2 * i + 1] if totals[2 * i + 1] else np.nan
+
+        avg_operational_hours = {}
+        for d, day in enumerate(OPEN_HOURS_DAYS):
+            start, end = 2 + 2 * d, 3 + 2 * d
+            avg_operational_hours[day] = {
+                "avg_start": minutes_to_hhmm(totals[2 * start], totals[2 * start + 1]),
+                "avg_end": minutes_to_hhmm(totals[2 * end], totals[2 * end + 1]),
+            }
+        return {
+            "Cuisine Diversity": ordered_counts([self.cuisines[c] for c in unique[first_order]], cuisine_counts[first_order]),
+            "Review Density": mean(0),
+            "Average Price Level": mean(1),
+            "Average Operational Hours Per Day": avg_operational_hours,
+        }
+
+def get_neighborhood_tiles(all_restaurants_df, max_cached=4):
+    return cached_per_frame(_neighborhood_tiles, all_restaurants_df, NeighborhoodTiles, max_cached)
+
+def neighborhood_context(target_location, all_restaurants_df, radius_km=0.5):
+    """extract_neighborhood_context of the restaurants within radius_km, from the precomputed tiles."""
+    lat, lon = target_location
+    return get_neighborhood_tiles(all_restaurants_df).summary(float(lat), float(lon), radius_km)
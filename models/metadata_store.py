@@ -0,0 +1,101 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Structured columns kept for every vector of the corpus index (see restaurant_document)
+METADATA_COLUMNS = ["main_category", "average_price", "neighborhood", "rating", "success_score"]
+TEXT_COLUMNS = ("main_category", "neighborhood")
+
+class MetadataStore:
+    """place_id plus METADATA_COLUMNS for every vector of an index, row i describing index position i.
+
+    Filters are dicts of column -> predicate, all of which must hold:
+        "Japanese restaurant"            equal to (text columns) / 4.5 (numeric columns)
+        ["Bedok", "Tampines"]            any of these values
+        re.compile("japanese", re.I)     text matching the pattern
+        (10, 30), (4.0, None)            numeric range, inclusive, None for open ended
+        lambda values: values > 50       any function of the column array returning a boolean mask
+    Text predicates are evaluated once per distinct value, so a filter costs one pass over
+    integer codes however many restaurants there are. Missing values never match.
+    """
+
+    def __init__(self, df):
+        self.place_ids = df["place_id"].astype(str).to_numpy(dtype=object)
+        self.numeric = {}
+        self.text = {}
+        for column in METADATA_COLUMNS:
+            values = df[column] if column in df else pd.Series([None] * len(df), dtype=object)
+            if column in TEXT_COLUMNS:
+                codes, categories = pd.factorize(values.where(values.notna(), None))
+                self.text[column] = (codes, categories.to_numpy(dtype=object))
+            else:
+                self.numeric[column] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+
+    def __len__(self):
+        return len(self.place_ids)
+
+    @classmethod
+    def from_documents(cls, documents):
+        rows = [{"place_id": doc.metadata.get("place_id", ""), **{c: doc.metadata.get(c) for c in METADATA_COLUMNS}}
+                for doc in documents]
+        return cls(pd.DataFrame(rows, columns=["place_id"] + METADATA_COLUMNS))
+
+    @classmethod
+    def load(cls, path):
+        return cls(pd.read_parquet(path))
+
+    def to_frame(self):
+        df = pd.DataFrame({"place_id": self.place_ids})
+        for column in METADATA_COLUMNS:
+            if column in self.text:
+                codes, categories = self.text[column]
+                df[column] = np.where(codes >= 0, categories[codes] if len(categories) else None, None)
+            else:
+                df[column] = self.numeric[column]
+        return df
+
+    def save(self, path):
+        self.to_frame().to_parquet(path, index=False)
+
+    def mask(self, filters):
+        """Boolean array over index positions: True where every predicate in filters holds."""
+        keep = np.ones(len(self), dtype=bool)
+        for column, predicate in filters.items():
+            if column in self.text:
+                codes, categories = self.text[column]
+                matching = np.append(text_matches(categories, predicate), False) # code -1: missing
+                keep &= matching[codes]
+            elif column in self.numeric:
+                keep &= numeric_matches(self.numeric[column], predicate)
+            else:
+                raise ValueError(f"Can't filter on {column!r}, the metadata store has {', '.join(METADATA_COLUMNS)}")
+        return keep
+
+    def select(self, filters):
+        """Index positions (ascending) of the vectors matching filters."""
+        return np.flatnonzero(self.mask(filters))
+
+def text_matches(values, predicate):
+    if callable(predicate) and not isinstance(predicate, re.Pattern):
+        return np.asarray(predicate(values), dtype=bool)
+    if isinstance(predicate, re.Pattern):
+        return np.array([bool(predicate.search(v)) for v in values], dtype=bool)
+    if isinstance(predicate, (list, tuple, set, frozenset)):
+        return np.isin(values, list(predicate))
+    return values == predicate
+
+def numeric_matches(values, predicate):
+    with np.errstate(invalid="ignore"):
+        if callable(predicate):
+            return np.asarray(predicate(values), dtype=bool) & ~np.isnan(values)
+        if isinstance(predicate, tuple):
+            low, high = predicate
+            keep = ~np.isnan(values)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+            return keep
+        if isinstance(predicate, (list, set, frozenset)):
+            return np.isin(values, list(predicate))
+        return values == predicate
@@ -1,5 +1,4 @@
 import re
-import pandas as pd
 import json
 from pydantic import BaseModel, Field
 from typing import List
@@ -22,25 +21,55 @@ class SWOTAnalysis(BaseModel):
     threats: SWOTCategory
     success_score: float = Field(..., alias="Success Score")
 
+def load_swot(swot_json):
+    """SWOTAnalysis from GPT output text, a dict or an already parsed SWOTAnalysis; raises if it doesn't validate."""
+    if isinstance(swot_json, SWOTAnalysis):
+        return swot_json
+    if not swot_json:
+        raise ValueError("Empty SWOT JSON string")
+
+    # If it's a string, sanitize both leading and trailing garbage (markdown fences, prose)
+    if isinstance(swot_json, str):
+        # Extract the first full JSON block from the string
+        match = re.search(r"\{.*\}", swot_json.strip(), re.DOTALL)
+        if not match:
+            raise ValueError("No JSON object found in string")
+        return SWOTAnalysis(**json.loads(match.group(0)))
+
+    elif isinstance(swot_json, dict):
+        return SWOTAnalysis(**swot_json)
+
+    raise TypeError("Unsupported type for SWOT input")
+
+def parse_swot(swot_json):
+    """Parse a SWOT response once for every consumer (score, features); None if it can't be parsed."""
+    try:
+        return load_swot(swot_json)
+    except Exception as e:
+        print("Parsing error:", e)
+        return None
+
+def swot_json_schema():
+    """SWOTAnalysis as a strict JSON schema for the OpenAI structured-output response_format."""
+    schema = SWOTAnalysis.model_json_schema(by_alias=True)
+
+    def strict(node):
+        if isinstance(node, dict):
+            if node.get("type") == "object":
+                # strict mode wants every property required and nothing else allowed
+                node["required"] = list(node.get("properties", {}))
+                node["additionalProperties"] = False
+            for value in node.values():
+                strict(value)
+        elif isinstance(node, list):
+            for value in node:
+                strict(value)
+    strict(schema)
+    return schema
+
 def extract_swot_features(swot_json):
     try:
-        if not swot_json:
-            raise ValueError("Empty SWOT JSON string")
-
-        # If it's a string, sanitize both leading and trailing garbage
-        if isinstance(swot_json, str):
-            # Extract the first full JSON block from the string
-            match = re.search(r"\{.*\}", swot_json.strip(), re.DOTALL)
-            if not match:
-                raise ValueError("No JSON object found in string")
-            swot_clean = match.group(0)
-            swot_model = SWOTAnalysis(**json.loads(swot_clean))
-
-        elif isinstance(swot_json, dict):
-            swot_model = SWOTAnalysis(**swot_json)
-    
-        else:
-            raise TypeError("Unsupported type for SWOT input")
+        swot_model = load_swot(swot_json)
 
         features = []
         expected_subfactors = 3
@@ -65,6 +94,36 @@ def extract_swot_features(swot_json):
         return [0.0] * 16
 
 
+def format_dict_as_string(d):
+    return "\n".join(f"{k}: {v}" for k, v in d.items())
+
+def extract_best_fit_coords(text):
+    section = text
+    m = re.search(r"Best-Fit Coordinates:?(.*)", text, flags=re.S|re.I)
+    if m:
+        section = m.group(1)
+
+    pattern = re.compile(
+        r"(?:\*\*(?P<area_bold>[^:*]+)\*\*:|\b(?P<area_plain>[A-Za-z][\w\s&'()-]+):)?"
+        r"\s*\(\s*(?P<lat>[+-]?\d+(?:\.\d+)?)\s*,\s*(?P<lon>[+-]?\d+(?:\.\d+)?)\s*\)",
+        flags=re.I
+    )
+
+    results = []
+    for g in pattern.finditer(section):
+        area = (g.group("area_bold") or g.group("area_plain") or "").strip()
+        coord_str = f"{g.group('lat')}, {g.group('lon')}"
+        results.append((area, coord_str))
+
+    # Deduplicate while preserving order
+    seen = set()
+    deduped = []
+    for area, coord in results:
+        if coord not in seen:
+            seen.add(coord)
+            deduped.append((area, coord))
+    return deduped
+
 def parse_inputs(inputs):
     """Clean and structure user-provided fields."""
     return {
@@ -95,7 +154,7 @@ def normalize_price(price_str):
         # remove $ and spaces
         cleaned = price_str.replace("$", "").strip()
         # match numbers
-        numbers = re.findall(r"\d+", cleaned)
+        numbers = re.findall(r"\d+(?:\.\d+)?", cleaned) # "12.5" is one price, not 12 and 5
         numbers = [float(n) for n in numbers]
         if len(numbers) == 1:
             return numbers[0]
@@ -165,14 +224,36 @@ def parse_row_to_input(row):
         "pets": str(row.get("Pets", "")).strip(),
     }
 
+KNOWN_CUISINES = ["japanese", "chinese", "indian", "italian", "thai"]
+
+# extract_features' token-count fields and the training CSV columns parse_row_to_input reads them from
+TOKEN_FIELDS = [
+    ("offerings", "Offerings"),
+    ("recommended_dishes", "Recommended dishes"),
+    ("accessibility", "Accessibility"),
+    ("service_options", "Service options"),
+    ("highlights", "Highlights"),
+    ("amenities", "Amenities"),
+    ("atmosphere", "Atmosphere"),
+    ("crowd", "Crowd"),
+    ("dining_options", "Dining options"),
+    ("planning", "Planning"),
+    ("children", "Children"),
+    ("pets", "Pets"),
+]
+# ASCII code points that re's \w matches; word_token_counts looks up everything else
+WORD_CHAR_TABLE = [bool(re.match(r"\w", chr(c))) for c in range(128)]
+
+# parse_row_to_input turns these into lists, so extract_features counts tokens in the list's repr
+LIST_FIELDS = {"offerings", "recommended_dishes", "service_options", "amenities", "crowd"}
+
 def extract_features(structured_input):
     # Location
     lat, lon = map(float, structured_input.get("location", "0,0").split(","))
 
     # Cuisine one-hot example
-    known_cuisines = ["japanese", "chinese", "indian", "italian", "thai"]
     cuisine = structured_input.get("cuisine", "").lower()
-    cuisine_vec = [1 if cuisine == c else 0 for c in known_cuisines]
+    cuisine_vec = [1 if cuisine == c else 0 for c in KNOWN_CUISINES]
 
     # Price
     price = float(structured_input.get("price", 0))
@@ -219,8 +300,102 @@ def extract_features(structured_input):
 
     return feature_vector
 
-def extract_features_from_df(df):
+def extract_features_from_df_rowwise(df):
+    """Reference implementation: extract_features(parse_row_to_input(row)) for every row."""
+    import pandas as pd
     return pd.DataFrame([
         extract_features(parse_row_to_input(row))
         for _, row in df.iterrows()
     ])
+
+def word_token_counts(values):
+    r"""len(re.findall(r"\w+", v)) for every string in values, via one pass over all of them in NumPy.
+
+    The strings are joined with NUL separators and decoded to code points; a token starts wherever a
+    word character follows a non-word one. Word characters are whatever re's \w matches.
+    """
+    import numpy as np
+
+    joined = "\0".join(values)
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+    is_word = np.asarray(WORD_CHAR_TABLE)[np.minimum(codes, 127)]
+    other = np.unique(codes[codes > 127])
+    if len(other):
+        is_word[codes > 127] = np.isin(codes[codes > 127], [c for c in other if re.match(r"\w", chr(c))])
+    starts = is_word.copy()
+    starts[1:] &= ~is_word[:-1]
+    rows = np.searchsorted(np.flatnonzero(codes == 0), np.flatnonzero(starts))
+    return np.bincount(rows, minlength=len(values))
+
+def open_hours_totals(values):
+    """Sum of (end - start) hours over every "[h, m, h, m]" in each string, in one findall over all of them."""
+    import numpy as np
+
+    # NUL separators match the empty alternative, which marks where the next string starts
+    found = re.findall(r"\0|\[(\d+), (\d+), (\d+), (\d+)\]", "\0".join(values))
+    rows = np.cumsum([groups[0] == "" for groups in found])
+    days = [(row, groups) for row, groups in zip(rows, found) if groups[0]]
+    totals = np.zeros(len(values))
+    if days:
+        times = np.array([groups for _, groups in days], dtype=np.int64)
+        hours = ((times[:, 2] * 60 + times[:, 3]) - (times[:, 0] * 60 + times[:, 1])) / 60
+        # np.add.at sums each row's days in order, like the row-wise loop
+        np.add.at(totals, np.array([row for row, _ in days]), hours)
+    return totals
+
+def extract_features_from_df(df):
+    """Columnar version of extract_features_from_df_rowwise, giving the same 22 feature columns.
+
+    Every field is computed with pandas string methods over the whole column instead of per row.
+    Like the row-wise path, a row without a parseable "latitude, longitude" or price raises ValueError.
+    """
+    import numpy as np
+    import pandas as pd
+
+    def text(column, strip=True):
+        if column not in df.columns:
+            return pd.Series("", index=df.index)
+        values = df[column].astype(str)
+        return values.str.strip() if strip else values
+
+    # Location: "(lat, lon)" or a (lat, lon) tuple
+    location = text("latitude, longitude").str.strip("()")
+    bad = location.str.count(",") != 1
+    if bad.any():
+        raise ValueError(f"Unparseable location in row(s) {list(df.index[bad][:5])}")
+    latlon = location.str.split(",", n=1, expand=True).astype(float)
+
+    cuisine = text("main_category").str.title().str.lower()
+
+    if "average_price" in df.columns and pd.api.types.is_numeric_dtype(df["average_price"]):
+        price = df["average_price"].astype(float)
+    else:
+        price = text("average_price").astype(float)
+
+    # len(str(list_of_payments).split(",")) == number of non-blank items, and 1 for an empty list
+    payments = text("Payments")
+    items = payments.str.count(",") + 1 - payments.str.count(r"(?:^|,)\s*(?=,|$)")
+    payment_count = items.clip(lower=1)
+
+    # Hours: sum of (end - start) over every [h, m, h, m] day, averaged over 7 days when positive
+    total_hours = pd.Series(open_hours_totals(text("open_hours").tolist()), index=df.index)
+    avg_daily_hours = (total_hours / 7).where(total_hours > 0, 0)
+
+    features = {0: latlon[0], 1: latlon[1], 2: price, 3: payment_count, 4: avg_daily_hours}
+    for i, (field, column) in enumerate(TOKEN_FIELDS, start=5):
+        values = text(column, strip=False) # surrounding whitespace holds no tokens
+        counts = pd.Series(word_token_counts(values.tolist()), index=df.index)
+        if field in LIST_FIELDS:
+            # repr() escapes non-printable characters ("\xa0" adds an "xa0" token), so those rare
+            # rows go through the row-wise path to stay identical
+            escaped = ~values.map(str.isprintable)
+            if escaped.any():
+                counts[escaped] = [
+                    len(re.findall(r"\w+", str([x.strip() for x in value.split(",") if x.strip()])))
+                    for value in values[escaped]
+                ]
+        features[i] = counts
+    for i, known in enumerate(KNOWN_CUISINES, start=5 + len(TOKEN_FIELDS)):
+        features[i] = (cuisine == known).astype(np.int64)
+
+    return pd.DataFrame(features).reset_index(drop=True)
@@ -0,0 +1,137 @@
+import os
+import re
+from utils.lazy import lazy_resource
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 12000)) # input tokens per prompt
+PROMPT_REPORT = os.getenv("PROMPT_REPORT", "").lower() in ("1", "true", "yes") # print section usage per prompt
+TOKENIZER_MODEL = "gpt-4o"
+
+@lazy_resource
+def get_encoder():
+    """tiktoken's encoder for GPT-4o, or None (count ~4 characters per token) if it can't be loaded."""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception as e:
+        # tiktoken missing, or its vocabulary can't be downloaded (offline)
+        print(f"Warning: tiktoken unavailable ({type(e).__name__}), estimating tokens as characters / 4")
+        return None
+
+def count_tokens(text):
+    encoder = get_encoder()
+    if encoder is None:
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text, max_tokens):
+    """The longest run of leading lines of text that fits in max_tokens, with a note about what was dropped."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+
+    def shortened(kept):
+        note = f"... ({len(lines) - kept} more lines left out to fit the prompt budget)" if kept else \
+            "(omitted for length)"
+        return "\n".join(lines[:kept] + [note])
+
+    # binary search the number of lines kept, counting the joined text the way the prompt will hold it
+    lo, hi = 0, len(lines) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(shortened(mid)) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return shortened(lo)
+
+def records_table(records, columns=None, drop=("_id",)):
+    """data.gov.sg records as a compact pipe-separated table: column names once instead of per record."""
+    if not records:
+        return "No records."
+    columns = columns or [c for c in records[0] if c not in drop]
+    rows = [" | ".join(columns)]
+    rows += [" | ".join(str(record.get(c, "")) for c in columns) for record in records]
+    return "\n".join(rows)
+
+def area_records(records, areas, field=None):
+    """Records that mention one of the planning areas (in `field`, or in any text value)."""
+    areas = [a for a in areas if a]
+    if not areas:
+        return []
+    pattern = re.compile("|".join(re.escape(a) for a in areas), re.I)
+
+    def mentions(record):
+        values = [record.get(field, "")] if field else [v for v in record.values() if isinstance(v, str)]
+        return any(pattern.search(str(v)) for v in values)
+
+    return [record for record in records if mentions(record)]
+
+class PromptSection:
+    """One block of prompt context. required sections are never cut; the others are cut lowest priority first."""
+
+    def __init__(self, name, text, priority=0, required=False, heading=True):
+        self.name = name
+        self.text = str(text).strip()
+        self.priority = priority
+        self.required = required
+        self.heading = heading
+
+    def render(self):
+        return f"{self.name}:\n{self.text}" if self.heading else self.text
+
+def dedupe_sections(sections):
+    """Drop empty sections and any whose text repeats an earlier section word for word.
+
+    Sections with a heading stay as a one line placeholder instead: the instructions refer to
+    them by name, so the name must still be in the prompt.
+    """
+    seen = {}
+    unique = []
+    for section in sections:
+        key = " ".join(section.text.split())
+        if key and key not in seen:
+            seen[key] = section
+            unique.append(section)
+        elif section.heading:
+            note = f"(same as {seen[key].name} above)" if key else "(none)"
+            unique.append(PromptSection(section.name, note, section.priority, section.required, section.heading))
+    return unique
+
+def assemble_prompt(sections, budget=PROMPT_TOKEN_BUDGET):
+    """Join sections into one prompt that fits in budget tokens.
+
+    Returns (prompt, usage) where usage is [(name, tokens requested, tokens used), ...]. When the
+    sections don't fit, optional ones are shortened (whole lines) starting from the lowest priority.
+    """
+    sections = dedupe_sections(sections)
+    requested = {id(s): count_tokens(s.render()) for s in sections}
+    used = dict(requested)
+
+    over = sum(used.values()) - budget
+    for section in sorted((s for s in sections if not s.required), key=lambda s: s.priority):
+        if over <= 0:
+            break
+        header_tokens = used[id(section)] - count_tokens(section.text)
+        allowed = max(0, used[id(section)] - over - header_tokens)
+        text = truncate_to_tokens(section.text, allowed)
+        new_tokens = count_tokens(PromptSection(section.name, text, heading=section.heading).render())
+        if new_tokens >= used[id(section)]:
+            continue
+        section.text = text
+        over -= used[id(section)] - new_tokens
+        used[id(section)] = new_tokens
+
+    prompt = "\n\n\n".join(s.render() for s in sections)
+    usage = [(s.name, requested[id(s)], used[id(s)]) for s in sections]
+    if PROMPT_REPORT:
+        print(format_usage(usage, budget))
+    return prompt, usage
+
+def format_usage(usage, budget=PROMPT_TOKEN_BUDGET):
+    lines = [f"{'section':<40} {'tokens':>8} {'requested':>10}"]
+    for name, requested, used in usage:
+        lines.append(f"{name[:40]:<40} {used:>8} {requested:>10}")
+    total_requested = sum(r for _, r, _ in usage)
+    total_used = sum(u for _, _, u in usage)
+    lines.append(f"{'total (budget ' + str(budget) + ')':<40} {total_used:>8} {total_requested:>10}")
+    return "\n".join(lines)
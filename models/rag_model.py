@@ -1,79 +1,53 @@
 import os
-import json
 import re
-import joblib
-from openai import OpenAI
-from langchain.schema import Document
-from models.faiss_index import build_faiss_index, search_similar_documents
-from utils.data_loader import load_all_restaurants
-from models.locations import get_nearby_restaurants, extract_neighborhood_context
+import random
+import asyncio
+from copy import deepcopy
 from dotenv import load_dotenv
-from utils.singapore import population_response, construction_response, get_planning_area
-from models.preprocessing import extract_features, extract_swot_features
-from pydantic import BaseModel, Field
-from typing import List
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-
-residual_model = joblib.load("/Users/amyyz/Documents/NUS/Official Demo/data/residual_corrector.pkl")
-
-class SWOTSubFactor(BaseModel):
-    name: str             
-    explanation: str       
-    score: float                 
-
-class SWOTCategory(BaseModel):
-    category: str                
-    explanation: str           
-    sub_factors: List[SWOTSubFactor] 
-    total_score: float           
-
-class SWOTAnalysis(BaseModel):
-    strengths: SWOTCategory
-    weaknesses: SWOTCategory
-    opportunities: SWOTCategory
-    threats: SWOTCategory
-    success_score: float = Field(..., alias="Success Score")
-
+from utils.lazy import lazy_resource
+from utils.paths import data_path
+from utils.tracing import span, traced, current_span
+from utils.singapore import get_population_response, get_construction_response
+from utils.cities import get_planning_area, get_planning_areas, active_shard, active_city_name, use_city, city_for_input
+from models.preprocessing import extract_features, extract_swot_features, parse_rag, parse_swot, swot_json_schema, \
+    format_dict_as_string, normalize_price
+from models.llm_cache import get_llm_cache, cache_key, cache_disabled
+from models.prompt_budget import PromptSection, assemble_prompt, records_table, area_records, PROMPT_TOKEN_BUDGET
+
+# Heavy resources (models, indexes, the restaurant table, API clients) are loaded on first use
+# through the get_* accessors below, so importing this module is cheap.
+
+residual_model_path = data_path("residual_corrector.pkl") # retrain with `python cli.py train-corrector`
+
+@lazy_resource
+def get_residual_model():
+    import joblib
+    return joblib.load(residual_model_path)
 
 load_dotenv()
 
-# Load all restaurants once
-all_restaurants_df = load_all_restaurants()
+# Load all restaurants once (from the Parquet snapshot, rebuilt only when the source data changes)
+@lazy_resource
+def get_singapore_restaurants():
+    from utils.data_loader import load_restaurants
+    return load_restaurants()
 
-def format_dict_as_string(d):
-    return "\n".join(f"{k}: {v}" for k, v in d.items())
+def get_all_restaurants():
+    """Restaurant table of the active city (see utils.cities.use_city), Singapore by default."""
+    shard = active_shard()
+    return get_singapore_restaurants() if shard is None else shard.restaurants
 
 def extract_success_score_from_swot_text(text: str):
-    try:
-        if not text.strip():
-            print("Empty GPT output.")
-            return None
+    swot = parse_swot(text)
+    return None if swot is None else swot.success_score
 
-        # Strip markdown if present
-        if text.strip().startswith("```"):
-            text = re.sub(r"```(?:json)?", "", text).strip("` \n")
 
-        json_data = json.loads(text)
-        parsed = SWOTAnalysis(**json_data)
-        return parsed.success_score
-
-    except Exception as e:
-        print("Parsing error:", e)
-        return None
-
-
-def coordinates_prompt(structured_input, retrieved_docs):
-    context_strings = [doc.page_content for doc in retrieved_docs]
-    vector_context = "\n".join(context_strings)
-    # print('Most Similar Restaurants:\n',vector_context)
-
-    # Parse the string into name + lat/lon
-    lines = vector_context.splitlines()
+def parse_similar_restaurants(vector_context):
+    """(name, lat, lon) of every retrieved restaurant, read back from the document text."""
     parsed = []
     current_name = None
 
-    for line in lines:
+    for line in vector_context.splitlines():
         line = line.strip()
         if line.startswith("name: "):
             current_name = line.replace("name:", "").strip()
@@ -90,30 +64,61 @@ def coordinates_prompt(structured_input, retrieved_docs):
                     current_name = None  # Reset
             except Exception as e:
                 print("Could not parse lat/lon:", latlon_str, e)
+    return parsed
+
+def gov_data_sections(areas):
+    """Population and construction context, cut down to the records that mention the given planning areas."""
+    if active_shard() is not None:
+        return [] # data.gov.sg only covers Singapore
+    population_records = get_population_response()['result']['records']
+    construction_records = get_construction_response()['result']['records']
+
+    # fall back to the whole (compacted) dataset when nothing matches; the budget trims it if needed
+    population = area_records(population_records, areas, field="Number") or population_records
+    construction = area_records(construction_records, areas) or construction_records
+    return [
+        PromptSection("Population and Demographics", records_table(population), priority=2),
+        PromptSection("Construction", records_table(construction), priority=1),
+    ]
+
+def coordinates_prompt_sections(structured_input, retrieved_docs):
+    from models.locations import neighborhood_context
 
-    neighborhood_vector_context = {}
-    for row in parsed:
-        latlon = (row["latitude"], row["longitude"])
-        nearby_df = get_nearby_restaurants(latlon, all_restaurants_df)
-        neighborhood_vector_context[row["name"]] = extract_neighborhood_context(nearby_df)
-
-    return f"""
-You are a geo-aware AI model tasked with predicting ideal locations in Singapore for a restaurant with specified characteristics. Your goal is to match these characteristics with
-economic patterns, neighborhood contexts, and success signals (e.g., popularity, review trends, competition density) — and determine whether such restaurants already exist there.
-
-
-INPUT:
-A structured description of a hypothetical restaurant:
-{format_dict_as_string(structured_input)}
-
-
-TASK: IDEAL LOCATION SEARCH & VALIDATION
+    context_strings = [doc.page_content for doc in retrieved_docs]
+    vector_context = "\n".join(context_strings)
+    # print('Most Similar Restaurants:\n',vector_context)
 
+    parsed = parse_similar_restaurants(vector_context)
 
+    # restaurants that share a neighborhood share its summary, so list each summary once
+    neighborhoods = {}
+    for row in parsed:
+        latlon = (row["latitude"], row["longitude"])
+        # the summary is a dict (unhashable), group on its text form
+        neighborhoods.setdefault(str(neighborhood_context(latlon, get_all_restaurants())), []).append(row["name"])
+    neighborhood_vector_context = "\n\n".join(
+        f"Around {', '.join(names)}:\n{context}" for context, names in neighborhoods.items())
+
+    city = active_city_name()
+    similar_areas = []
+    if parsed:
+        similar_areas = [a for a in get_planning_areas([r["latitude"] for r in parsed], [r["longitude"] for r in parsed]) if a]
+
+    return [
+        PromptSection("Task", f"""
+You are a geo-aware AI model tasked with predicting ideal locations in {city} for a restaurant with specified characteristics. Your goal is to match these characteristics with
+economic patterns, neighborhood contexts, and success signals (e.g., popularity, review trends, competition density) — and determine whether such restaurants already exist there.""",
+                      required=True, heading=False),
+        PromptSection("INPUT (a structured description of a hypothetical restaurant)",
+                      format_dict_as_string(structured_input), required=True),
+        PromptSection("Most Similar Restaurants", vector_context, priority=3),
+        PromptSection("Neighborhood Context of the Similar Restaurants", neighborhood_vector_context, priority=2),
+        *gov_data_sections(list(dict.fromkeys(similar_areas))),
+        PromptSection("TASK: IDEAL LOCATION SEARCH & VALIDATION", """
 1. Trait Matching:
 - Analyze the input restaurant's features (cuisine, price, crowd type, amenities, etc.).
-- Match them to patterns in existing restaurants across Singapore that are the most similar {vector_context} and find patterns in their neighborhood context {neighborhood_vector_context}, 
-demographics and population {population_response}, and construction {construction_response}. Avoid coordinates to similar restaurants that have high ratings and reviews but planning 
+- Match them to patterns in the Most Similar Restaurants and find patterns in their Neighborhood Context,
+the Population and Demographics, and Construction above. Avoid coordinates to similar restaurants that have high ratings and reviews but planning
 areas are fine.
 
 
@@ -126,7 +131,7 @@ areas are fine.
 
 3. Best-Fit Coordinates:
 - For each suggested area, propose approximate coordinates (up to 6 decimal places) within that planning area where success likelihood
-is high — based on high population density and demographics that would like the restarurant's cuisine {population_response} and construction data for growth {construction_response}.
+is high — based on high population density and demographics that would like the restarurant's cuisine and construction data for growth (see above).
 
 
 EXPECTED OUTPUT FORMAT:
@@ -141,12 +146,20 @@ Suggested Planning Areas for Input Traits:
 Best-Fit Coordinates:
 - (1.301234, 103.854321)
 - (1.321111, 103.888888)
-- (1.377777, 103.949494)
+- (1.377777, 103.949494)""", required=True, heading=False),
+    ]
 
-"""
+@traced()
+def coordinates_prompt(structured_input, retrieved_docs, budget=PROMPT_TOKEN_BUDGET):
+    prompt, usage = assemble_prompt(coordinates_prompt_sections(structured_input, retrieved_docs), budget)
+    current_span().set(prompt_tokens=sum(used for _, _, used in usage))
+    return prompt
 
 
-def format_prompt(structured_input, retrieved_docs):
+def format_prompt_sections(structured_input, retrieved_docs, exclude_place_ids=()):
+    from models.locations import get_nearby_restaurants, get_neighborhood_tiles
+    from models.faiss_index import search_within_ids
+
     context_strings = [doc.page_content for doc in retrieved_docs]
     vector_context = "\n".join(context_strings)
     # print('Most Similar Restaurants: \n',vector_context)
@@ -154,102 +167,69 @@ def format_prompt(structured_input, retrieved_docs):
     lat, lon = map(float, structured_input["location"].split(","))
 
     # get area of lat, long
-    area = get_planning_area(lat, lon)
+    with span("planning_area"):
+        area = get_planning_area(lat, lon)
     # print('Area: ', area)
 
-    # get demographics data
-    records = population_response['result']['records']
-    area_records = [record for record in records if area in record['Number']]
-    demographic_population_of_area = []
-    for rec in area_records:
-        demographic_population_of_area.append(rec)
-    # print('Demographics and Population of Area: ', demographic_population_of_area)
-
     try:
-        lat, lon = map(float, structured_input["location"].split(","))
-        nearby_df = get_nearby_restaurants((lat, lon), all_restaurants_df)
-        neighborhood_context = extract_neighborhood_context(nearby_df)
+        with span("nearby_restaurants") as s:
+            nearby_df = get_nearby_restaurants((lat, lon), get_all_restaurants())
+            s.set(rows=len(nearby_df))
+        # summed from the precomputed grid cells instead of re-aggregating nearby_df
+        with span("neighborhood_summary"):
+            neighborhood_context = get_neighborhood_tiles(get_all_restaurants()).summary(lat, lon)
  
         # print('Neighborhood Context: ', neighborhood_context)
 
         # search most similar from those close by
         query_str = format_dict_as_string(structured_input)
-        nearby_competitors_documents = []
-        for _, row in nearby_df.iterrows():
-            doc_dict = {
-                "name": row.get("name", []),
-                "cuisine": row.get("main_category", []),
-                "rating": row.get("rating", []),
-                "price": row.get("average_price", []),
-                "review count": row.get("reviews", []),
-                "address": row.get("address", []),
-                "open hours": row.get("open_hours", []),
-                "categories": row.get("categories", []),
-                "latitude,longitude":row.get("latitude, longitude", []),
-                "atmosphere rating": row.get("average_atmosphere_score",[]),
-                "service rating": row.get("average_service_score",[]),
-                "food rating": row.get("average_food_score",[]),
-                "service options": row.get("Service options", []),
-                "offerings": row.get("Offerings",[]),
-                "dining options": row.get("Dining options",[]),
-                "crowd": row.get("Crowd",[]),
-                "children": row.get("Children",[]),
-                "accessibility": row.get("Accessibility",[]),
-                "amenities": row.get("Amenities",[]),
-                "payments": row.get("Payments",[]),
-                "planning": row.get("Planning",[]),
-                "pets": row.get("Pets",[])
-            }
-        nearby_competitors_documents.append(Document(page_content=format_dict_as_string(doc_dict), metadata={"place_id": row.get("place_id", "")}))
-        nearby_competitors_db = build_faiss_index(nearby_competitors_documents)
-        competitors = search_similar_documents(query_str, nearby_competitors_db)
+        # reuse the corpus vectors of the nearby places instead of embedding them again
+        with span("competitors"):
+            nearby_ids = nearby_df["place_id"].astype(str)
+            nearby_ids = nearby_ids[~nearby_ids.isin(set(map(str, exclude_place_ids)))]
+            competitor_docs = search_within_ids(query_str, get_corpus_index(), nearby_ids)
+        # their text only: the metadata carries ground truth such as success_score
+        competitors = "\n".join(doc.page_content for doc in competitor_docs) or "No competitors found."
         # print('Competitors: ', competitors)    
 
     except:
         neighborhood_context = "This restaurant is in a relatively underserved area."
         competitors = "No competitors found."
 
-    return f"""
-You are an AI model tasked with evaluating a restaurant’s potential success in Singapore.
-
-
-Use the following inputs:
-
-
-1. Restaurant Attributes:
-{format_dict_as_string(structured_input)}
-
-
-2. Neighborhood Trends (based on geolocation):
-{neighborhood_context} and the competitors in the area most similar to the restaurant {competitors}
-
-
-3. Most similar restaurants based on similarity search for a measurement of how well it would perform in Singapore,
-these should NOT be listed as competitors but rather listed as a basis of similar restaurants in Singapore:
-{vector_context}
-
-
-4. Location Feasibility and Growth based on the area: {area} given the population. If there is a low population density and little to no restaurants, give it a low score. 
-If no one lives in the area {demographic_population_of_area} and there are no neighboring restaurants due to its isolated location {neighborhood_context}, give the final score a 0 by default.
+    city = active_city_name()
+    # each context block appears once; the instructions below refer to it by its heading
+    return [
+        PromptSection("Task", f"You are an AI model tasked with evaluating a restaurant’s potential success in {city}.\n\nUse the following inputs:",
+                      required=True, heading=False),
+        PromptSection("1. Restaurant Attributes", format_dict_as_string(structured_input), required=True),
+        PromptSection("2. Neighborhood Trends (based on geolocation)", neighborhood_context, priority=3),
+        PromptSection("Competitors (the restaurants in the area most similar to this one)", competitors, priority=4),
+        PromptSection(f"3. Most Similar Restaurants (a basis of similar restaurants in {city} for how well it would perform, "
+                      "NOT competitors)", vector_context, priority=2),
+        PromptSection("4. Planning Area", str(area), required=True),
+        *gov_data_sections([area]),
+        PromptSection("Instructions", """
+Judge location feasibility and growth for the Planning Area given its Population and Demographics. If there is a low population density and little to no restaurants, give it a low score.
+If no one lives in the area and there are no neighboring restaurants due to its isolated location (see Neighborhood Trends), give the final score a 0 by default.
 
 
 Your task is to perform a SWOT analysis:
-- Strengths: 1) Unique offerings and atmosphere compared to competitors {competitors}, 2) accessibility and amenities, 3) dining options and service flexibility.
+- Strengths: 1) Unique offerings and atmosphere compared to the Competitors, 2) accessibility and amenities, 3) dining options and service flexibility.
 If a sub-factor has no meaningful weaknesses or improvements needed, assign it a score of 10. Treat this as a perfect score. 
 Avoid unnecessarily lowering strengths that clearly meet all expectations.
 Give a score out of 10 to each category and equal weight to the 3 categories.
 - Weaknesses: 1) Price points, 2) operational hours (include neighborhood average and different operational hours mean more customers, which is a HIGHER score), 3) restaurant density with a higher score for more restaurants in the area 
-due to clustering {neighborhood_context}. Don't include competitors.
+due to clustering (see Neighborhood Trends). Don't include competitors.
 If a sub-factor has no meaningful weaknesses or improvements needed, assign it a score of 10. Treat this as a perfect score. 
 Avoid unnecessarily lowering weaknesses that clearly meet all expectations.
 Give a score out of 10 to each category and equal weight to the 3 categories. 
-- Opportunities: 1) Growing population density {population_response}, 2) growing construction {construction_response}, 3) underserved cuisine 
-relative to the area meaning no other restaurants of the same cuisine in area {neighborhood_context}. 
+- Opportunities: 1) Growing population density (see Population and Demographics), 2) growing construction (see Construction), 3) underserved cuisine 
+relative to the area meaning no other restaurants of the same cuisine in area (see Neighborhood Trends). 
 If a sub-factor has no meaningful weaknesses or improvements needed, assign it a score of 10. Treat this as a perfect score. 
 Avoid unnecessarily lowering opportunities that clearly meet all expectations.
 Give a score out of 10 to each category and equal weight to the 3 categories. 
-- Threats: 1) High local competition and include only competitors {competitors} in the area {area} with their details (list competitors and their exact details). If there are no competitors,
-include details of restaurants in the area and their details {neighborhood_context}. 2) Strong saturation of this restauran't cuisine in the area (highest score if cuisine doesn't exist in neighborhood) {neighborhood_context}. 
+- Threats: 1) High local competition and include only the Competitors in the Planning Area with their details (list competitors and their exact details). If there are no competitors,
+include details of restaurants in the area from the Neighborhood Trends. 2) Strong saturation of this restauran't cuisine in the area (highest score if cuisine doesn't exist in neighborhood). 
 If a sub-factor has no meaningful weaknesses or improvements needed, assign it a score of 10. Treat this as a perfect score. 
 Avoid unnecessarily lowering threats that clearly meet all expectations.
 Give a score out of 10 to each category and equal weight to the 2 categories.
@@ -259,109 +239,308 @@ Finally, assign a success score from 0 to 100 with each category in SWOT. Make s
 Return JSON in the structure matching SWOTSubFactor and SWOTCategory schema. Include overall "Success Score" out of 100 with key name exactly "Success Score".
 Return JSON in the structure matching this format:
 
-{{
-  "strengths": {{
+{
+  "strengths": {
     "category": "Strengths",
     "explanation": "Overall summary of the strengths...",
     "sub_factors": [
-      {{
+      {
         "name": "Unique offerings and atmosphere",
         "explanation": "Explain why this is a strength",
         "score": 7.5
-      }},
-      {{
+      },
+      {
         "name": "Accessibility and amenities",
         "explanation": "Accessibility explanation",
         "score": 6.5
-      }}
+      }
     ],
     "total_score": 7.0
-  }},
-  "weaknesses": {{ ... }},
-  "opportunities": {{ ... }},
-  "threats": {{ ... }},
+  },
+  "weaknesses": { ... },
+  "opportunities": { ... },
+  "threats": { ... },
   "Success Score": 72.75
-}}
-
-Do not return anything outside this JSON structure. No markdown, headers, or extra text.
-
+}
+
+Do not return anything outside this JSON structure. No markdown, headers, or extra text.""", required=True, heading=False),
+    ]
+
+@traced()
+def format_prompt(structured_input, retrieved_docs, budget=PROMPT_TOKEN_BUDGET, exclude_place_ids=()):
+    prompt, usage = assemble_prompt(format_prompt_sections(structured_input, retrieved_docs, exclude_place_ids), budget)
+    current_span().set(prompt_tokens=sum(used for _, _, used in usage))
+    return prompt
+
+@lazy_resource
+def get_client():
+    from openai import OpenAI
+    return OpenAI()
+
+# Retries are handled by call_gpt4o_async itself so backoff and timeouts stay under our control
+@lazy_resource
+def get_async_client():
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(max_retries=0)
+
+def retryable_errors():
+    from openai import RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+    return (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError, asyncio.TimeoutError)
+
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4)) # SWOT calls in flight at once
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 120)) # seconds per attempt
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+
+LLM_MODEL = "gpt-4o"
+LLM_TEMPERATURE = 0.3
+
+# SWOT responses: "structured" sends the SWOTAnalysis JSON schema as the response format,
+# "compact" does the same with short explanations and a max_tokens cap, "text" is free-form JSON
+SWOT_RESPONSE_MODE = os.getenv("SWOT_RESPONSE_MODE", "structured")
+SWOT_COMPACT_MAX_TOKENS = int(os.getenv("SWOT_COMPACT_MAX_TOKENS", 900))
+SWOT_COMPACT_INSTRUCTIONS = """
+Keep it short: every "explanation" is one sentence of at most 20 words. Name competitors rather than
+repeating their details.
 """
-client = OpenAI() 
-
-def call_gpt4o(prompt):
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
-    )
-    return response.choices[0].message.content
 
+def swot_response_options(mode=SWOT_RESPONSE_MODE):
+    """Extra chat.completions arguments for a SWOT request in the given response mode."""
+    if mode == "text":
+        return {}
+    if mode not in ("structured", "compact"):
+        raise ValueError(f"Unknown SWOT response mode {mode!r}, expected structured, compact or text")
+    options = {"response_format": {
+        "type": "json_schema",
+        "json_schema": {"name": "swot_analysis", "strict": True, "schema": swot_json_schema()},
+    }}
+    if mode == "compact":
+        options["max_tokens"] = SWOT_COMPACT_MAX_TOKENS
+    return options
+
+def completion_content(response, use_cache, key):
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        current_span().set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    choice = response.choices[0]
+    content = choice.message.content
+    # a reply cut off by max_tokens is not worth keeping
+    if use_cache and content and choice.finish_reason != "length":
+        get_llm_cache().set(key, LLM_MODEL, content)
+    return content
+
+def forget_gpt4o_response(prompt, **options):
+    """Drop the cached reply to prompt (e.g. one that couldn't be parsed) so the next call asks again."""
+    options = {k: v for k, v in options.items() if v is not None}
+    if not cache_disabled():
+        get_llm_cache().delete(cache_key(LLM_MODEL, LLM_TEMPERATURE, prompt, **options))
+
+def call_gpt4o(prompt, use_cache=True, **options):
+    """GPT-4o completion; identical (normalized) prompts are answered from the local response cache.
+
+    options (response_format, max_tokens, ...) go to chat.completions.create and into the cache key.
+    """
+    options = {k: v for k, v in options.items() if v is not None}
+    use_cache = use_cache and not cache_disabled()
+    key = cache_key(LLM_MODEL, LLM_TEMPERATURE, prompt, **options)
+    with span("call_gpt4o") as s:
+        if use_cache:
+            cached = get_llm_cache().get(key)
+            if cached is not None:
+                s.set(cache_hit=True)
+                return cached
+        s.set(cache_hit=False)
+
+        response = get_client().chat.completions.create(
+            model=LLM_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=LLM_TEMPERATURE,
+            **options
+        )
+        return completion_content(response, use_cache, key)
+
+def retry_delay(error, attempt, backoff=1.0):
+    """Exponential backoff with jitter, or the server's Retry-After when it sends one."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return backoff * 2 ** attempt * (1 + random.random())
+
+async def call_gpt4o_async(prompt, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, use_cache=True, **options):
+    options = {k: v for k, v in options.items() if v is not None}
+    use_cache = use_cache and not cache_disabled()
+    key = cache_key(LLM_MODEL, LLM_TEMPERATURE, prompt, **options)
+    with span("call_gpt4o") as s:
+        if use_cache:
+            cached = get_llm_cache().get(key)
+            if cached is not None:
+                s.set(cache_hit=True)
+                return cached
+        s.set(cache_hit=False)
+
+        for attempt in range(max_retries + 1):
+            try:
+                response = await asyncio.wait_for(
+                    get_async_client().chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=LLM_TEMPERATURE,
+                        **options
+                    ),
+                    timeout,
+                )
+                s.set(retries=attempt)
+                return completion_content(response, use_cache, key)
+            except retryable_errors() as e:
+                if attempt == max_retries:
+                    raise
+                delay = retry_delay(e, attempt)
+                print(f"GPT-4o call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+# Narrow the similar restaurant search to the same cuisine and price band before vector scoring
+FILTERED_RETRIEVAL = os.getenv("FILTERED_RETRIEVAL", "1").lower() in ("1", "true", "yes")
+PRICE_BAND = 1.5 # similar restaurants cost between price / PRICE_BAND and price * PRICE_BAND
+
+def retrieval_filters(structured_input):
+    """Metadata filters (see models/metadata_store.py) for restaurants like structured_input."""
+    filters = {}
+    cuisine = re.sub(r"\s*restaurant$", "", structured_input.get("cuisine", ""), flags=re.I).strip()
+    if cuisine:
+        filters["main_category"] = re.compile(re.escape(cuisine), re.I)
+    price = structured_input.get("price", "")
+    # parse_rag inputs already carry the price as a number, parse_inputs ones as "$20-30"
+    price = float(price) if isinstance(price, (int, float)) else normalize_price(price)
+    if price > 0:
+        filters["average_price"] = (price / PRICE_BAND, price * PRICE_BAND)
+    return filters
+
+@traced()
+def retrieve_similar(structured_input, db, k=3, filters=None, exclude_place_ids=()):
+    """The k restaurants in db most similar to structured_input, among those matching filters
+    (retrieval_filters by default); topped up from the whole index if fewer than k match.
+    Restaurants in exclude_place_ids are never returned."""
+    from models.faiss_index import search_similar_documents
 
-def coordinates_pipeline(structured_input):
     query_str = format_dict_as_string(structured_input)
-
-    documents = []
-    for _, row in all_restaurants_df.iterrows():
-        doc_dict = {
-            "name": row.get("name", []),
-            "cuisine": row.get("main_category", []),
-            "rating": row.get("rating", []),
-            "price": row.get("Price per person", []),
-            "review count": row.get("reviews", []),
-            "address": row.get("address", []),
-            "open hours": row.get("open_hours", []),
-            "categories": row.get("categories", []),
-            "latitude,longitude":row.get("latitude, longitude", []),
-            "atmosphere rating": row.get("average_atmosphere_score",[]),
-            "service rating": row.get("average_service_score",[]),
-            "food rating": row.get("average_food_score",[]),
-            "service options": row.get("Service options", []),
-            "offerings": row.get("Offerings",[]),
-            "dining options": row.get("Dining options",[]),
-            "crowd": row.get("Crowd",[]),
-            "children": row.get("Children",[]),
-            "accessibility": row.get("Accessibility",[]),
-            "amenities": row.get("Amenities",[]),
-            "payments": row.get("Payments",[]),
-            "planning": row.get("Planning",[]),
-            "pets": row.get("Pets",[])
-        }
-        documents.append(Document(page_content=format_dict_as_string(doc_dict), metadata={"place_id": row.get("place_id", "")}))
-
-    db = build_faiss_index(documents)
-    retrieved_docs = search_similar_documents(query_str, db)
-
-    prompt = coordinates_prompt(structured_input, retrieved_docs)
-    return call_gpt4o(prompt)
+    exclude = set(map(str, exclude_place_ids))
+
+    def search(k, filters=None):
+        docs = search_similar_documents(query_str, db, k + len(exclude), filters)
+        return [doc for doc in docs if str(doc.metadata.get("place_id", "")) not in exclude][:k]
+
+    if filters is None:
+        filters = retrieval_filters(structured_input) if FILTERED_RETRIEVAL else {}
+    docs = []
+    if filters and getattr(db, "metadata", None) is not None:
+        docs = search(k, filters)
+    if len(docs) < k:
+        seen = {doc.page_content for doc in docs}
+        docs += [doc for doc in search(2 * k) if doc.page_content not in seen][:k - len(docs)]
+    return docs
+
+@traced()
+def build_coordinates_prompt(structured_input, city=None):
+    # There is no location to route on yet: suggest locations in `city` (default Singapore)
+    with use_city(city or structured_input.get("city")):
+        # The corpus is embedded offline (python cli.py build-index); here we only embed the query
+        retrieved_docs = retrieve_similar(structured_input, get_corpus_index())
+
+        return coordinates_prompt(structured_input, retrieved_docs)
+
+@traced()
+def coordinates_pipeline(structured_input, use_cache=True, city=None):
+    prompt = build_coordinates_prompt(structured_input, city)
+    return call_gpt4o(prompt, use_cache)
 
 # === LOAD FAISS INDEX ===
-faiss_db_path = "/Users/amyyz/Documents/NUS/Official Demo/data/faiss_db"
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-faiss_index = FAISS.load_local(
-    faiss_db_path,
-    embeddings=embeddings,
-    allow_dangerous_deserialization=True
-)
-
-def run_rag_pipeline(structured_input, db = faiss_index):
-    query_str = format_dict_as_string(structured_input)
-    retrieved_docs = search_similar_documents(query_str, db)
-
-    prompt = format_prompt(structured_input, retrieved_docs)
-    output = call_gpt4o(prompt)
-
-    predicted_score = extract_success_score_from_swot_text(output)
+faiss_db_path = data_path("faiss_db")
+
+@lazy_resource
+def get_faiss_index():
+    from langchain_community.vectorstores import FAISS
+    from models.embeddings import get_embeddings
+    return FAISS.load_local(
+        faiss_db_path,
+        embeddings=get_embeddings(), # shared, lazily loaded MiniLM
+        allow_dangerous_deserialization=True
+    )
 
-    if predicted_score is None:
+@lazy_resource
+def get_singapore_corpus_index():
+    from models.faiss_index import load_corpus_index, build_corpus_index, restaurant_documents
+    from models.embeddings import get_embeddings
+    corpus_index = load_corpus_index(get_embeddings())
+    if corpus_index is None:
+        print("No corpus index found, building it now (run `python cli.py build-index` ahead of time to skip this).")
+        corpus_index, _ = build_corpus_index(restaurant_documents(get_singapore_restaurants()))
+    return corpus_index
+
+def get_corpus_index():
+    """Corpus index of the active city, Singapore by default."""
+    shard = active_shard()
+    return get_singapore_corpus_index() if shard is None else shard.corpus_index
+
+def __getattr__(name):
+    # the old module level globals, now loaded on first access
+    resources = {
+        "residual_model": get_residual_model,
+        "all_restaurants_df": get_all_restaurants,
+        "faiss_index": get_faiss_index,
+        "corpus_index": get_corpus_index,
+        "client": get_client,
+        "async_client": get_async_client,
+    }
+    if name in resources:
+        return resources[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warm_up():
+    """Load every heavy resource now instead of on first request (used by long running processes)."""
+    from utils.singapore import get_planning_area_index
+    from models.locations import get_spatial_index, get_neighborhood_tiles
+    from models.location_optimizer import get_location_grid
+    get_residual_model()
+    get_spatial_index(get_all_restaurants())
+    get_neighborhood_tiles(get_all_restaurants())
+    get_location_grid(get_all_restaurants())
+    get_faiss_index()
+    get_corpus_index()
+    get_client()
+    get_async_client()
+    get_planning_area_index()
+
+@traced()
+def build_rag_prompt(structured_input, db = None, mode=SWOT_RESPONSE_MODE, exclude_place_ids=()):
+    # the location picks the city whose restaurants, index and areas the prompt is built from
+    # exclude_place_ids keeps restaurants out of the similar restaurants and competitors (e.g. the one being scored)
+    with use_city(city_for_input(structured_input)):
+        if db is None:
+            # only the corpus index has the metadata store filtered retrieval needs;
+            # the legacy faiss_db only has Singapore
+            db = get_corpus_index() if FILTERED_RETRIEVAL or active_shard() is not None else get_faiss_index()
+        retrieved_docs = retrieve_similar(structured_input, db, exclude_place_ids=exclude_place_ids)
+        prompt = format_prompt(structured_input, retrieved_docs, exclude_place_ids=exclude_place_ids)
+    if mode == "compact":
+        prompt += SWOT_COMPACT_INSTRUCTIONS
+    return prompt
+
+def score_swot_output(structured_input, output):
+    # parsed once, then shared by the score and the residual features
+    swot = parse_swot(output)
+
+    if swot is None:
         return None 
+    predicted_score = swot.success_score
 
     # Apply residual correction
     try:
         structured_features = extract_features(structured_input)
-        swot_features = extract_swot_features(output)
+        swot_features = extract_swot_features(swot)
         combined_features = structured_features + swot_features
-        correction = residual_model.predict([combined_features])[0]
+        correction = get_residual_model().predict([combined_features])[0]
         # print("correction is:", correction)        
         adjusted_score = predicted_score + correction
     except Exception as e:
@@ -370,3 +549,36 @@ def run_rag_pipeline(structured_input, db = faiss_index):
 
     return f"SWOT Analysis:\n{output}\nResidual-adjusted Success Score: {float(adjusted_score):.3f}"
 
+@traced()
+def run_rag_pipeline(structured_input, db = None, use_cache=True, mode=SWOT_RESPONSE_MODE):
+    prompt = build_rag_prompt(structured_input, db, mode)
+    output = call_gpt4o(prompt, use_cache, **swot_response_options(mode))
+    return score_swot_output(structured_input, output)
+
+@traced("run_rag_pipeline")
+async def run_rag_pipeline_async(structured_input, db = None, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, use_cache=True, mode=SWOT_RESPONSE_MODE):
+    # retrieval and prompt building are CPU bound, keep them off the event loop
+    prompt = await asyncio.to_thread(build_rag_prompt, structured_input, db, mode)
+    output = await call_gpt4o_async(prompt, timeout, max_retries, use_cache, **swot_response_options(mode))
+    return score_swot_output(structured_input, output)
+
+async def evaluate_locations(structured_input, coords, concurrency=LLM_CONCURRENCY, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, use_cache=True, mode=SWOT_RESPONSE_MODE):
+    """Run the SWOT pipeline for every (area, "lat, lon") candidate concurrently.
+
+    At most `concurrency` evaluations are in flight; a candidate that still fails after its
+    retries gets None instead of failing the others. Returns (area, coord, swot) in input order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def evaluate(area, coord):
+        this_inputs = deepcopy(structured_input)
+        this_inputs['location'] = coord
+        async with semaphore:
+            try:
+                swot_output = await run_rag_pipeline_async(parse_rag(this_inputs), timeout=timeout, max_retries=max_retries, use_cache=use_cache, mode=mode)
+            except Exception as e:
+                print(f"SWOT analysis failed for {area} ({coord}):", e)
+                swot_output = None
+        return area, coord, swot_output
+
+    return await asyncio.gather(*(evaluate(area, coord) for area, coord in coords))
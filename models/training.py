@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import hashlib
+import asyncio
+import numpy as np
+import pandas as pd
+from utils.paths import data_path
+from models.preprocessing import parse_row_to_input, extract_features_from_df, extract_swot_features, parse_swot
+from models.rag_model import build_rag_prompt, call_gpt4o_async, swot_response_options, residual_model_path, \
+    LLM_CONCURRENCY, LLM_TIMEOUT, LLM_MAX_RETRIES
+
+TRAINING_CSV_PATH = data_path("filtered_training_data.csv")
+TRAINING_DIR = data_path("training")
+SWOT_OUTPUTS_PATH = os.path.join(TRAINING_DIR, "swot_outputs.jsonl")
+FEATURES_PATH = os.path.join(TRAINING_DIR, "features.npz")
+FEATURES_VERSION = 1 # bump when extract_features / extract_swot_features change
+SWOT_PROMPT_VERSION = 2 # bump when the training prompts change; cached SWOTs of other versions are asked again
+
+# Matches the shipped residual_corrector.pkl (GradientBoostingRegressor with sklearn's defaults)
+DEFAULT_PARAMS = {"n_estimators": 100, "learning_rate": 0.1, "max_depth": 3, "subsample": 1.0}
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_swot_outputs(path=SWOT_OUTPUTS_PATH):
+    """place_id -> cached GPT-4o SWOT output for that training restaurant."""
+    outputs = {}
+    if not os.path.exists(path):
+        return outputs
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # cut short by an interrupted run
+            # version 1 prompts showed the restaurant itself (and its success_score) as a similar restaurant
+            if record.get("prompt_version", 1) == SWOT_PROMPT_VERSION:
+                outputs[record["place_id"]] = record["swot"]
+    return outputs
+
+async def generate_swot_outputs(training_df, path=SWOT_OUTPUTS_PATH, concurrency=LLM_CONCURRENCY,
+                                timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES):
+    """Ask GPT-4o for a SWOT of every training restaurant not in the cache yet, appending each to path.
+
+    Each restaurant is described by its own attributes at its own location, so the corrector
+    learns how far the LLM's Success Score is from the restaurant's observed success_score.
+    The restaurant itself is left out of its similar restaurants and competitors: a prompt at
+    inference never contains the restaurant being scored, or its success_score.
+    """
+    cached = load_swot_outputs(path)
+    todo = training_df[~training_df["place_id"].isin(cached)]
+    if todo.empty:
+        return cached
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+    start = time.time()
+
+    with open(path, "a") as out:
+        async def generate(place_id, structured_input):
+            nonlocal done
+            async with semaphore:
+                try:
+                    prompt = await asyncio.to_thread(build_rag_prompt, structured_input, exclude_place_ids=[place_id])
+                    swot = await call_gpt4o_async(prompt, timeout, max_retries, **swot_response_options())
+                except Exception as e:
+                    print(f"SWOT for {place_id} failed:", e)
+                    return
+            out.write(json.dumps({"place_id": place_id, "swot": swot, "prompt_version": SWOT_PROMPT_VERSION}) + "\n")
+            out.flush()
+            cached[place_id] = swot
+            done += 1
+            if done % 50 == 0:
+                print(f"  {done}/{len(todo)} SWOT analyses in {time.time() - start:.0f}s")
+
+        await asyncio.gather(*(generate(row["place_id"], parse_row_to_input(row)) for _, row in todo.iterrows()))
+    return cached
+
+def build_feature_matrix(training_df, swot_outputs):
+    """X = structured features + SWOT features; y = observed success_score - the LLM's Success Score."""
+    parsed = [parse_swot(swot_outputs.get(place_id) or "") for place_id in training_df["place_id"]]
+    usable = np.array([swot is not None for swot in parsed], dtype=bool)
+    rows = training_df[usable]
+    parsed = [swot for swot in parsed if swot is not None]
+
+    structured = extract_features_from_df(rows).to_numpy(dtype=float)
+    swot = np.array([extract_swot_features(swot) for swot in parsed], dtype=float)
+    X = np.hstack([structured, swot.reshape(len(rows), -1)])
+    y = rows["success_score"].to_numpy(dtype=float) - np.array([swot.success_score for swot in parsed])
+    return X, y, rows["place_id"].to_numpy()
+
+def features_signature(training_csv, swot_outputs_path):
+    return {
+        "version": FEATURES_VERSION,
+        "training_csv": file_sha256(training_csv),
+        "swot_outputs": file_sha256(swot_outputs_path) if os.path.exists(swot_outputs_path) else None,
+    }
+
+def load_training_features(training_csv=TRAINING_CSV_PATH, swot_outputs_path=SWOT_OUTPUTS_PATH,
+                           features_path=FEATURES_PATH, refresh_swot=False, concurrency=LLM_CONCURRENCY):
+    """(X, y, place_ids) for training, served from features.npz while the CSV and SWOT outputs are unchanged.
+
+    Only restaurants without a cached SWOT output hit the LLM, so retraining with new
+    hyperparameters (or after an interrupted run) reuses every answer already paid for.
+    """
+    if refresh_swot and os.path.exists(swot_outputs_path):
+        os.remove(swot_outputs_path)
+
+    training_df = pd.read_csv(training_csv)
+    if not refresh_swot and os.path.exists(features_path):
+        cached = np.load(features_path, allow_pickle=False)
+        signature = features_signature(training_csv, swot_outputs_path)
+        # reuse only if no restaurant is still waiting for its SWOT (e.g. after failed calls)
+        if json.loads(str(cached["signature"])) == signature and \
+                set(training_df["place_id"]) <= set(load_swot_outputs(swot_outputs_path)):
+            return cached["X"], cached["y"], cached["place_ids"]
+
+    swot_outputs = asyncio.run(generate_swot_outputs(training_df, swot_outputs_path, concurrency))
+    X, y, place_ids = build_feature_matrix(training_df, swot_outputs)
+
+    os.makedirs(os.path.dirname(features_path), exist_ok=True)
+    tmp_path = features_path + ".tmp.npz"
+    np.savez(tmp_path, X=X, y=y, place_ids=place_ids.astype(str),
+             signature=json.dumps(features_signature(training_csv, swot_outputs_path)))
+    os.replace(tmp_path, features_path)
+    return X, y, place_ids
+
+def cross_validate_corrector(X, y, params=None, folds=5, n_jobs=-1, random_state=0):
+    """K-fold MAE/RMSE of the corrected score, with the folds fitted in parallel processes."""
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.model_selection import KFold, cross_validate
+
+    model = GradientBoostingRegressor(**{**DEFAULT_PARAMS, **(params or {})}, random_state=random_state)
+    cv = KFold(n_splits=min(folds, len(y)), shuffle=True, random_state=random_state)
+    scores = cross_validate(model, X, y, cv=cv, n_jobs=n_jobs,
+                            scoring=("neg_mean_absolute_error", "neg_root_mean_squared_error"))
+    return {
+        "mae": float(-scores["test_neg_mean_absolute_error"].mean()),
+        "mae_std": float(scores["test_neg_mean_absolute_error"].std()),
+        "rmse": float(-scores["test_neg_root_mean_squared_error"].mean()),
+        # what the uncorrected LLM score is off by, for comparison
+        "baseline_mae": float(np.abs(y).mean()),
+        "fit_s": float(scores["fit_time"].mean()),
+    }
+
+def inference_latency(model, X, repeats=200):
+    """Per-row predict latency: one row at a time (as score_swot_output does) and batched."""
+    rows = X[np.arange(repeats) % len(X)]
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        model.predict([row])
+        timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    model.predict(rows)
+    batched = (time.perf_counter() - start) / len(rows)
+    return {"single_row_ms": float(np.median(timings) * 1000), "batched_row_ms": float(batched * 1000)}
+
+def train_corrector(params=None, training_csv=TRAINING_CSV_PATH, output_path=residual_model_path, folds=5,
+                    n_jobs=-1, refresh_swot=False, concurrency=LLM_CONCURRENCY, random_state=0):
+    """Cross-validate, fit on every row and save the residual corrector (with a .json report next to it)."""
+    import joblib
+    import sklearn
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    start = time.time()
+    X, y, place_ids = load_training_features(training_csv, refresh_swot=refresh_swot, concurrency=concurrency)
+    print(f"{len(y)} training rows, {X.shape[1]} features ({time.time() - start:.1f}s)")
+
+    report = {"params": params, "rows": int(len(y)), "folds": folds, "sklearn_version": sklearn.__version__}
+    report["cv"] = cross_validate_corrector(X, y, params, folds, n_jobs, random_state)
+
+    model = GradientBoostingRegressor(**params, random_state=random_state).fit(X, y)
+    report["latency"] = inference_latency(model, X)
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, output_path)
+    with open(os.path.splitext(output_path)[0] + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    # a long running process picks up the new model on its next prediction
+    from models.rag_model import get_residual_model
+    get_residual_model.reset()
+    return model, report
@@ -0,0 +1,264 @@
+"""Long-running HTTP service for the restaurant RAG model.
+
+    python server.py --port 8000 --workers 8
+
+Loads the FAISS indexes, restaurant table, residual model and geo data once at startup
+(warm_up) and then serves:
+
+    GET  /health       {"status": "ok", "in_flight": n, ...}
+    GET  /metrics      p50/p95/p99 per pipeline stage since startup (with TRACING=1)
+    POST /coordinates  body: the same fields main.py prompts for -> suggested areas + coordinates
+                       (optional "city": a city under data/cities, default Singapore)
+    POST /swot         body: the same fields, including "location": "lat, lon" -> residual-adjusted SWOT
+    POST /evaluate     body: the same fields -> coordinates, then a SWOT for every suggested location
+                       (optional "candidates": "grid" picks them by local grid search instead of GPT-4o,
+                       "top": how many, 1 to 10, default 3)
+
+Requests are handled by a bounded pool of worker threads; once `workers + max_queue`
+requests are waiting the server answers 503 instead of queueing without limit.
+Point OPENAI_BASE_URL at utils/mock_openai.py to run it without the OpenAI API.
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+os.environ["TOKENIZERS_PARALLELISM"] = "false" # avoid parallelism warning
+
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 8)) # requests processed at once
+SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", 64)) # requests allowed to wait for a worker
+MAX_GRID_CANDIDATES = 10 # "top" of an /evaluate grid search: each candidate costs a SWOT call
+
+class EventLoopThread:
+    """One event loop on its own thread that runs the coroutines of every request.
+
+    The AsyncOpenAI client is process wide and its keep-alive connections belong to the loop
+    they were opened on; an asyncio.run() per request would hand them to a new loop each time.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="rag-event-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coroutine):
+        """Run coroutine on the loop and wait for its result from the calling (worker) thread."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+def run_async(coroutine):
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = EventLoopThread()
+    return _event_loop.run(coroutine)
+
+def close_event_loop():
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is not None:
+            _event_loop.close()
+            _event_loop = None
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a fixed-size thread pool instead of a new thread."""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, workers=SERVER_WORKERS, max_queue=SERVER_MAX_QUEUE):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-worker")
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rejected": 0, "in_flight": 0}
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.stats["rejected"] += 1
+            # answered right here on the accept thread; the pool is busy by definition
+            self.reject_request(request)
+            return
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def reject_request(self, request):
+        try:
+            # read the request first, closing with unread data would reset the connection
+            request.settimeout(1)
+            request.recv(65536)
+            body = b'{"error": "server busy, retry later"}'
+            request.sendall(b"HTTP/1.0 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                            b"Retry-After: 1\r\nConnection: close\r\nContent-Length: "
+                            + str(len(body)).encode() + b"\r\n\r\n" + body)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+        close_event_loop()
+
+def request_input(body):
+    """parse_inputs of a JSON body whose fields may also be numbers or lists, as in batch-score specs."""
+    from models.preprocessing import parse_inputs
+    from models.batch_scoring import spec_to_user_input
+    for key, value in body.items():
+        if not all(v is None or isinstance(v, (str, int, float)) for v in (value if isinstance(value, list) else [value])):
+            raise ValueError(f'"{key}" must be a string, a number or a list of them')
+    return parse_inputs(spec_to_user_input(body))
+
+def grid_candidates(body):
+    """The body's "top": a whole number from 1 to MAX_GRID_CANDIDATES (3 if missing)."""
+    top = body.get("top", 3)
+    if isinstance(top, str) and top.strip().isdigit():
+        top = int(top)
+    if isinstance(top, bool) or not isinstance(top, int) or not 1 <= top <= MAX_GRID_CANDIDATES:
+        raise ValueError(f'"top" must be a whole number from 1 to {MAX_GRID_CANDIDATES}')
+    return top
+
+def handle_coordinates(body):
+    from models.preprocessing import extract_best_fit_coords
+    from models.rag_model import coordinates_pipeline
+
+    coordinates_output = coordinates_pipeline(request_input(body), city=body.get("city"))
+    return {
+        "coordinates_output": coordinates_output,
+        "candidates": [{"area": area, "location": coord} for area, coord in extract_best_fit_coords(coordinates_output)],
+    }
+
+def handle_swot(body):
+    from models.preprocessing import parse_rag
+    from models.rag_model import run_rag_pipeline
+
+    structured_input = request_input(body)
+    if not structured_input["location"]:
+        raise ValueError('"location" is required, e.g. "1.283, 103.851"')
+    return {"swot": run_rag_pipeline(parse_rag(structured_input))}
+
+def handle_evaluate(body):
+    from models.preprocessing import extract_best_fit_coords
+    from models.rag_model import coordinates_pipeline, evaluate_locations
+
+    structured_input = request_input(body)
+    if body.get("candidates") == "grid":
+        from models.location_optimizer import suggest_locations
+        from utils.cities import use_city
+        with use_city(body.get("city")):
+            coords = suggest_locations(structured_input, grid_candidates(body))
+        coordinates_output = None
+    else:
+        coordinates_output = coordinates_pipeline(structured_input, city=body.get("city"))
+        coords = extract_best_fit_coords(coordinates_output)
+    outputs = run_async(evaluate_locations(structured_input, coords))
+    return {
+        "coordinates_output": coordinates_output,
+        "locations": [{"area": area, "location": coord, "swot": swot} for area, coord, swot in outputs],
+    }
+
+ROUTES = {
+    "/coordinates": handle_coordinates,
+    "/swot": handle_swot,
+    "/evaluate": handle_evaluate,
+}
+
+class RAGRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") == "/metrics":
+            from utils.tracing import summary, get_tracer
+            return self.send_json(200, {"tracing": get_tracer().enabled, "spans": summary()})
+        if self.path.rstrip("/") != "/health":
+            return self.send_json(404, {"error": "not found"})
+        with self.server.lock:
+            stats = dict(self.server.stats)
+        self.send_json(200, {"status": "ok", **stats})
+
+    def do_POST(self):
+        handler = ROUTES.get(self.path.rstrip("/"))
+        if handler is None:
+            return self.send_json(404, {"error": "not found"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("request body must be a JSON object")
+        except ValueError as e:
+            return self.send_json(400, {"error": f"invalid JSON body: {e}"})
+
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+            self.server.stats["in_flight"] += 1
+        start = time.perf_counter()
+        try:
+            result = handler(body)
+            status = 200
+        except ValueError as e:
+            result, status = {"error": str(e)}, 400
+        except Exception as e:
+            print(f"{self.path} failed:", e)
+            with self.server.lock:
+                self.server.stats["errors"] += 1
+            result, status = {"error": str(e)}, 500
+        finally:
+            with self.server.lock:
+                self.server.stats["in_flight"] -= 1
+        result["elapsed_s"] = round(time.perf_counter() - start, 3)
+        self.send_json(status, result)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host="127.0.0.1", port=8000, workers=SERVER_WORKERS, max_queue=SERVER_MAX_QUEUE, warm=True):
+    """Build the server (warming every resource first unless warm=False); call serve_forever() on it."""
+    if warm:
+        from models.rag_model import warm_up
+        start = time.time()
+        warm_up()
+        print(f"Loaded models, indexes and geo data in {time.time() - start:.1f}s")
+    return PooledHTTPServer((host, port), RAGRequestHandler, workers, max_queue)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--max-queue", type=int, default=SERVER_MAX_QUEUE)
+    parser.add_argument("--no-warm-up", action="store_true", help="Load resources on the first request instead.")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.workers, args.max_queue, warm=not args.no_warm_up)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
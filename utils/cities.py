@@ -0,0 +1,262 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from utils.paths import data_path
+
+# One folder per extra city, each laid out like the top level data folder:
+#   cities/<city>/places.csv, all_reviews.csv, About/   scraped sources
+#   cities/<city>/boundaries.geojson                    area polygons (the city's planning areas)
+#   cities/<city>/city.json                             {"name": ..., "area_column": ..., "bbox": [...]}
+#   cities/<city>/restaurants.parquet, corpus_index/    built by `python cli.py build-city <city>`
+# The original Singapore data in the top level folder stays the default city.
+CITIES_DIR = data_path("cities")
+DEFAULT_CITY = "singapore"
+MAX_LOADED_CITIES = int(os.getenv("MAX_LOADED_CITIES", 2)) # cities held in memory at once
+CITY_FILE = "city.json"
+BOUNDARIES_FILE = "boundaries.geojson"
+
+class CityShard:
+    """One city's restaurant table, corpus index and area boundaries, each loaded on first use."""
+
+    def __init__(self, name, root=CITIES_DIR):
+        self.name = name
+        self.dir = os.path.join(root, name)
+        try:
+            with open(self.path(CITY_FILE)) as f:
+                self.config = json.load(f)
+        except FileNotFoundError:
+            self.config = {}
+        self._lock = threading.RLock()
+        self._resources = {}
+        self.users = 0 # use_city blocks running on this city (see CityRouter.acquire)
+
+    def path(self, *parts):
+        return os.path.join(self.dir, *parts)
+
+    @property
+    def display_name(self):
+        return self.config.get("name", self.name.replace("_", " ").title())
+
+    def resource(self, key, loader):
+        with self._lock:
+            if key not in self._resources:
+                self._resources[key] = loader()
+            return self._resources[key]
+
+    def source_paths(self):
+        return self.path("places.csv"), self.path("all_reviews.csv"), self.path("About")
+
+    def snapshot_options(self):
+        return {
+            "snapshot_path": self.path("restaurants.parquet"),
+            "manifest_path": self.path("restaurants.manifest.json"),
+            "about_sidecar_path": self.path("about.parquet"),
+            "area_lookup": self.planning_areas,
+        }
+
+    @property
+    def restaurants(self):
+        from utils.data_loader import load_restaurants
+        return self.resource("restaurants", lambda: load_restaurants(*self.source_paths(), **self.snapshot_options()))
+
+    @property
+    def corpus_index(self):
+        def load():
+            from models.embeddings import get_embeddings
+            from models.faiss_index import load_corpus_index, build_corpus_index, restaurant_documents
+            index = load_corpus_index(get_embeddings(), self.path("corpus_index"))
+            if index is None:
+                print(f"No corpus index for {self.name}, building it now (run `python cli.py build-city {self.name}` ahead of time).")
+                index, _ = build_corpus_index(restaurant_documents(self.restaurants), self.path("corpus_index"))
+            return index
+        return self.resource("corpus_index", load)
+
+    @property
+    def area_index(self):
+        def load():
+            import geopandas as gpd
+            from utils.singapore import PlanningAreaIndex
+            areas = gpd.read_file(self.path(BOUNDARIES_FILE))
+            return PlanningAreaIndex(areas.rename(columns={self.config.get("area_column", "planning_area"): "planning_area"}))
+        return self.resource("area_index", load)
+
+    def planning_area(self, lat, lon):
+        return self.area_index.lookup_one(lat, lon)
+
+    def planning_areas(self, lats, lons):
+        return self.area_index.lookup(lats, lons)
+
+    def bbox(self):
+        """(min_lon, min_lat, max_lon, max_lat) of the city's boundaries, from city.json when recorded there."""
+        if "bbox" not in self.config:
+            import geopandas as gpd
+            self.config["bbox"] = [float(v) for v in gpd.read_file(self.path(BOUNDARIES_FILE)).total_bounds]
+        return self.config["bbox"]
+
+    def covers(self, lat, lon):
+        min_lon, min_lat, max_lon, max_lat = self.bbox()
+        return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+
+    def unload(self):
+        """Drop everything loaded (and the spatial indexes built on the restaurant table), unless
+        the city is in use again by the time the shard is free."""
+        from models.locations import forget_frame
+        with self._lock:
+            if self.users:
+                return
+            restaurants = self._resources.pop("restaurants", None)
+            if restaurants is not None:
+                forget_frame(restaurants)
+            self._resources.clear()
+
+class CityRouter:
+    """Picks the city for a location and keeps at most max_loaded cities in memory (least recently used go first).
+    Cities in use are never dropped, so more than max_loaded can be loaded while many are busy."""
+
+    def __init__(self, root=CITIES_DIR, max_loaded=MAX_LOADED_CITIES):
+        self.root = root
+        self.max_loaded = max_loaded
+        self._lock = threading.Lock()
+        self._shards = {} # every city found, config only
+        self._loaded = OrderedDict() # name -> shard, most recently used last
+
+    def cities(self):
+        """Names of the cities under root (the default city is not one of them)."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def describe(self, name):
+        """The shard for name without loading or counting it as used."""
+        if name not in self._shards and name not in self.cities():
+            raise ValueError(f"Unknown city {name!r}, expected {', '.join([DEFAULT_CITY] + self.cities())}")
+        with self._lock:
+            if name not in self._shards:
+                self._shards[name] = CityShard(name, self.root)
+            return self._shards[name]
+
+    def route(self, lat, lon):
+        """Name of the city containing (lat, lon): bounding boxes first, boundaries only to settle overlaps.
+        DEFAULT_CITY when no other city covers it."""
+        candidates = [name for name in self.cities() if self.describe(name).covers(lat, lon)]
+        if len(candidates) > 1:
+            candidates = [name for name in candidates if self.contains(name, lat, lon)] or candidates
+        return candidates[0] if candidates else DEFAULT_CITY
+
+    def contains(self, name, lat, lon):
+        shard = self.acquire(name)
+        try:
+            return shard.planning_area(lat, lon) is not None
+        finally:
+            self.release(name)
+
+    def acquire(self, name):
+        """The shard for name, marked most recently used and kept in memory until release(name).
+        Evicts the least recently used shards nobody holds while more than max_loaded are loaded."""
+        shard = self.describe(name)
+        with self._lock:
+            shard.users += 1
+            self._loaded[name] = shard
+            self._loaded.move_to_end(name)
+            evicted = self._evictable()
+        for old in evicted:
+            old.unload()
+        return shard
+
+    def release(self, name):
+        with self._lock:
+            self._shards[name].users -= 1
+            evicted = self._evictable() # cities held past max_loaded can go now
+        for old in evicted:
+            old.unload()
+
+    def _evictable(self):
+        # called with the lock held; a shard held by a running request is skipped, never unloaded under it
+        evicted = []
+        for name in list(self._loaded):
+            if len(self._loaded) <= self.max_loaded:
+                break
+            if self._loaded[name].users == 0:
+                evicted.append(self._loaded.pop(name))
+        return evicted
+
+    def loaded(self):
+        with self._lock:
+            return list(self._loaded)
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_city_router():
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = CityRouter()
+        return _router
+
+# The city the current request/task works on; None is DEFAULT_CITY. Context variables follow
+# asyncio tasks and asyncio.to_thread, so a city set around a pipeline call reaches its prompt builders.
+_active_city = ContextVar("active_city", default=None)
+
+def resolve_city(name):
+    """The folder name of city `name` ("New York" -> "new_york"), None for the default city.
+    Raises ValueError for a city that isn't under CITIES_DIR (names come from request bodies)."""
+    if name is None or not str(name).strip():
+        return None
+    key = "_".join(str(name).strip().lower().split())
+    if key == DEFAULT_CITY:
+        return None
+    get_city_router().describe(key) # ValueError unless it is one of the city folders
+    return key
+
+@contextmanager
+def use_city(name):
+    """Run the block against city `name` (None or DEFAULT_CITY: the top level Singapore data)."""
+    name = resolve_city(name)
+    if name is not None:
+        get_city_router().acquire(name) # the shard stays loaded for the whole block
+    token = _active_city.set(name)
+    try:
+        yield
+    finally:
+        _active_city.reset(token)
+        if name is not None:
+            get_city_router().release(name)
+
+def city_for_input(structured_input):
+    """The input's "city" if given, else the city its "lat, lon" location falls in, else None."""
+    if structured_input.get("city"):
+        return structured_input["city"]
+    try:
+        lat, lon = map(float, str(structured_input.get("location", "")).split(","))
+    except ValueError:
+        return None
+    return get_city_router().route(lat, lon)
+
+def active_shard():
+    """The CityShard of the active city, or None for the default city (held by the use_city block)."""
+    name = _active_city.get()
+    return None if name is None else get_city_router().describe(name)
+
+def active_city_name():
+    shard = active_shard()
+    return "Singapore" if shard is None else shard.display_name
+
+def get_planning_area(lat, lon):
+    from utils import singapore
+    shard = active_shard()
+    return singapore.get_planning_area(lat, lon) if shard is None else shard.planning_area(lat, lon)
+
+def get_city_bbox():
+    """(min_lon, min_lat, max_lon, max_lat) of the active city's area boundaries."""
+    from utils import singapore
+    shard = active_shard()
+    return [float(v) for v in singapore.get_planning_areas_gdf().total_bounds] if shard is None else shard.bbox()
+
+def get_planning_areas(lats, lons):
+    from utils import singapore
+    shard = active_shard()
+    return singapore.get_planning_areas(lats, lons) if shard is None else shard.planning_areas(lats, lons)
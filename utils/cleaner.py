@@ -1,7 +1,8 @@
 import pandas as pd
+from utils.paths import data_path
 
-valid_training_path = '/Users/amyyz/Documents/NUS/Official Demo/data/valid_training_data.csv'
-training_csv = pd.read_csv(valid_training_path)
+valid_training_path = data_path("valid_training_data.csv")
+filtered_training_path = data_path("filtered_training_data.csv")
 
 # List of required fields (must be present and non-null)
 required_fields = [
@@ -23,8 +24,13 @@ required_fields = [
     "Pets",
 ]
 
-# Filter out rows where any of the required fields is missing
-filtered_df = training_csv.dropna(subset=required_fields)
+def filter_training_data(input_path=valid_training_path, output_path=filtered_training_path):
+    """Drop training rows missing any required field and save the rest (python cli.py filter-training-data)."""
+    training_csv = pd.read_csv(input_path)
 
-# Optional: save filtered data
-filtered_df.to_csv("/Users/amyyz/Documents/NUS/Official Demo/data/filtered_training_data.csv", index=False)
+    # Filter out rows where any of the required fields is missing
+    filtered_df = training_csv.dropna(subset=required_fields)
+
+    if output_path:
+        filtered_df.to_csv(output_path, index=False)
+    return filtered_df
@@ -1,11 +1,25 @@
 import pandas as pd
 import re
+import ast
 import json
 import os
+import hashlib
 import numpy as np
-from utils.singapore import get_planning_area
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.singapore import get_planning_areas
+from utils.tracing import traced, span, current_span
+from utils.paths import data_path
 from datetime import datetime
 
+# Pre-joined, columnar copy of load_all_restaurants() plus the source signature it was built from
+SNAPSHOT_PATH = data_path("restaurants.parquet")
+SNAPSHOT_MANIFEST_PATH = data_path("restaurants.manifest.json")
+SNAPSHOT_VERSION = 2 # bump whenever load_all_restaurants changes what it produces
+
+# All About/*.json files compacted into one Parquet file sorted by place_id
+ABOUT_SIDECAR_PATH = data_path("about.parquet")
+ABOUT_WORKERS = 16 # files read concurrently when there is no sidecar yet
+
 def extract_lat_lng(link):
     # Match pattern like @lat,lng,
     match = re.search(r'!3d([-.\d]+)!4d([-.\d]+)', link)
@@ -16,7 +30,210 @@ def extract_lat_lng(link):
         return None, None
 
 
-def load_all_restaurants(places_path='/Users/amyyz/Documents/NUS/Official Demo/data/places.csv', reviews_path='/Users/amyyz/Documents/NUS/Official Demo/data/all_reviews.csv', about_path='/Users/amyyz/Documents/NUS/Official Demo/data/About'):
+REVIEW_SCORE_COLUMNS = {
+    "Atmosphere": "average_atmosphere_score",
+    "Food": "average_food_score",
+    "Service": "average_service_score",
+    "Price per person": "average_price",
+}
+REVIEWS_CHUNKSIZE = 200_000 # rows of all_reviews.csv held in memory at once
+
+def parse_price_ranges(prices):
+    """Vectorized price per person parsing: '$10–20' -> 15.0, '$30' -> 30.0, anything else -> NaN."""
+    numbers = prices.str.findall(r"\d+")
+    count = numbers.str.len()
+    first = pd.to_numeric(numbers.str[0], errors="coerce")
+    second = pd.to_numeric(numbers.str[1], errors="coerce")
+    return pd.Series(
+        np.select([count == 2, count == 1], [(first + second) / 2, first], default=np.nan),
+        index=prices.index,
+    )
+
+OPEN_HOURS_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# day -> (opening, closing) column, in minutes after midnight; NaN when closed or unknown
+OPEN_HOURS_COLUMNS = {day: (f"{day.lower()}_start_minutes", f"{day.lower()}_end_minutes") for day in OPEN_HOURS_DAYS}
+
+def parse_open_hours(open_hours_str):
+    """"{'Monday': [11, 0, 22, 0], ...}" -> {day: (start minutes, end minutes)}; {} if it can't be parsed."""
+    try:
+        hours_dict = ast.literal_eval(open_hours_str)
+        daily_times = {}
+        for day, time in hours_dict.items():
+            if len(time) == 4:
+                start_hour, start_min, end_hour, end_min = time
+                daily_times[day] = (start_hour * 60 + start_min, end_hour * 60 + end_min)
+        return daily_times
+    except:
+        return {}
+
+def open_hours_columns(open_hours):
+    """The OPEN_HOURS_COLUMNS of an open_hours column, parsing each distinct string once."""
+    codes, uniques = pd.factorize(pd.Series([v if isinstance(v, str) else None for v in open_hours], dtype=object))
+    table = np.full((len(uniques) + 1, 2 * len(OPEN_HOURS_DAYS)), np.nan) # last row: missing open_hours
+    for i, value in enumerate(uniques):
+        times = parse_open_hours(value)
+        for d, day in enumerate(OPEN_HOURS_DAYS):
+            try:
+                table[i, 2 * d:2 * d + 2] = times[day]
+            except (KeyError, TypeError, ValueError):
+                pass
+    columns = [name for day in OPEN_HOURS_DAYS for name in OPEN_HOURS_COLUMNS[day]]
+    return pd.DataFrame(table[codes], columns=columns, index=open_hours.index)
+
+def add_open_hours_columns(places_df):
+    """places_df with open_hours parsed into numeric OPEN_HOURS_COLUMNS (done once at load time)."""
+    hours = open_hours_columns(places_df["open_hours"])
+    return pd.concat([places_df.drop(columns=hours.columns, errors="ignore"), hours], axis=1)
+
+def aggregate_reviews(reviews_path, chunksize=REVIEWS_CHUNKSIZE):
+    """Stream all_reviews.csv in chunks and reduce it to per place_id summaries.
+
+    Only running sums and counts per place are kept between chunks (plus the recommended dish
+    strings, which are part of the output), so peak memory does not grow with the file size.
+    Returns (rating_summary, recommended, average_review_dates) frames keyed by place_id.
+    """
+    wanted = ["place_id", "Recommended dishes", "date", *REVIEW_SCORE_COLUMNS]
+    reader = pd.read_csv(
+        reviews_path,
+        usecols=lambda col: col in wanted,
+        dtype={"place_id": object, "Recommended dishes": object, "Price per person": object, "date": object},
+        chunksize=chunksize,
+    )
+
+    totals = None # per place: <col>_sum / <col>_count for every score column, plus date sums
+    dishes = {}
+    epoch = pd.Timestamp("2000-01-01")
+    for chunk in reader:
+        for col in wanted:
+            if col not in chunk:
+                chunk[col] = np.nan
+        chunk = chunk.dropna(subset=["place_id"])
+
+        values = pd.DataFrame(index=chunk.index)
+        values["place_id"] = chunk["place_id"]
+        for col, name in REVIEW_SCORE_COLUMNS.items():
+            if col == "Price per person":
+                scores = parse_price_ranges(chunk[col])
+            else:
+                scores = pd.to_numeric(chunk[col], errors="coerce")
+            values[f"{name}_sum"] = scores
+            values[f"{name}_count"] = scores.notna()
+        # dates as float seconds since a fixed epoch so sums can't overflow
+        dates = pd.to_datetime(chunk["date"], errors="coerce")
+        values["date_sum"] = (dates - epoch).dt.total_seconds()
+        values["date_count"] = dates.notna()
+
+        partial = values.groupby("place_id").sum()
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+
+        # get all recommended dishes (rows with a blank string are skipped, missing values just add nothing)
+        with_dishes = chunk[chunk["Recommended dishes"].str.strip().astype(bool)]
+        for place_id, group in with_dishes.groupby("place_id")["Recommended dishes"]:
+            dishes.setdefault(place_id, []).extend(str(dish) for dish in group.dropna())
+
+    if totals is None:
+        totals = pd.DataFrame(columns=[f"{name}_{part}" for name in [*REVIEW_SCORE_COLUMNS.values(), "date"] for part in ("sum", "count")])
+    totals.index.name = "place_id"
+
+    rating_summary = pd.DataFrame(index=totals.index)
+    for name in REVIEW_SCORE_COLUMNS.values():
+        rating_summary[name] = totals[f"{name}_sum"] / totals[f"{name}_count"].replace(0, np.nan)
+    rating_summary = rating_summary.reset_index()
+
+    recommended = pd.DataFrame({
+        "place_id": list(dishes),
+        "Recommended dishes": [", ".join(parts) for parts in dishes.values()],
+    })
+
+    dated = totals[totals["date_count"] > 0]
+    average_review_dates = pd.DataFrame({
+        "place_id": dated.index,
+        "average_review_date": epoch + pd.to_timedelta(dated["date_sum"] / dated["date_count"], unit="s").to_numpy(),
+    })
+    # Calculate days since the average review date
+    today = pd.to_datetime(datetime.today().date())
+    average_review_dates["days_since_average_review_date"] = (
+        today - average_review_dates["average_review_date"]
+    ).dt.days
+
+    return rating_summary, recommended, average_review_dates
+
+def read_about_file(path):
+    with open(path, "r") as f:
+        data = json.load(f)
+    row = {"place_id": data.get("place_id")} # new dictionary
+    for key, value in data.get("About", {}).items():
+        row[key] = ", ".join(value)  # Convert list to string
+    return row
+
+def print_progress(done, total):
+    if done == total or done % 1000 == 0:
+        print(f"  {done}/{total} About files read")
+
+def load_about_files(about_path, max_workers=ABOUT_WORKERS, progress=None):
+    """Read every About/*.json with a bounded thread pool; progress(done, total) is called after each file."""
+    filenames = sorted(name for name in os.listdir(about_path) if name.endswith(".json"))
+    rows = [None] * len(filenames)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(read_about_file, os.path.join(about_path, name)): i for i, name in enumerate(filenames)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                rows[i] = future.result()
+            except Exception as e:
+                print(f"Error loading {filenames[i]}: {e}")
+            if progress:
+                progress(done, len(filenames))
+    return pd.DataFrame([row for row in rows if row is not None])
+
+def about_signature(about_path):
+    """(file count, total size, newest mtime) over About/*.json."""
+    count = total_size = latest = 0
+    with os.scandir(about_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                st = entry.stat()
+                count += 1
+                total_size += st.st_size
+                latest = max(latest, st.st_mtime_ns)
+    return [count, total_size, latest]
+
+def compact_about(about_path, sidecar_path=ABOUT_SIDECAR_PATH, max_workers=ABOUT_WORKERS, progress=None):
+    """One-time compaction of the About folder into a single Parquet sidecar sorted by place_id."""
+    signature = about_signature(about_path)
+    about_df = load_about_files(about_path, max_workers, progress)
+    about_df = about_df.sort_values("place_id", kind="stable").reset_index(drop=True)
+
+    tmp_path = sidecar_path + ".tmp"
+    about_df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, sidecar_path)
+    with open(sidecar_path + ".json", "w") as f:
+        json.dump({"about_path": about_path, "signature": signature}, f)
+    return about_df
+
+def read_about_sidecar(sidecar_path=ABOUT_SIDECAR_PATH, place_ids=None):
+    """Single sequential read of the sidecar; pass place_ids to only pull those rows."""
+    filters = [("place_id", "in", list(place_ids))] if place_ids is not None else None
+    return pd.read_parquet(sidecar_path, filters=filters)
+
+def about_sidecar_is_fresh(about_path, sidecar_path=ABOUT_SIDECAR_PATH):
+    try:
+        with open(sidecar_path + ".json") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return False
+    return os.path.exists(sidecar_path) and meta["signature"] == about_signature(about_path)
+
+def load_about(about_path, sidecar_path=ABOUT_SIDECAR_PATH, max_workers=ABOUT_WORKERS, progress=None):
+    """About attributes per place_id: from the sidecar when it is current, otherwise re-read and re-compact."""
+    if about_sidecar_is_fresh(about_path, sidecar_path):
+        return read_about_sidecar(sidecar_path)
+    return compact_about(about_path, sidecar_path, max_workers, progress)
+
+@traced()
+def load_all_restaurants(places_path=data_path("places.csv"), reviews_path=data_path("all_reviews.csv"), about_path=data_path("About"),
+                         about_sidecar_path=ABOUT_SIDECAR_PATH, area_lookup=None):
+    """area_lookup(lats, lons) names the area of each restaurant (default: Singapore planning areas)."""
     # Load places.csv
     places_df = pd.read_csv(places_path)
     excluded_categories = [
@@ -41,118 +258,160 @@ def load_all_restaurants(places_path='/Users/amyyz/Documents/NUS/Official Demo/d
     places_df["latitude, longitude"] = places_df["link"].apply(extract_lat_lng)
 
     # get neighborhood
-    places_df["neighborhood"] = places_df["latitude, longitude"].apply(
-    lambda coord: get_planning_area(*coord))
-
-    def parse_price_range(price_str): # parses price per person like $10-20
-        if not isinstance(price_str, str):
-            return None
-        try:
-            # Match numbers like $10–20 or $1–10
-            matches = re.findall(r"\d+", price_str)
-            if len(matches) == 2:
-                min_price = int(matches[0])
-                max_price = int(matches[1])
-                avg_price = (min_price + max_price) / 2
-                return avg_price
-            elif len(matches) == 1:
-                val = int(matches[0])
-                return val
-        except:
-            pass
-        return None
-    
-    try:
-        reviews_df = pd.read_csv(reviews_path, low_memory=False)
+    with span("planning_areas", rows=len(places_df)):
+        places_df["neighborhood"] = (area_lookup or get_planning_areas)(
+            places_df["latitude, longitude"].str[0].astype(float),
+            places_df["latitude, longitude"].str[1].astype(float))
 
-        numeric_cols = ['Atmosphere', 'Food', 'Service',]
-        reviews_df[numeric_cols] = reviews_df[numeric_cols].apply(pd.to_numeric, errors='coerce')
-        reviews_df["Price per person"] = reviews_df["Price per person"].apply(lambda x: pd.Series(parse_price_range(x)))
-
-        rating_summary = reviews_df.groupby('place_id').agg(
-            average_atmosphere_score=('Atmosphere', 'mean'),
-            average_food_score=('Food', 'mean'),
-            average_service_score=('Service', 'mean'),
-            average_price=('Price per person', 'mean')
-        ).reset_index()
+    try:
+        with span("aggregate_reviews"):
+            rating_summary, recommended, average_review_dates = aggregate_reviews(reviews_path)
 
         places_df['place_id'] = places_df['place_id'].astype(str).str.strip()
 
-        # get all recommended dishes
-        df_clean = reviews_df[reviews_df['Recommended dishes'].str.strip().astype(bool)].copy()
-        recommended = df_clean.groupby('place_id')['Recommended dishes'] \
-            .apply(lambda dishes: ', '.join(str(dish) for dish in dishes.dropna())).reset_index()
-
         places_df = places_df.merge(rating_summary, on="place_id", how="left")
         places_df = places_df.merge(recommended, on="place_id", how="left")
 
-        # Make sure 'date' is datetime before grouping
-        reviews_df["date"] = pd.to_datetime(reviews_df["date"], errors="coerce")
-
-        # Remove rows where 'date' couldn't be parsed
-        reviews_df = reviews_df.dropna(subset=["date"])
-
-        # Compute average (mean) review date per place_id
-        average_review_dates = (
-            reviews_df.groupby("place_id")["date"]
-            .mean()
-            .reset_index()
-            .rename(columns={"date": "average_review_date"})
-        )
-
-        # Calculate days since the average review date
-        average_review_dates["average_review_date"] = pd.to_datetime(average_review_dates["average_review_date"], errors="coerce")
-        today = pd.to_datetime(datetime.today().date())
-        average_review_dates["days_since_average_review_date"] = (
-            today - average_review_dates["average_review_date"]
-        ).dt.days
-
-
     except Exception as e:
         print("Warning: could not merge review data:", e)
 
-    about_data = []
-    for filename in os.listdir(about_path):
-        if filename.endswith(".json"):
-            path = os.path.join(about_path, filename)
-            try:
-                with open(path, "r") as f:
-                    data = json.load(f)
-                    place_id = data.get("place_id")
-                    about = data.get("About", {})
-
-                    row = {"place_id": place_id} # new dictionary
-                    for key, value in about.items():
-                        row[key] = ", ".join(value)  # Convert list to string
-                    about_data.append(row)
-            except Exception as e:
-                print(f"Error loading {filename}: {e}")
-
-    about_df = pd.DataFrame(about_data)
+    with span("load_about") as s:
+        about_df = load_about(about_path, about_sidecar_path)
+        s.set(rows=len(about_df))
     places_df = places_df.merge(about_df, on="place_id", how="left")
     # Merge into places_df
     places_df = places_df.merge(average_review_dates, on="place_id", how="left")
     places_df = places_df.dropna(subset=["average_review_date"])
+    places_df = add_open_hours_columns(places_df)
+
+    places_df["success_score"] = compute_success_scores(places_df)
+
+    current_span().set(rows=len(places_df))
+    return places_df
 
-    # get normalized success score
+def compute_success_scores(places_df):
+    """Normalized 50-100 success score from rating, review volume and review recency."""
+    days_since = places_df["days_since_average_review_date"]
     max_reviews = places_df["reviews"].max()
-    max_days = places_df["days_since_average_review_date"].max()
+    max_days = days_since.max()
 
-    def compute_success_score(row):
-        rating_score = (row["rating"] / 5) * 100
-        review_score = np.log1p(row["reviews"]) / np.log1p(max_reviews) * 100
-        recency_score = (1 - row["days_since_average_review_date"] / max_days) * 100
+    rating_score = (places_df["rating"] / 5) * 100
+    review_score = np.log1p(places_df["reviews"]) / np.log1p(max_reviews) * 100
+    recency_score = (1 - days_since / max_days) * 100
 
-        score = (
-            0.5 * rating_score +
-            0.3 * review_score +
-            0.2 * recency_score
-        )
+    score = (
+        0.5 * rating_score +
+        0.3 * review_score +
+        0.2 * recency_score
+    )
+    # min(100, max(50, nan)) used to give 50, keep that for missing ratings
+    return score.fillna(50).clip(50, 100).map(lambda x: round(x, 2))
+
+def source_signature(places_path, reviews_path, about_path):
+    """Cheap (size, mtime) fingerprint of the three sources; the About folder is summarized over its files."""
+    signature = {}
+    for path in (places_path, reviews_path):
+        st = os.stat(path)
+        signature[path] = [st.st_size, st.st_mtime_ns]
+    signature[about_path] = about_signature(about_path)
+    return signature
+
+def source_hashes(places_path, reviews_path, about_path):
+    """Content hashes of the sources, only computed when the cheap signature changed."""
+    def file_hash(path, h=None):
+        h = h or hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h
+
+    hashes = {path: file_hash(path).hexdigest() for path in (places_path, reviews_path)}
+    about_hash = hashlib.sha256()
+    for filename in sorted(os.listdir(about_path)):
+        if filename.endswith(".json"):
+            about_hash.update(filename.encode("utf-8"))
+            file_hash(os.path.join(about_path, filename), about_hash)
+    hashes[about_path] = about_hash.hexdigest()
+    return hashes
 
-        return round(min(100, max(50, score)), 2)
+def write_restaurant_snapshot(places_df, snapshot_path=SNAPSHOT_PATH):
+    df = places_df.copy()
+    # Parquet has no tuple type: store coordinates as two float columns and rebuild the tuples on load
+    df["latitude"] = df["latitude, longitude"].str[0].astype(float)
+    df["longitude"] = df["latitude, longitude"].str[1].astype(float)
+    df = df.drop(columns=["latitude, longitude"])
 
-    places_df["success_score"] = places_df.apply(compute_success_score, axis=1)
+    # Columns mixing strings with numbers can't be typed by Arrow, keep them as strings
+    for col in df.columns[df.dtypes == object]:
+        kind = pd.api.types.infer_dtype(df[col], skipna=True)
+        if kind not in ("string", "empty", "boolean"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
 
+    tmp_path = snapshot_path + ".tmp"
+    df.reset_index(drop=True).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, snapshot_path)
+
+def read_restaurant_snapshot(snapshot_path=SNAPSHOT_PATH, columns=None):
+    df = pd.read_parquet(snapshot_path)
+    df["latitude, longitude"] = [
+        (lat, lon) if not (np.isnan(lat) or np.isnan(lon)) else (None, None)
+        for lat, lon in zip(df["latitude"].to_numpy(), df["longitude"].to_numpy())
+    ]
+    df = df.drop(columns=["latitude", "longitude"])
+    if columns:
+        df = df[columns]
+
+    # days since the average review (and so the success score) moves with the calendar
+    df["days_since_average_review_date"] = (pd.to_datetime(datetime.today().date()) - df["average_review_date"]).dt.days
+    df["success_score"] = compute_success_scores(df)
+    return df
+
+def build_restaurant_snapshot(places_path=data_path("places.csv"), reviews_path=data_path("all_reviews.csv"), about_path=data_path("About"),
+                              snapshot_path=SNAPSHOT_PATH, manifest_path=SNAPSHOT_MANIFEST_PATH,
+                              about_sidecar_path=ABOUT_SIDECAR_PATH, area_lookup=None):
+    places_df = load_all_restaurants(places_path, reviews_path, about_path, about_sidecar_path, area_lookup)
+    write_restaurant_snapshot(places_df, snapshot_path)
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "columns": list(places_df.columns),
+        "signature": source_signature(places_path, reviews_path, about_path),
+        "hashes": source_hashes(places_path, reviews_path, about_path),
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
     return places_df
 
-load_all_restaurants().to_csv("/Users/amyyz/Documents/NUS/Official Demo/data/valid_training_data.csv", index=False)
+def snapshot_is_fresh(places_path, reviews_path, about_path, snapshot_path=SNAPSHOT_PATH, manifest_path=SNAPSHOT_MANIFEST_PATH):
+    """True if the snapshot was built from the current sources (mtimes first, content hashes if those moved)."""
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return False
+    if manifest.get("version") != SNAPSHOT_VERSION or not os.path.exists(snapshot_path):
+        return False
+
+    signature = source_signature(places_path, reviews_path, about_path)
+    if signature == manifest["signature"]:
+        return True
+    if source_hashes(places_path, reviews_path, about_path) != manifest["hashes"]:
+        return False
+
+    # Files were touched but not changed: remember the new mtimes so we don't hash again next time
+    manifest["signature"] = signature
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return True
+
+def load_restaurants(places_path=data_path("places.csv"), reviews_path=data_path("all_reviews.csv"), about_path=data_path("About"),
+                     snapshot_path=SNAPSHOT_PATH, manifest_path=SNAPSHOT_MANIFEST_PATH,
+                     about_sidecar_path=ABOUT_SIDECAR_PATH, area_lookup=None):
+    """Same table as load_all_restaurants(), served from the Parquet snapshot and rebuilt only when the sources change."""
+    if snapshot_is_fresh(places_path, reviews_path, about_path, snapshot_path, manifest_path):
+        with open(manifest_path) as f:
+            columns = json.load(f)["columns"]
+        return read_restaurant_snapshot(snapshot_path, columns)
+    print("Restaurant snapshot is missing or stale, rebuilding it...")
+    return build_restaurant_snapshot(places_path, reviews_path, about_path, snapshot_path, manifest_path,
+                                     about_sidecar_path, area_lookup)
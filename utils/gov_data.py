@@ -0,0 +1,95 @@
+import os
+import json
+import time
+from utils.paths import data_path
+
+# Point this at utils/gov_data_stub.py (e.g. http://127.0.0.1:8765) to run without the internet
+DATA_GOV_BASE_URL = os.getenv("DATA_GOV_BASE_URL", "https://data.gov.sg")
+GOV_CACHE_DIR = os.getenv("DATA_GOV_CACHE_DIR", data_path("gov_cache"))
+GOV_CACHE_TTL = float(os.getenv("DATA_GOV_CACHE_TTL", 7 * 24 * 3600)) # seconds
+PAGE_LIMIT = 1000 # records per datastore_search request
+
+def is_offline():
+    return os.getenv("DATA_GOV_OFFLINE", "").lower() in ("1", "true", "yes")
+
+def fetch_datastore(resource_id, max_records=None, page_limit=PAGE_LIMIT, base_url=None):
+    """Download a datastore_search resource, following offsets until `total` records (or max_records) are in.
+
+    Stops as soon as the last needed page arrives instead of requesting a trailing empty page.
+    Returns the same shape as a single datastore_search response, with every record in result.records.
+    """
+    import requests
+
+    url = (base_url or DATA_GOV_BASE_URL).rstrip("/") + "/api/action/datastore_search"
+    records = []
+    payload = None
+    with requests.Session() as session:
+        while True:
+            limit = page_limit if max_records is None else min(page_limit, max_records - len(records))
+            response = session.get(url, params={"resource_id": resource_id, "limit": limit, "offset": len(records)}, timeout=30)
+            response.raise_for_status()
+            payload = response.json()
+            result = payload["result"]
+            page = result.get("records", [])
+            records.extend(page)
+
+            total = result.get("total", len(records))
+            if not page or len(records) >= total:
+                break
+            if max_records is not None and len(records) >= max_records:
+                break
+
+    result = payload["result"]
+    result["records"] = records
+    result["offset"] = 0
+    result["limit"] = len(records)
+    result.pop("_links", None)
+    return payload
+
+def cache_path(resource_id, cache_dir=None):
+    return os.path.join(cache_dir or GOV_CACHE_DIR, f"{resource_id}.json")
+
+def read_snapshot(resource_id, cache_dir=None):
+    """Return (fetched_at, response) from the local snapshot, or (None, None) if there is none."""
+    try:
+        with open(cache_path(resource_id, cache_dir)) as f:
+            snapshot = json.load(f)
+        return snapshot["fetched_at"], snapshot["response"]
+    except FileNotFoundError:
+        return None, None
+
+def write_snapshot(resource_id, response, cache_dir=None):
+    path = cache_path(resource_id, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"fetched_at": time.time(), "response": response}, f)
+    os.replace(tmp_path, path)
+
+def refresh_dataset(resource_id, cache_dir=None, max_records=None):
+    response = fetch_datastore(resource_id, max_records=max_records)
+    write_snapshot(resource_id, response, cache_dir)
+    return response
+
+def load_dataset(resource_id, ttl=None, cache_dir=None, max_records=None):
+    """Serve a data.gov.sg dataset from the local snapshot, refetching only once it is older than ttl.
+
+    Offline (DATA_GOV_OFFLINE=1) the snapshot is always used regardless of age. If a refetch
+    fails, a stale snapshot is returned with a warning rather than failing the pipeline.
+    """
+    ttl = GOV_CACHE_TTL if ttl is None else ttl
+    fetched_at, response = read_snapshot(resource_id, cache_dir)
+    if response is not None and (is_offline() or time.time() - fetched_at < ttl):
+        return response
+    if is_offline():
+        raise FileNotFoundError(f"No cached snapshot for {resource_id} in {cache_dir or GOV_CACHE_DIR}; "
+                                "run `python cli.py refresh-gov-data` while online.")
+
+    import requests
+    try:
+        return refresh_dataset(resource_id, cache_dir, max_records)
+    except requests.RequestException as e:
+        if response is None:
+            raise
+        print(f"Warning: could not refresh {resource_id} ({e}), using snapshot from {time.ctime(fetched_at)}")
+        return response
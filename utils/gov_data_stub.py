@@ -0,0 +1,61 @@
+"""Local stand-in for data.gov.sg that serves datastore_search from the cached snapshots.
+
+    python -m utils.gov_data_stub --port 8765
+    DATA_GOV_BASE_URL=http://127.0.0.1:8765 python main.py
+"""
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from utils.gov_data import read_snapshot
+
+def make_handler(cache_dir=None):
+    class DatastoreHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.rstrip("/") != "/api/action/datastore_search":
+                return self.send_json(404, {"success": False, "error": {"message": "Not found"}})
+
+            params = parse_qs(url.query)
+            resource_id = params.get("resource_id", [""])[0]
+            _, response = read_snapshot(resource_id, cache_dir)
+            if response is None:
+                return self.send_json(404, {"success": False, "error": {"message": f"No snapshot for {resource_id}"}})
+
+            # Page the snapshot the same way the real API does
+            records = response["result"]["records"]
+            offset = int(params.get("offset", [0])[0])
+            limit = int(params.get("limit", [100])[0])
+            result = dict(response["result"], records=records[offset:offset + limit], offset=offset,
+                          limit=limit, total=len(records))
+            self.send_json(200, dict(response, result=result))
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return DatastoreHandler
+
+def serve_in_thread(port=0, cache_dir=None):
+    """Start the stub on a background thread; returns (server, base_url). Call server.shutdown() when done."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(cache_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.cache_dir))
+    print(f"Serving data.gov.sg snapshots on http://127.0.0.1:{args.port}")
+    server.serve_forever()
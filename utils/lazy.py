@@ -0,0 +1,27 @@
+import threading
+from functools import wraps
+
+def lazy_resource(loader):
+    """Decorator: run loader once, on first call, and hand back the same object afterwards.
+
+    Thread-safe, so concurrent first callers wait for a single load instead of each loading.
+    `accessor.reset()` drops the cached object (e.g. after rebuilding an index on disk).
+    """
+    lock = threading.Lock()
+    state = {}
+
+    @wraps(loader)
+    def accessor():
+        if "value" not in state:
+            with lock:
+                if "value" not in state:
+                    state["value"] = loader()
+        return state["value"]
+
+    def reset():
+        with lock:
+            state.pop("value", None)
+
+    accessor.reset = reset
+    accessor.is_loaded = lambda: "value" in state
+    return accessor
@@ -0,0 +1,135 @@
+"""Local stand-in for the OpenAI chat completions API, for running the pipeline offline.
+
+    python -m utils.mock_openai --port 8766 --latency 2 --rate-limit-every 5 [--keep-alive]
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 OPENAI_API_KEY=mock python main.py
+
+SWOT prompts get a fixed, schema-valid SWOT JSON back; location prompts get three
+best-fit coordinates in the format extract_best_fit_coords expects. With --keep-alive it
+speaks HTTP/1.1 and keeps connections open between requests, like the real API.
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def _category(name, score):
+    return {
+        "category": name,
+        "explanation": f"Mock {name.lower()} summary.",
+        "sub_factors": [
+            {"name": f"{name} factor {i}", "explanation": "Mock explanation.", "score": score}
+            for i in range(1, 4)
+        ],
+        "total_score": score,
+    }
+
+MOCK_SWOT = {
+    "strengths": _category("Strengths", 7.5),
+    "weaknesses": _category("Weaknesses", 6.0),
+    "opportunities": _category("Opportunities", 8.0),
+    "threats": _category("Threats", 5.5),
+    "Success Score": 68.75,
+}
+
+MOCK_COORDINATES = """Suggested Planning Areas for Input Traits:
+1. Downtown Core — Mock reasoning.
+2. Tampines — Mock reasoning.
+3. Bukit Merah — Mock reasoning.
+
+Best-Fit Coordinates:
+- **Downtown Core**: (1.283000, 103.851000)
+- **Tampines**: (1.352700, 103.944800)
+- **Bukit Merah**: (1.282000, 103.823000)
+"""
+
+class MockState:
+    def __init__(self, latency=0.0, rate_limit_every=0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.requests = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+def make_handler(state, keep_alive=False):
+    class ChatCompletionsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" if keep_alive else "HTTP/1.0"
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self.send_json(404, {"error": {"message": "Not found"}})
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+            with state.lock:
+                state.requests += 1
+                throttle = state.rate_limit_every and state.requests % state.rate_limit_every == 0
+                if throttle:
+                    state.rate_limited += 1
+                else:
+                    state.in_flight += 1
+                    state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            if throttle:
+                return self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                      {"retry-after": "0.1"})
+
+            try:
+                time.sleep(state.latency)
+                prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+                content = MOCK_COORDINATES if "Best-Fit Coordinates" in prompt and "SWOT" not in prompt else json.dumps(MOCK_SWOT)
+                self.send_json(200, {
+                    "id": f"chatcmpl-mock-{state.requests}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "gpt-4o"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                              "total_tokens": (len(prompt) + len(content)) // 4},
+                })
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                return self.send_json(200, {"requests": state.requests, "rate_limited": state.rate_limited,
+                                            "max_in_flight": state.max_in_flight})
+            self.send_json(404, {"error": {"message": "Not found"}})
+
+        def send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ChatCompletionsHandler
+
+def serve_in_thread(port=0, latency=0.0, rate_limit_every=0, keep_alive=False):
+    """Start the mock on a background thread; returns (server, state, base_url) with base_url ending in /v1."""
+    state = MockState(latency, rate_limit_every)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state, keep_alive))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each completion takes.")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with a 429.")
+    parser.add_argument("--keep-alive", action="store_true", help="HTTP/1.1 with persistent connections.")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_handler(MockState(args.latency, args.rate_limit_every), args.keep_alive))
+    print(f"Mock OpenAI API on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,8 @@
+import os
+
+# Root folder holding places.csv, all_reviews.csv, About/ and the built artifacts.
+# Override with RESTAURANT_DATA_DIR when running somewhere other than the original laptop.
+DATA_DIR = os.getenv("RESTAURANT_DATA_DIR", "/Users/amyyz/Documents/NUS/Official Demo/data")
+
+def data_path(*parts):
+    return os.path.join(DATA_DIR, *parts)
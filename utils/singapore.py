@@ -1,28 +1,105 @@
-import requests
-import geopandas as gpd
-from shapely.geometry import Point
+from utils.gov_data import load_dataset
+from utils.lazy import lazy_resource
+from utils.paths import data_path
 
 # population per area with ethnicity breakdown 2008-2023    
 population_dataset_id = "d_e7ae90176a68945837ad67892b898466"
-population_url = "https://data.gov.sg/api/action/datastore_search?resource_id="  + population_dataset_id
-        
-population_response = requests.get(population_url).json()
 
 # construction development 2008-2023         
 construction_dataset_id = "d_9bbcd0c9b0351c7f41c9bfdcdc746668"
-construction_url = "https://data.gov.sg/api/action/datastore_search?resource_id="  + construction_dataset_id
-        
-construction_response = requests.get(construction_url).json()
-# print(construction_response.json())
+
+# Both datasets come from the local snapshot (utils/gov_data.py) and are only loaded on first use
+@lazy_resource
+def get_population_response():
+    return load_dataset(population_dataset_id)
+
+@lazy_resource
+def get_construction_response():
+    return load_dataset(construction_dataset_id)
 
 # GeoJSON Singapore Handling Points
-planning_areas = gpd.read_file("/Users/amyyz/Documents/NUS/Official Demo/data/district_and_planning_area.geojson")
+planning_areas_path = data_path("district_and_planning_area.geojson")
+
+@lazy_resource
+def get_planning_areas_gdf():
+    import geopandas as gpd
+    return gpd.read_file(planning_areas_path)
+
+class PlanningAreaIndex:
+    """R-tree over the planning area polygons so a point is only tested against the polygons whose
+    bounding box contains it. When polygons overlap, the first one in file order wins, as before."""
+
+    def __init__(self, areas_gdf):
+        self.names = areas_gdf["planning_area"].to_numpy(dtype=object)
+        self.sindex = areas_gdf.geometry.sindex
+        self.array_query = True # sindex.query takes arrays of points (geopandas >= 0.12)
+
+    def lookup(self, lats, lons):
+        """Planning area (or None) for every lat/lon pair, in one bulk spatial join."""
+        import numpy as np
+        import geopandas as gpd
+
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        result = np.full(len(lats), None, dtype=object)
+        valid = ~(np.isnan(lats) | np.isnan(lons))
+        if not valid.any():
+            return result
+
+        points = gpd.points_from_xy(lons[valid], lats[valid])
+        point_idx, area_idx = self.query_within(points)
+        # the matches are not ordered by polygon, so keep the lowest polygon index per point
+        order = np.lexsort((area_idx, point_idx))
+        point_idx, area_idx = point_idx[order], area_idx[order]
+        first = np.unique(point_idx, return_index=True)[1]
+        result[np.flatnonzero(valid)[point_idx[first]]] = self.names[area_idx[first]]
+        return result
+
+    def query_within(self, points):
+        """(point positions, polygon positions) of every point within a polygon.
+
+        Newer geopandas answer this with sindex.query and deprecate query_bulk; older ones only
+        have query_bulk, whose query takes one geometry at a time.
+        """
+        import numpy as np
+        if self.array_query:
+            try:
+                result = self.sindex.query(points, predicate="within")
+                if np.ndim(result) == 2:
+                    return result
+            except (TypeError, ValueError):
+                pass
+            self.array_query = False
+        return self.sindex.query_bulk(points, predicate="within")
+
+    def lookup_one(self, lat, lon):
+        from shapely.geometry import Point
+        if lat is None or lon is None:
+            return None
+        matches = self.sindex.query(Point(lon, lat), predicate="within")
+        return self.names[min(matches)] if len(matches) else None
+
+@lazy_resource
+def get_planning_area_index():
+    return PlanningAreaIndex(get_planning_areas_gdf())
 
 # Check if a lat/lon falls within a planning area
 def get_planning_area(lat, lon):
-    point = Point(lon, lat) 
-    for _, row in planning_areas.iterrows():
-        if row['geometry'].contains(point):
-            return row['planning_area'] 
-    return None
+    return get_planning_area_index().lookup_one(lat, lon)
+
+def get_planning_areas(lats, lons):
+    """Vectorized get_planning_area: arrays of lat/lon in, array of planning area names (or None) out."""
+    return get_planning_area_index().lookup(lats, lons)
+
+def __getattr__(name):
+    # the old module level globals, now loaded on first access
+    resources = {
+        "population_response": get_population_response,
+        "construction_response": get_construction_response,
+        "planning_areas": get_planning_areas_gdf,
+        "planning_area_index": get_planning_area_index,
+    }
+    if name in resources:
+        return resources[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
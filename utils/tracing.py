@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import itertools
+from functools import wraps
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from utils.paths import data_path
+
+# Per-stage timings of the pipelines. Off by default; TRACING=1 (or enable()) turns it on.
+#
+#     with span("nearby_restaurants") as s:
+#         nearby_df = get_nearby_restaurants(...)
+#         s.set(rows=len(nearby_df))
+#
+# Every finished span is appended to TRACE_LOG as one JSON line (trace id, parent span, duration,
+# attributes) and its duration goes into an in-process window for summary() percentiles.
+# When tracing is off span() hands back one shared no-op object, so an instrumented stage
+# costs a flag check.
+TRACING = os.getenv("TRACING", "0").lower() in ("1", "true", "yes")
+TRACE_LOG = os.getenv("TRACE_LOG", data_path("traces.jsonl"))
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", 10000)) # durations kept per span name for the percentiles
+
+_current_span = ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+class NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+NOOP_SPAN = NoopSpan()
+
+class Span:
+    """One timed stage; nests under the span active in the same thread/task when it starts."""
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Attach counts to the span (rows, prompt_tokens, cache_hit, ...)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self._token = _current_span.set(self)
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._perf_start) * 1000
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self)
+        return False
+
+class Tracer:
+    def __init__(self, log_path=TRACE_LOG, enabled=TRACING, window=TRACE_WINDOW):
+        self.log_path = log_path
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._log = None
+        self._durations = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals = defaultdict(lambda: defaultdict(float))
+
+    def record(self, span):
+        line = {"trace": span.trace_id, "span": span.span_id, "parent": span.parent_id, "name": span.name,
+                "start": round(span.start, 6), "ms": round(span.duration_ms, 3), **span.attrs}
+        with self._lock:
+            self._durations[span.name].append(span.duration_ms)
+            add_totals(self._totals[span.name], span.attrs)
+            if self.log_path:
+                if self._log is None:
+                    os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                    self._log = open(self.log_path, "a", buffering=1) # line buffered: every span is on disk
+                self._log.write(json.dumps(line, default=str) + "\n")
+
+    def summary(self):
+        with self._lock:
+            return {name: {**percentiles(durations), **self._totals[name]} for name, durations in self._durations.items()}
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._totals.clear()
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+_tracer = Tracer()
+
+def get_tracer():
+    return _tracer
+
+def enable(log_path=TRACE_LOG):
+    """Start tracing (log_path None: in-process summary only)."""
+    _tracer.close()
+    _tracer.log_path = log_path
+    _tracer.enabled = True
+
+def disable():
+    _tracer.enabled = False
+    _tracer.close()
+
+def span(name, **attrs):
+    """Context manager timing one stage; a shared no-op when tracing is off."""
+    if not _tracer.enabled:
+        return NOOP_SPAN
+    return Span(_tracer, name, attrs)
+
+def current_span():
+    """The innermost open span (a no-op outside any span or with tracing off), to set() attributes on."""
+    return _current_span.get() or NOOP_SPAN
+
+def traced(name=None):
+    """Decorator: run every call of the function (sync or async) in a span named after it."""
+    def decorate(func):
+        span_name = name or func.__name__
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _tracer.enabled:
+                    return await func(*args, **kwargs)
+                with Span(_tracer, span_name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+            with Span(_tracer, span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def add_totals(totals, attrs):
+    # numeric attributes are summed (cache_hit: True counts 1), anything else is only logged
+    for key, value in attrs.items():
+        if isinstance(value, (bool, int, float)):
+            totals[key] += value
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list."""
+    rank = max(1, int(-(-q * len(sorted_values) // 100))) # ceil(q / 100 * n)
+    return sorted_values[rank - 1]
+
+def percentiles(durations):
+    values = sorted(durations)
+    return {"count": len(values), "p50_ms": percentile(values, 50), "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99), "max_ms": values[-1]}
+
+def summary():
+    """{span name: {count, p50_ms, p95_ms, p99_ms, max_ms, summed numeric attributes}} of this process."""
+    return _tracer.summary()
+
+def summarize_log(log_path=TRACE_LOG, since=None):
+    """Same as summary(), over every span in a JSON lines trace log (started at or after since)."""
+    durations = defaultdict(list)
+    totals = defaultdict(lambda: defaultdict(float))
+    with open(log_path) as f:
+        for line in f:
+            record = json.loads(line)
+            if since is not None and record["start"] < since:
+                continue
+            durations[record["name"]].append(record["ms"])
+            add_totals(totals[record["name"]], {k: v for k, v in record.items()
+                                                if k not in ("trace", "span", "parent", "name", "start", "ms")})
+    return {name: {**percentiles(values), **totals[name]} for name, values in durations.items()}
+
+def format_summary(stats):
+    """Text table of a summary(), slowest p95 first."""
+    lines = [f"{'span':<28} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  totals"]
+    for name, s in sorted(stats.items(), key=lambda item: -item[1]["p95_ms"]):
+        totals = ", ".join(f"{key}={value:g}" for key, value in s.items()
+                           if key not in ("count", "p50_ms", "p95_ms", "p99_ms", "max_ms"))
+        lines.append(f"{name[:28]:<28} {s['count']:>6} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} "
+                     f"{s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}  {totals}")
+    return "\n".join(lines)